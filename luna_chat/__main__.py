@@ -4,6 +4,8 @@ Luna CLI
 
 import asyncio
 import tomllib
+from collections.abc import Awaitable, Callable
+from pathlib import Path
 from textwrap import dedent
 from typing import Any
 
@@ -11,19 +13,46 @@ import click
 from click_default_group import DefaultGroup
 from dotenv import load_dotenv
 from rich.console import Console
+from rich.filesize import decimal
+from rich.progress import Progress
+from rich.table import Table
 
 from luna_chat.app import Luna
 from luna_chat.config import LaunchConfig
-from luna_chat.database.database import create_database, sqlite_file_name
+from luna_chat.database.archive import archive_file_name
+from luna_chat.database.compression import CompressionResult, compress_messages
+from luna_chat.database.database import (
+    configure_database,
+    create_database,
+    database_size,
+    dispose_engine,
+    get_database_config,
+    sqlite_file_name,
+)
+from luna_chat.database.export import ProgressCallback, export_chats, export_progress_path, import_chats
+from luna_chat.database.maintenance import DatabaseStats, check_database, database_stats, optimize, vacuum
+from luna_chat.database.migrations import Migration
 from luna_chat.locations import config_file
+from luna_chat.models import configure_models
 
 console = Console()
 
 
 def create_db_if_not_exists() -> None:
-    if not sqlite_file_name.exists():
+    exists = sqlite_file_name.exists()
+    if not exists:
         click.echo(f"Creating database at {sqlite_file_name!r}")
-        asyncio.run(create_database())
+    # Also brings the schema of an existing database up to date.
+    applied = asyncio.run(_create_database())
+    if exists and applied:
+        click.echo(f"Upgraded database schema to version {applied[-1].version}")
+
+
+async def _create_database() -> list[Migration]:
+    applied = await create_database()
+    # The pooled connections belong to this event loop, the app runs its own.
+    await dispose_engine()
+    return applied
 
 
 def load_or_create_config_file() -> dict[str, Any]:
@@ -41,6 +70,41 @@ def load_or_create_config_file() -> dict[str, Any]:
     return file_config
 
 
+def load_database_config() -> None:
+    launch_config = LaunchConfig(**load_or_create_config_file())
+    configure_database(launch_config.database)
+    configure_models(launch_config)
+
+
+def run_with_progress[T](description: str, operation: Callable[[ProgressCallback], Awaitable[T]]) -> T:
+    """Run a database operation, showing its progress."""
+    with Progress(console=console) as progress:
+        task = progress.add_task(description, total=None)
+
+        def update(completed: int, total: int) -> None:
+            progress.update(task, completed=completed, total=total)
+
+        async def run() -> T:
+            try:
+                return await operation(update)
+            finally:
+                await dispose_engine()
+
+        return asyncio.run(run())
+
+
+def run_database_operation[T](operation: Callable[[], Awaitable[T]]) -> T:
+    """Run a database operation, closing its connections afterwards."""
+
+    async def run() -> T:
+        try:
+            return await operation()
+        finally:
+            await dispose_engine()
+
+    return asyncio.run(run())
+
+
 @click.group(cls=DefaultGroup, default="default", default_if_no_args=True)
 def cli() -> None:
     """Interact with large language models using your terminal."""
@@ -55,10 +119,11 @@ def cli() -> None:
     default=False,
 )
 def default(*, inline: bool) -> None:
+    launch_config = LaunchConfig(**load_or_create_config_file())
+    configure_database(launch_config.database)
     create_db_if_not_exists()
 
-    launch_config: dict[str, Any] = load_or_create_config_file()
-    app = Luna(LaunchConfig(**launch_config))
+    app = Luna(launch_config)
     app.run(inline=inline)
 
 
@@ -91,11 +156,186 @@ You may wish to create a backup of \
         ),
     )
     if click.confirm("Delete all chats?", abort=True):
-        sqlite_file_name.unlink(missing_ok=True)
-        asyncio.run(create_database())
+        load_database_config()
+        # In WAL mode, each database also consists of the write-ahead log and shared memory files.
+        for database_file in (sqlite_file_name, archive_file_name()):
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                database_file.with_name(database_file.name + suffix).unlink(missing_ok=True)
+        asyncio.run(_create_database())
         console.print(f"♻️  Database reset @ {sqlite_file_name}")
 
 
+@cli.command("export")
+@click.argument("path", type=click.Path(dir_okay=False, path_type=Path))
+@click.option("--restart", is_flag=True, help="Start over, rather than resuming an interrupted export to PATH.")
+def export_command(path: Path, *, restart: bool) -> None:
+    """
+    Export all chats to a file
+
+    Chats and their messages are written to PATH as JSON Lines, compressed
+    if PATH ends in .gz or .zst. An interrupted export is resumed when the
+    command is run again with the same PATH.
+    """
+    progress_path = export_progress_path(path)
+    if restart:
+        progress_path.unlink(missing_ok=True)
+    if path.exists() and not progress_path.exists():
+        click.confirm(f"{path} already exists. Overwrite it?", abort=True)
+        path.unlink()
+
+    load_database_config()
+    create_db_if_not_exists()
+    try:
+        counts = run_with_progress("Exporting chats", lambda on_progress: export_chats(path, on_progress=on_progress))
+    except RuntimeError as error:
+        raise click.ClickException(str(error)) from error
+    console.print(f"Exported {counts.chats} chats and {counts.messages} messages to {path}")
+
+
+@cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+def import_command(path: Path) -> None:
+    """
+    Import chats from an export
+
+    The chats are added to the existing chats. An interrupted import is
+    resumed when the command is run again, and chats which were already
+    imported from the same export are skipped.
+    """
+    load_database_config()
+    create_db_if_not_exists()
+    try:
+        counts = run_with_progress("Importing chats", lambda on_progress: import_chats(path, on_progress=on_progress))
+    except (ValueError, RuntimeError) as error:
+        raise click.ClickException(str(error)) from error
+    console.print(f"Imported {counts.chats} chats and {counts.messages} messages from {path}")
+
+
+@cli.group()
+def db() -> None:
+    """Maintain the database."""
+
+
+@db.command()
+def compress() -> None:
+    """
+    Compress the content of existing messages
+
+    New messages are compressed when they are saved. This compresses the
+    messages saved before compression was enabled, or with a different
+    threshold, and then shrinks the database file.
+    """
+    load_database_config()
+    create_db_if_not_exists()
+    size_before = database_size()
+
+    async def compress_and_vacuum(on_progress: ProgressCallback) -> CompressionResult:
+        result = await compress_messages(get_database_config(), on_progress=on_progress)
+        # Shrunk messages leave gaps in their pages, rather than free pages, so the file is rebuilt.
+        await vacuum(full=True)
+        return result
+
+    try:
+        result = run_with_progress("Compressing messages", compress_and_vacuum)
+    except RuntimeError as error:
+        raise click.ClickException(str(error)) from error
+    size_after = database_size()
+
+    console.print(f"Compressed {result.messages} messages from {_format_size(result.size_before)} to {_format_size(result.size_after)}")
+    console.print(f"The database is now {_format_size(size_after)}, {_format_size(max(size_before - size_after, 0))} smaller")
+
+
+@db.command()
+def stats() -> None:
+    """
+    Show the size of the database and its tables
+
+    Lists the row count and size of each table, and the size of each index
+    with the statistics the query planner has about it.
+    """
+    load_database_config()
+    create_db_if_not_exists()
+    result: DatabaseStats = run_database_operation(database_stats)
+
+    def size(value: int | None) -> str:
+        return _format_size(value) if value is not None else "?"
+
+    free_size = result.free_pages * result.page_size
+    console.print(f"Database: {sqlite_file_name} ({_format_size(result.size)})")
+    if result.archive_size:
+        console.print(f"Archive: {archive_file_name()} ({_format_size(result.archive_size)})")
+    console.print(f"Pages: {result.page_count} of {_format_size(result.page_size)}, {result.free_pages} free ({_format_size(free_size)})")
+
+    tables = Table("Table", "Rows", "Size", title="Tables", title_justify="left")
+    for table in result.tables:
+        tables.add_row(table.name, str(table.rows), size(table.size))
+    console.print(tables)
+
+    indexes = Table("Index", "Table", "Size", "Statistics", title="Indexes", title_justify="left")
+    for index in result.indexes:
+        indexes.add_row(index.name, index.table, size(index.size), index.statistics or "not analyzed")
+    console.print(indexes)
+    if any(index.statistics is None for index in result.indexes):
+        console.print("Run [b]luna db optimize[/] to analyze the indexes.")
+
+
+@db.command("optimize")
+def optimize_command() -> None:
+    """
+    Update the statistics of the query planner
+
+    Runs ANALYZE on all tables and indexes, and PRAGMA optimize. Luna also
+    runs PRAGMA optimize when it exits, unless optimize_on_exit is disabled
+    in the [database] table of the config file.
+    """
+    load_database_config()
+    create_db_if_not_exists()
+    run_database_operation(lambda: optimize(analyze=True))
+    console.print("Updated the query planner statistics")
+
+
+@db.command("vacuum")
+@click.option("--full", is_flag=True, help="Rebuild the database file, rather than only releasing free pages.")
+def vacuum_command(*, full: bool) -> None:
+    """
+    Release free pages to the file system
+
+    The first run rebuilds the database file with incremental vacuuming
+    enabled, later runs only release the free pages, which is much quicker.
+    """
+    load_database_config()
+    create_db_if_not_exists()
+    size_before = database_size()
+    run_database_operation(lambda: vacuum(full=full))
+    size_after = database_size()
+    console.print(f"The database is now {_format_size(size_after)}, {_format_size(max(size_before - size_after, 0))} smaller")
+
+
+@db.command()
+@click.option("--quick", is_flag=True, help="Skip checking that the indexes match their tables.")
+def check(*, quick: bool) -> None:
+    """
+    Check the integrity of the database
+
+    Checks the database file, references between rows, and the search index.
+    """
+    load_database_config()
+    create_db_if_not_exists()
+    result = run_database_operation(lambda: check_database(quick=quick))
+    if result.messages_to_backfill:
+        console.print(f"[yellow]…[/] {result.messages_to_backfill} older messages are still being added to the search index")
+    if not result.ok:
+        for problem in result.problems:
+            console.print(f"[red]✗[/] {problem}")
+        message = f"Found {len(result.problems)} problems"
+        raise click.ClickException(message)
+    console.print("[green]✓[/] No problems found")
+
+
+def _format_size(size: int) -> str:
+    return decimal(size)
+
+
 if __name__ == "__main__":
     # Load environment variables from .env file
     load_dotenv()
@@ -1,20 +1,28 @@
 from __future__ import annotations
 
+import asyncio
 import datetime
+from collections import deque
 from pathlib import Path
 from typing import TYPE_CHECKING
 
+from sqlalchemy.exc import DBAPIError
+from textual import log, work
 from textual.app import App
 from textual.binding import Binding
 from textual.signal import Signal
 
+from luna_chat import constants
 from luna_chat.chats_manager import ChatsManager
 from luna_chat.config import LaunchConfig, LunaChatModel
-from luna_chat.models import ChatData, ChatMessage
+from luna_chat.database.maintenance import optimize
+from luna_chat.models import ChatData, ChatMessage, configure_models
+from luna_chat.provider_clients import ProviderClients
 from luna_chat.runtime_config import RuntimeConfig
 from luna_chat.screens.chat_screen import ChatScreen
 from luna_chat.screens.help_screen import HelpScreen
 from luna_chat.screens.home_screen import HomeScreen
+from luna_chat.write_queue import MessageWriteQueue
 
 if TYPE_CHECKING:
     from litellm.types.completion import (
@@ -33,6 +41,8 @@ class Luna(App[None]):
 
     def __init__(self, config: LaunchConfig):
         self.launch_config = config
+        ChatsManager.configure_cache(config.chat_cache)
+        configure_models(config)
 
         self._runtime_config = RuntimeConfig(
             selected_model=config.default_model_object,
@@ -41,6 +51,12 @@ class Luna(App[None]):
         self.runtime_config_signal = Signal[RuntimeConfig](self, "runtime-config-updated")
         """Widgets can subscribe to this signal to be notified of
         when the user has changed configuration at runtime (e.g. using the UI)."""
+        self.message_write_queue = MessageWriteQueue(on_error=self.message_write_failed)
+        """New messages are written to the database through this queue."""
+        self.stop_latencies: deque[float] = deque(maxlen=100)
+        """How long the latest stops of responses took, in seconds, from the key press until the prompt was ready."""
+        self.provider_clients = ProviderClients(config.connections)
+        """The clients of the APIs of the models, which keep their connections open between requests."""
 
         super().__init__()
 
@@ -50,12 +66,68 @@ class Luna(App[None]):
 
     @runtime_config.setter
     def runtime_config(self, new_runtime_config: RuntimeConfig) -> None:
+        model_changed = new_runtime_config.selected_model.lookup_key != self._runtime_config.selected_model.lookup_key
         self._runtime_config = new_runtime_config
         self.runtime_config_signal.publish(self.runtime_config)
+        if model_changed:
+            self.warm_up_model(new_runtime_config.selected_model)
 
     async def on_mount(self) -> None:
         await self.push_screen(HomeScreen(self.runtime_config_signal))
         self.theme = "textual-dark"
+        self.backfill_search_index()
+        self.move_archived_chats()
+        self.warm_up_model(self.runtime_config.selected_model)
+
+    async def on_unmount(self) -> None:
+        # Make sure no messages are lost when the app quits.
+        await self.message_write_queue.close()
+        await self.provider_clients.close()
+        if self.launch_config.database.optimize_on_exit:
+            await self.optimize_database()
+
+    async def optimize_database(self) -> None:
+        try:
+            await optimize()
+        except DBAPIError as error:
+            # Not worth holding up quitting for, e.g. if another process has the database locked.
+            log.warning(f"Couldn't optimize the database: {error}")
+
+    def message_write_failed(self, exception: Exception) -> None:
+        self.notify(
+            f"{exception}",
+            title="Couldn't save message",
+            severity="error",
+            timeout=constants.ERROR_NOTIFY_TIMEOUT_SECS,
+        )
+
+    @work(group="search_backfill", exit_on_error=False)
+    async def backfill_search_index(self) -> None:
+        """Index the messages which predate the search index, a batch at a time.
+
+        Messages which are waiting to be written go first, between batches.
+        """
+        while await ChatsManager.backfill_search_index():
+            await self.message_write_queue.wait_until_idle()
+
+    @work(group="archive_mover", exclusive=True, exit_on_error=False)
+    async def move_archived_chats(self, delay: float = 0.0) -> None:
+        """Move the archived chats to the archive database, a batch at a time.
+
+        Messages which are waiting to be written go first, between batches.
+
+        Args:
+            delay: How long to wait first, so chats archived in quick succession are moved together.
+        """
+        await asyncio.sleep(delay)
+        while await ChatsManager.move_archived_chats():
+            await self.message_write_queue.wait_until_idle()
+
+    @work(group="warm_up", exit_on_error=False)
+    async def warm_up_model(self, model: LunaChatModel) -> None:
+        """Connect to the API of the model, so the first reply doesn't wait for the connection."""
+        if self.launch_config.connections.warm_up:
+            await self.provider_clients.warm_up(model)
 
     async def launch_chat(self, prompt: str, model: LunaChatModel) -> None:
         current_time = datetime.datetime.now(datetime.UTC)
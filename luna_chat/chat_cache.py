@@ -0,0 +1,147 @@
+# Copyright 2026 Leo Huber
+"""In-memory cache of recently opened chats.
+
+Reopening a chat which was viewed recently is served from here, without
+querying the database. Entries are stamped with the change version of the
+chat (see `ChatDao.version`) they were loaded or last updated at. The
+`ChatsManager` keeps them up to date as it writes, and a caller which knows
+the current version of a chat, e.g. from the chat list, can pass it to make
+sure a chat changed by another process isn't served stale.
+
+Callers get a copy of the cached chat, so adding messages to it, or loading
+older ones into it, doesn't change the cached entry. The messages themselves
+are shared.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import replace
+from typing import TYPE_CHECKING
+
+from luna_chat.config import ChatCacheConfig
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from luna_chat.models import ChatData, ChatMessage
+
+
+def _message_size(message: ChatMessage) -> int:
+    content = message.message.get("content")
+    return len(content) if isinstance(content, str) else 0
+
+
+class ChatCache:
+    """A least recently used cache of chats, bounded by count and by the length of their content."""
+
+    def __init__(self, config: ChatCacheConfig | None = None) -> None:
+        self.config = config or ChatCacheConfig()
+        self._chats: OrderedDict[int, ChatData] = OrderedDict()
+        self._sizes: dict[int, int] = {}
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    @property
+    def size(self) -> int:
+        """The approximate size of the cached content, in characters."""
+        return self._size
+
+    def get(
+        self,
+        chat_id: int,
+        *,
+        version: int | None = None,
+        complete: bool = False,
+        including_message_id: int | None = None,
+    ) -> ChatData | None:
+        """Return a copy of the cached chat, or None if it isn't cached or can't be used.
+
+        Args:
+            version: The current version of the chat, if known. A cached chat with another version is dropped.
+            complete: Only return the chat if all of its messages were loaded.
+            including_message_id: Only return the chat if the message with this ID was loaded.
+        """
+        chat = self._chats.get(chat_id)
+        if chat is not None and version is not None and chat.version != version:
+            self.invalidate(chat_id)
+            chat = None
+        if (
+            chat is None
+            or (complete and chat.unloaded_message_count)
+            or (including_message_id is not None and all(message.id != including_message_id for message in chat.messages))
+        ):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._chats.move_to_end(chat_id)
+        return replace(chat, messages=list(chat.messages))
+
+    def put(self, chat: ChatData) -> None:
+        """Cache a copy of a chat which was loaded from the database."""
+        if chat.id is None or self.config.max_chats <= 0:
+            return
+        self.invalidate(chat.id)
+        self._chats[chat.id] = replace(chat, messages=list(chat.messages))
+        self._resize(chat.id, sum(_message_size(message) for message in chat.messages))
+
+    def add_messages(self, chat_id: int, messages: Sequence[ChatMessage], version: int) -> None:
+        """Append messages which were written to a cached chat.
+
+        A message which doesn't reply to the last cached one starts another
+        branch, which the cached chat doesn't show, so it is dropped.
+        """
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            return
+        last_id = chat.messages[-1].id if chat.messages else None
+        for message in messages:
+            if message.parent_id != last_id:
+                self.invalidate(chat_id)
+                return
+            last_id = message.id
+        chat.messages.extend(messages)
+        chat.version = version
+        self._resize(chat_id, self._sizes[chat_id] + sum(_message_size(message) for message in messages))
+
+    def update_messages(self, messages: Sequence[ChatMessage]) -> None:
+        """Use the given messages, whose content was saved, in place of cached copies of them."""
+        by_id = {message.id: message for message in messages if message.id is not None}
+        for chat in self._chats.values():
+            for index, cached in enumerate(chat.messages):
+                message = by_id.get(cached.id) if cached.id is not None else None
+                if message is not None and message is not cached:
+                    chat.messages[index] = message
+
+    def rename(self, chat_id: int, title: str, version: int) -> None:
+        chat = self._chats.get(chat_id)
+        if chat is not None:
+            chat.title = title
+            chat.version = version
+
+    def invalidate(self, chat_id: int) -> None:
+        if self._chats.pop(chat_id, None) is not None:
+            self._size -= self._sizes.pop(chat_id)
+
+    def configure(self, config: ChatCacheConfig) -> None:
+        """Set the limits of the cache, emptying it."""
+        self.config = config
+        self.clear()
+
+    def clear(self) -> None:
+        self._chats.clear()
+        self._sizes.clear()
+        self._size = 0
+
+    def _resize(self, chat_id: int, size: int) -> None:
+        self._size += size - self._sizes.get(chat_id, 0)
+        self._sizes[chat_id] = size
+        # Evict the least recently used chats, but always keep the latest one.
+        while len(self._chats) > 1 and (len(self._chats) > self.config.max_chats or self._size > self.config.max_size):
+            evicted_id = next(iter(self._chats))
+            self.invalidate(evicted_id)
@@ -2,109 +2,372 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 import datetime
+from itertools import pairwise
+from typing import TYPE_CHECKING
 
 from sqlmodel import select
 from textual import log
 
+from luna_chat.chat_cache import ChatCache
 from luna_chat.database.converters import (
+    branch_row_to_chat_message,
     chat_dao_to_chat_data,
+    chat_message_to_content,
     chat_message_to_message_dao,
-    message_dao_to_chat_message,
+    chat_message_to_message_row,
+    search_row_to_search_hit,
+    summary_row_to_chat_summary,
 )
-from luna_chat.database.database import get_session
-from luna_chat.database.models import ChatDao, MessageDao
-from luna_chat.models import ChatData, ChatMessage
+from luna_chat.database.database import read_session, write_session
+from luna_chat.database import archive, search
+from luna_chat.database.models import ChatDao, MessageDao, insert_returning_ids
+from luna_chat.models import PREVIEW_LENGTH, ChatChanges, ChatData, ChatListCursor, ChatMessage, ChatSummary, SearchHit
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from luna_chat.config import ChatCacheConfig
+
+
+_chat_cache = ChatCache()
 
 
 @dataclass
 class ChatsManager:
     @staticmethod
-    async def all_chats() -> list[ChatData]:
-        chat_daos = await ChatDao.all()
-        return [chat_dao_to_chat_data(chat) for chat in chat_daos]
+    def configure_cache(config: ChatCacheConfig) -> None:
+        """Set the limits of the cache of recently opened chats, emptying it."""
+        _chat_cache.configure(config)
 
     @staticmethod
-    async def get_chat(chat_id: int) -> ChatData:
+    def chat_cache() -> ChatCache:
+        return _chat_cache
+
+    @staticmethod
+    async def list_chat_summaries(
+        limit: int | None = None,
+        after: ChatListCursor | None = None,
+    ) -> list[ChatSummary]:
+        """Return the summaries of the non-archived chats, most recent first.
+
+        This doesn't load any messages, use `get_chat` to load the full chat.
+
+        Args:
+            limit: The maximum number of summaries to return (all if None).
+            after: Only return chats after this cursor (see `ChatSummary.cursor`).
+        """
+        rows = await ChatDao.summaries(PREVIEW_LENGTH, limit=limit, after=after)
+        return [summary_row_to_chat_summary(row) for row in rows]
+
+    @staticmethod
+    async def count_chats() -> int:
+        """Return the number of chats which would be listed by `list_chat_summaries`."""
+        return await ChatDao.count()
+
+    @staticmethod
+    async def latest_version() -> int:
+        """Return the current change version, see `changed_since`."""
+        return await ChatDao.latest_version()
+
+    @staticmethod
+    async def changed_since(version: int) -> ChatChanges:
+        """Return the chats written through the ChatsManager after the given change version.
+
+        Lets the chat list patch itself rather than reloading every chat.
+        """
+        rows = await ChatDao.changed_since(PREVIEW_LENGTH, version)
+        updated: list[ChatSummary] = []
+        removed: list[int] = []
+        for row in rows:
+            if row.archived or row.last_message_at is None:
+                removed.append(row.id)
+            else:
+                updated.append(summary_row_to_chat_summary(row))
+            version = max(version, row.version)
+
+        chat_count = await ChatDao.count() if rows else None
+        return ChatChanges(version=version, updated=updated, removed=removed, chat_count=chat_count)
+
+    @staticmethod
+    async def search(query: str, limit: int = 50, offset: int = 0) -> list[SearchHit]:
+        """Full-text search the messages of all non-archived chats.
+
+        Args:
+            query: The words to search for, the last one is matched as a prefix.
+            limit: The maximum number of hits to return.
+            offset: The number of hits to skip, for pagination.
+
+        Returns:
+            The matching messages, most relevant first.
+        """
+        rows = await search.search_messages(query, limit=limit, offset=offset, preview_length=PREVIEW_LENGTH)
+        return [search_row_to_search_hit(row, snippet) for row, snippet in rows]
+
+    @staticmethod
+    async def backfill_search_index(batch_size: int = 2_000) -> bool:
+        """Add the next batch of messages which predate the search index to it.
+
+        Returns:
+            True if there are more messages left to index.
+        """
+        return await search.backfill_search_index(batch_size) > 0
+
+    @staticmethod
+    async def get_chat(
+        chat_id: int,
+        message_limit: int | None = None,
+        including_message_id: int | None = None,
+        version: int | None = None,
+    ) -> ChatData:
+        """Load a chat and its messages.
+
+        Recently opened chats are served from memory, see `luna_chat.chat_cache`.
+
+        Args:
+            message_limit: Only load the system prompt and this many of the most
+                recent messages. Use `get_messages` to load the older ones.
+            including_message_id: Load more messages than `message_limit`, if
+                required to include the message with this ID.
+            version: The current change version of the chat, if known, so a
+                cached chat which was changed elsewhere isn't used.
+        """
+        chat = _chat_cache.get(
+            chat_id,
+            version=version,
+            complete=message_limit is None,
+            including_message_id=including_message_id,
+        )
+        if chat is None:
+            chat = await ChatsManager._load_chat(chat_id, message_limit, including_message_id)
+            _chat_cache.put(chat)
+        return chat
+
+    @staticmethod
+    async def _load_chat(chat_id: int, message_limit: int | None, including_message_id: int | None) -> ChatData:
         chat_dao = await ChatDao.from_id(chat_id)
-        return chat_dao_to_chat_data(chat_dao)
+        rows = await MessageDao.branch(chat_id, limit=message_limit, including_message_id=including_message_id)
+        if including_message_id is not None and all(row[0].id != including_message_id for row in rows):
+            # The message is on another branch, which is shown from now on.
+            leaf_id = await MessageDao.latest_leaf(including_message_id)
+            chat_dao.version = await ChatDao.set_active_message(chat_id, leaf_id) or chat_dao.version
+            rows = await MessageDao.branch(chat_id, leaf_id=leaf_id, limit=message_limit, including_message_id=including_message_id)
+        if not rows:
+            return chat_dao_to_chat_data(chat_dao, [])
+
+        messages = [branch_row_to_chat_message(row, chat_dao.model) for row in rows]
+        unloaded_message_count = rows[0].length - len(rows)
+        preview = await ChatDao.preview(chat_id, PREVIEW_LENGTH) if unloaded_message_count else None
+        return chat_dao_to_chat_data(chat_dao, messages, unloaded_message_count, preview)
 
     @staticmethod
     async def rename_chat(chat_id: int, new_title: str) -> None:
-        await ChatDao.rename_chat(chat_id, new_title)
+        version = await ChatDao.rename_chat(chat_id, new_title)
+        if version is not None:
+            _chat_cache.rename(chat_id, new_title, version)
 
     @staticmethod
-    async def get_messages(
-        chat_id: int,
-    ) -> list[ChatMessage]:
-        async with get_session() as session:
+    async def get_messages(chat_id: int, before: int, limit: int | None = None) -> list[ChatMessage]:
+        """Return the messages before the given one on its branch, oldest first, without the system prompt.
+
+        Args:
+            before: The ID of the message to return the predecessors of.
+            limit: Only return the `limit` most recent of those messages.
+        """
+        async with read_session() as session:
             try:
                 chat: ChatDao | None = await session.get(ChatDao, chat_id)
-            except ValueError:
-                raise RuntimeError(f"Malformed chat ID {chat_id!r}. " f"I couldn't convert it to an integer.")
+            except ValueError as error:
+                message = f"Malformed chat ID {chat_id!r}. I couldn't convert it to an integer."
+                raise RuntimeError(message) from error
 
             if not chat:
                 raise RuntimeError(f"Chat with ID {chat_id} not found.")
-            message_daos = chat.messages
-            await session.commit()
-
-        # Convert MessageDao objects to ChatMessages
-        model = chat.model
-        chat_messages: list[ChatMessage] = []
-        for message_dao in message_daos:
-            chat_message = message_dao_to_chat_message(message_dao, model)
-            chat_messages.append(chat_message)
+            model = chat.model
 
-        log.debug(f"Retrieved {len(chat_messages)} chats for chat {chat_id!r}")
+        rows = await MessageDao.ancestors(before, limit=limit)
+        chat_messages = [branch_row_to_chat_message(row, model) for row in rows]
+        log.debug(f"Retrieved {len(chat_messages)} messages for chat {chat_id!r}")
         return chat_messages
 
+    @staticmethod
+    async def sibling_ids(message_id: int) -> list[int]:
+        """Return the IDs of the alternatives to a message, i.e. of the replies to its parent, oldest first."""
+        return await MessageDao.sibling_ids(message_id)
+
+    @staticmethod
+    async def switch_branch(chat_id: int, message_id: int) -> list[ChatMessage]:
+        """Show the most recent branch through the given message from now on.
+
+        Returns:
+            The messages of the branch from the given message onwards, which
+            replace those from its sibling onwards.
+        """
+        leaf_id = await MessageDao.latest_leaf(message_id)
+        if await ChatDao.set_active_message(chat_id, leaf_id) is None:
+            raise RuntimeError(f"Chat with ID {chat_id} not found.")
+        _chat_cache.invalidate(chat_id)
+
+        chat_dao = await ChatDao.from_id(chat_id)
+        rows = await MessageDao.branch(chat_id, leaf_id=leaf_id, start_id=message_id)
+        return [branch_row_to_chat_message(row, chat_dao.model) for row in rows]
+
     @staticmethod
     async def create_chat(chat_data: ChatData) -> int:
-        log.debug(f"Creating chat in database: {chat_data!r}")
-
-        model = chat_data.model
-        lookup_key = model.lookup_key
-        async with get_session() as session:
-            chat = ChatDao(
-                model=lookup_key,
-                title="",
-                started_at=datetime.datetime.now(datetime.timezone.utc),
-            )
-            session.add(chat)
-            await session.commit()
+        """Create a chat with its messages and return the ID of the new chat."""
+        [chat_id] = await ChatsManager.create_chats([chat_data])
+        return chat_id
+
+    @staticmethod
+    async def create_chats(chats: Sequence[ChatData]) -> list[int]:
+        """Create chats with all their messages in a single transaction.
 
-            chat_id = chat.id
-            for message in chat_data.messages:
-                litellm_message = message.message
-                content = litellm_message["content"]
-                new_message = MessageDao(
-                    chat_id=chat_id,
-                    role=litellm_message["role"],
-                    content=content if isinstance(content, str) else "",
-                    model=lookup_key,
-                    timestamp=message.timestamp,
-                )
-                (await chat.awaitable_attrs.messages).append(new_message)
+        The chats, and then all of their messages, are each inserted with
+        one multi-row INSERT ... RETURNING.
 
+        Returns:
+            The IDs of the new chats, which are also set on the chats and their messages.
+        """
+        log.debug(f"Creating {len(chats)} chats in database")
+        now = datetime.datetime.now(datetime.timezone.utc)
+        async with write_session() as session:
+            chat_rows = [
+                {"model": chat.model.lookup_key, "title": chat.title or "", "started_at": chat.create_timestamp or now, "archived": False}
+                for chat in chats
+            ]
+            chat_ids = await insert_returning_ids(session, ChatDao.__table__, chat_rows)  # type: ignore[attr-defined]
+
+            message_rows = [
+                chat_message_to_message_row(message, chat_id, chat.model.lookup_key)
+                for chat, chat_id in zip(chats, chat_ids, strict=True)
+                for message in chat.messages
+            ]
+            message_ids = await insert_returning_ids(session, MessageDao.__table__, message_rows)  # type: ignore[attr-defined]
+
+            # Each message replies to the one before it.
+            parent_ids: list[tuple[int, int | None]] = []
+            remaining_ids = iter(message_ids)
+            for chat in chats:
+                chat_message_ids = [next(remaining_ids) for _ in chat.messages]
+                parent_ids.extend((child, parent) for parent, child in pairwise(chat_message_ids))
+            if parent_ids:
+                await MessageDao.set_parents(session, parent_ids)
+
+            await search.index_messages(await session.connection(), message_ids)
+            await ChatDao.bump_versions(session, chat_ids)
             await session.commit()
 
-        return chat.id
+        messages = [message for chat in chats for message in chat.messages]
+        for message, message_id in zip(messages, message_ids, strict=True):
+            message.id = message_id
+        for chat, chat_id in zip(chats, chat_ids, strict=True):
+            chat.id = chat_id
+            for parent, message in pairwise(chat.messages):
+                message.parent_id = parent.id
+        return chat_ids
 
     @staticmethod
     async def archive_chat(chat_id: int) -> None:
-        async with get_session() as session:
+        async with write_session() as session:
             statement = select(ChatDao).where(ChatDao.id == chat_id)
             result = await session.exec(statement)
             chat_dao = result.one()
             chat_dao.archived = True
+            await ChatDao.bump_version(session, chat_id)
             await session.commit()
+        _chat_cache.invalidate(chat_id)
 
     @staticmethod
-    async def add_message_to_chat(chat_id: int, message: ChatMessage) -> None:
-        async with get_session() as session:
-            chat: ChatDao | None = await session.get(ChatDao, chat_id)
-            if not chat:
-                raise Exception(f"Chat with ID {chat_id} not found.")
-            message_dao = chat_message_to_message_dao(message, chat_id)
-            (await chat.awaitable_attrs.messages).append(message_dao)
-            session.add(chat)
+    async def move_archived_chats(batch_size: int = 20) -> bool:
+        """Move the next batch of archived chats to the archive database.
+
+        Returns:
+            True if there may be more archived chats left to move.
+        """
+        return await archive.move_archived_chats(batch_size) == batch_size
+
+    @staticmethod
+    async def list_archived_chats(
+        limit: int | None = None,
+        after: ChatListCursor | None = None,
+    ) -> list[ChatSummary]:
+        """Return the summaries of the archived chats, most recent first.
+
+        Args:
+            limit: The maximum number of summaries to return (all if None).
+            after: Only return chats after this cursor (see `ChatSummary.cursor`).
+        """
+        rows = await archive.archived_chat_summaries(PREVIEW_LENGTH, limit=limit, after=after)
+        return [summary_row_to_chat_summary(row) for row in rows]
+
+    @staticmethod
+    async def unarchive_chat(chat_id: int) -> int:
+        """Move an archived chat back to the chat list.
+
+        Returns:
+            The ID of the chat, which changes if its old ID was taken in the meantime.
+        """
+        new_chat_id = await archive.unarchive_chat(chat_id)
+        _chat_cache.invalidate(new_chat_id)
+        return new_chat_id
+
+    @staticmethod
+    async def add_message_to_chat(chat_id: int, message: ChatMessage) -> int:
+        """Append a message to a chat and return the ID of the new message."""
+        [message_id] = await ChatsManager.add_messages([(chat_id, message)])
+        return message_id
+
+    @staticmethod
+    async def add_messages(
+        messages: Sequence[tuple[int, ChatMessage]],
+        updated: Sequence[ChatMessage] = (),
+    ) -> list[int]:
+        """Append messages to their chats in a single transaction.
+
+        The messages are inserted by chat ID, without loading the chats or
+        their existing messages, so appending doesn't get slower as chats grow.
+        Each message replies to its `parent`, which may be in the same batch.
+
+        Args:
+            messages: Pairs of chat ID and the message to append to it, in order.
+            updated: Messages already in the database to save the content of,
+                in the same transaction, after the new messages were added.
+
+        Returns:
+            The IDs of the new messages, which are also set on the messages.
+        """
+        async with write_session() as session:
+            message_daos = [chat_message_to_message_dao(message, chat_id) for chat_id, message in messages]
+            # A reply to a message of the same batch gets the ID of its parent once that is inserted.
+            new_daos = {id(message): message_dao for (_, message), message_dao in zip(messages, message_daos, strict=True)}
+            for (_, message), message_dao in zip(messages, message_daos, strict=True):
+                if message.parent is not None and message.parent.id is None and id(message.parent) in new_daos:
+                    message_dao.parent = new_daos[id(message.parent)]
+            session.add_all(message_daos)
+            await session.flush()
+            versions: dict[int, int] = {}
+            for chat_id in dict.fromkeys(chat_id for chat_id, _ in messages):
+                # New messages continue the branch which is shown.
+                version = await ChatDao.bump_version(session, chat_id, active_message_id=None)
+                if version is None:
+                    error_message = f"Chat with ID {chat_id} not found."
+                    raise RuntimeError(error_message)
+                versions[chat_id] = version
+            for (_, message), message_dao in zip(messages, message_daos, strict=True):
+                message.id = message_dao.id
+                message.parent_id = message_dao.parent_id
+            contents = [chat_message_to_content(message) for message in updated if message.id is not None]
+            connection = await session.connection()
+            updated_ids = [message_id for message_id, *_ in contents]
+            if contents:
+                # The index has the terms of the content the messages had.
+                await search.unindex_messages(connection, updated_ids)
+                await MessageDao.update_contents(session, contents)
+            await search.index_messages(connection, [message_dao.id for message_dao in message_daos if message_dao.id is not None] + updated_ids)
             await session.commit()
+
+        for chat_id, version in versions.items():
+            _chat_cache.add_messages(chat_id, [message for message_chat_id, message in messages if message_chat_id == chat_id], version)
+        if updated:
+            _chat_cache.update_messages(updated)
+
+        return [message_dao.id for message_dao in message_daos if message_dao.id is not None]
@@ -0,0 +1,59 @@
+# Copyright 2026 Leo Huber
+"""Frame rate limiting of streamed text.
+
+Models can stream hundreds of small chunks a second. Showing each one means
+a layout of the chat per chunk, so chunks are collected and shown together,
+at most once a frame. The first chunk after a quiet spell is shown right
+away, and chunks which arrive later in the frame are shown at its end, even
+if no more chunks follow.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+class ChunkCoalescer:
+    def __init__(self, flush: Callable[[str, int], None], frame_rate: float = 30.0) -> None:
+        """
+        Args:
+            flush: Called with the text of the collected chunks, and their number.
+            frame_rate: How often, per second, `flush` is called at most. 0 flushes every chunk.
+        """
+        self.flush = flush
+        self.interval = 1 / frame_rate if frame_rate > 0 else 0.0
+        self.flush_count = 0
+        self._chunks: list[str] = []
+        self._last_flush = -self.interval
+        self._timer: asyncio.TimerHandle | None = None
+
+    def add(self, chunk: str) -> None:
+        """Collect a chunk, flushing it now if the last flush was at least a frame ago."""
+        self._chunks.append(chunk)
+        if self._timer is not None:
+            return
+        delay = self._last_flush + self.interval - time.monotonic()
+        if delay <= 0:
+            self._flush()
+        else:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._flush)
+
+    def close(self) -> None:
+        """Flush the collected chunks now."""
+        self._flush()
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._chunks:
+            return
+        chunks, self._chunks = self._chunks, []
+        self._last_flush = time.monotonic()
+        self.flush_count += 1
+        self.flush("".join(chunks), len(chunks))
@@ -1,7 +1,12 @@
 import os
+from functools import cached_property
+from typing import TYPE_CHECKING, Literal
 
 from pydantic import AnyHttpUrl, BaseModel, ConfigDict, Field, SecretStr
 
+if TYPE_CHECKING:
+    from luna_chat.models import ModelRegistry
+
 
 class LunaChatModel(BaseModel):
     name: str
@@ -140,6 +145,80 @@ def get_builtin_models() -> list[LunaChatModel]:
     return get_builtin_openai_models() + get_builtin_anthropic_models() + get_builtin_google_models()
 
 
+class DatabaseConfig(BaseModel):
+    """Settings of the SQLite engine, configured in the `[database]` table of the config file."""
+
+    model_config = ConfigDict(frozen=True)
+
+    journal_mode: Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"] = Field(default="WAL")
+    """In WAL mode readers don't block the writer and vice versa."""
+    synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = Field(default="NORMAL")
+    """With WAL, NORMAL only syncs on checkpoints, which is still safe against corruption."""
+    cache_size: int = Field(default=-32_000)
+    """The page cache size per connection. Negative values are in KiB, positive values in pages."""
+    mmap_size: int = Field(default=256 * 1024 * 1024)
+    """The maximum number of bytes of the database file to memory-map (0 disables it)."""
+    busy_timeout: int = Field(default=5_000)
+    """How many milliseconds to wait for a lock held by another connection before failing."""
+    temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = Field(default="MEMORY")
+    """Where temporary tables and indices (e.g. for sorting) are stored."""
+    pool_size: int = Field(default=5)
+    """The number of read-only connections kept open in the pool. Writes go through a single connection of their own."""
+    max_overflow: int = Field(default=10)
+    """The number of read-only connections which may be opened on top of `pool_size` under load."""
+    pool_timeout: float = Field(default=30.0)
+    """How many seconds to wait for a connection from the pool before giving up."""
+    echo: bool = Field(default=False)
+    """Log all the SQL statements which are executed."""
+    compression: Literal["none", "zlib", "zstd"] = Field(default="zlib")
+    """The algorithm long message content is compressed with. zstd requires the zstandard package."""
+    compression_threshold: int = Field(default=4_096)
+    """Message content of at least this many bytes is compressed."""
+    optimize_on_exit: bool = Field(default=True)
+    """Run `PRAGMA optimize` when Luna exits, which updates out-of-date query planner statistics."""
+
+
+class StreamingConfig(BaseModel):
+    """Settings of streamed responses, configured in the `[streaming]` table of the config file."""
+
+    model_config = ConfigDict(frozen=True)
+
+    checkpoint_interval: float = Field(default=1.0)
+    """Save the response being streamed at least this often, in seconds."""
+    checkpoint_chunks: int = Field(default=100)
+    """Save the response being streamed after this many chunks, if that comes sooner."""
+    frame_rate: float = Field(default=30.0)
+    """How often, per second, the response being streamed is redrawn at most.
+    Chunks which arrive in between are shown together. 0 shows every chunk."""
+    max_queued_chunks: int = Field(default=256)
+    """How many chunks of the response are read at most, ahead of those shown."""
+
+
+class ChatCacheConfig(BaseModel):
+    """Settings of the cache of recently opened chats, configured in the `[chat_cache]` table of the config file."""
+
+    model_config = ConfigDict(frozen=True)
+
+    max_chats: int = Field(default=20)
+    """The maximum number of chats to keep in memory (0 disables the cache)."""
+    max_size: int = Field(default=8_000_000)
+    """The maximum total length of the content of the cached messages, in characters."""
+
+
+class ConnectionsConfig(BaseModel):
+    """Settings of the connections to the APIs of the models, configured in the `[connections]` table of the config file."""
+
+    model_config = ConfigDict(frozen=True)
+
+    keepalive_expiry: float = Field(default=120.0)
+    """How long an idle connection to the API of a model is kept open for the next request, in seconds."""
+    connect_timeout: float = Field(default=10.0)
+    """How many seconds to wait for a connection to the API of a model before giving up."""
+    warm_up: bool = Field(default=True)
+    """Connect to the API of the selected model when Luna starts and when another model is selected,
+    so the first reply doesn't wait for the connection."""
+
+
 class LaunchConfig(BaseModel):
     """The config of the application at launch.
 
@@ -155,16 +234,35 @@ class LaunchConfig(BaseModel):
     """The default Pygments syntax highlighting theme to be used in chatboxes."""
     models: list[LunaChatModel] = Field(default_factory=list)
     builtin_models: list[LunaChatModel] = Field(default_factory=get_builtin_models, init=False)
+    database: DatabaseConfig = Field(default_factory=DatabaseConfig)
+    """The settings of the database engine."""
+    streaming: StreamingConfig = Field(default_factory=StreamingConfig)
+    """The settings of streamed responses."""
+    chat_cache: ChatCacheConfig = Field(default_factory=ChatCacheConfig)
+    """The settings of the cache of recently opened chats."""
+    connections: ConnectionsConfig = Field(default_factory=ConnectionsConfig)
+    """The settings of the connections to the APIs of the models."""
+    fan_out_models: list[str] = Field(default_factory=list)
+    """The IDs or names of the models which `f4` sends a message to at once, to compare their replies side by side."""
 
     @property
     def all_models(self) -> list[LunaChatModel]:
         return self.models + self.builtin_models
 
+    @cached_property
+    def model_registry(self) -> "ModelRegistry":
+        """The models, indexed for lookups by ID or name."""
+        from luna_chat.models import ModelRegistry
+
+        return ModelRegistry(self.all_models)
+
     @property
     def default_model_object(self) -> LunaChatModel:
-        from luna_chat.models import get_model
+        return self.model_registry.get(self.default_model)
 
-        return get_model(self.default_model, self)
+    @property
+    def fan_out_model_objects(self) -> list[LunaChatModel]:
+        return [self.model_registry.get(model) for model in self.fan_out_models]
 
     @classmethod
     def get_current(cls) -> "LaunchConfig":
@@ -0,0 +1,338 @@
+# Copyright 2026 Leo Huber
+"""The archive tier.
+
+Archived chats are moved, with their messages, out of the main database
+into `luna-archive.sqlite`, so they don't bloat the tables and indexes the
+chat list and search work on. The archive is only attached to a connection
+while chats are moved to or from it, or browsed.
+
+Archiving a chat only sets `ChatDao.archived`. The app then moves flagged
+chats to the archive in the background, see `move_archived_chats`, so the
+chat list doesn't wait for the move. A chat keeps its ID when it is moved,
+unless the ID is taken in the other database (SQLite reuses the IDs of
+deleted rows), in which case the chat or its messages get new IDs. Which
+branch of a chat was shown isn't archived, a restored chat shows its most
+recent branch.
+
+When the main database is in WAL mode, a transaction spanning both
+databases is atomic for each database, but not across them. A crash while
+committing a move can leave a copy of the chat in both. Moves replace such
+a leftover copy, recognized by its fields and message IDs, rather than
+duplicating it.
+"""
+
+from __future__ import annotations
+
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Literal
+
+from sqlalchemy import DateTime, MetaData, Row, Table, bindparam, text
+from sqlalchemy.exc import OperationalError
+
+from luna_chat.database import database
+from luna_chat.database.database import read_connection, write_connection
+from luna_chat.database.migrations import link_replies_statement
+from luna_chat.database.models import ChatDao, MessageDao
+from luna_chat.database.search import index_messages, unindex_messages
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+    from contextlib import AbstractAsyncContextManager
+    from datetime import datetime
+    from pathlib import Path
+
+    from sqlalchemy.ext.asyncio import AsyncConnection
+
+Schema = Literal["main", "archive"]
+"""A database of the connection, only ever one of these names, which are put in SQL as they are."""
+
+ARCHIVE_SCHEMA_VERSION = 2
+
+_CHAT_COLUMNS = "id, model, title, started_at, archived, version, last_message_at, message_count"
+_MESSAGE_COLUMNS = "id, chat_id, role, content, content_encoding, timestamp, meta, parent_id, model"
+
+_ARCHIVE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS archive.chat (
+        id INTEGER NOT NULL PRIMARY KEY,
+        model VARCHAR NOT NULL,
+        title VARCHAR,
+        started_at DATETIME,
+        archived BOOLEAN NOT NULL,
+        version INTEGER NOT NULL DEFAULT 0,
+        last_message_at DATETIME,
+        message_count INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS archive.message (
+        id INTEGER NOT NULL PRIMARY KEY,
+        chat_id INTEGER,
+        role VARCHAR NOT NULL,
+        content VARCHAR NOT NULL,
+        content_encoding INTEGER NOT NULL DEFAULT 0,
+        timestamp DATETIME,
+        meta JSON,
+        parent_id INTEGER,
+        model VARCHAR
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS archive.ix_message_chat_id_timestamp ON message (chat_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS archive.ix_chat_last_message_at ON chat (last_message_at, id)",
+    # Version 2: chats archived before they could have branches become a single branch.
+    link_replies_statement("archive"),
+]
+
+
+_archive_metadata = MetaData()
+archived_chat_table: Table = ChatDao.__table__.to_metadata(_archive_metadata, schema="archive")  # type: ignore[attr-defined]
+"""The `chat` table of the attached archive, for queries."""
+archived_message_table: Table = MessageDao.__table__.to_metadata(_archive_metadata, schema="archive")  # type: ignore[attr-defined]
+"""The `message` table of the attached archive, for queries."""
+
+
+def archive_file_name() -> Path:
+    """Return the path of the archive, next to the main database."""
+    return database.sqlite_file_name.with_name("luna-archive.sqlite")
+
+
+def archive_exists() -> bool:
+    return archive_file_name().exists()
+
+
+@dataclass
+class _ArchiveState:
+    upgraded_archive: Path | None = None
+    """The archive whose schema was created or upgraded, which read-only connections can attach."""
+
+
+_state = _ArchiveState()
+
+
+@asynccontextmanager
+async def attached_archive(connection: AsyncConnection, *, read_only: bool = False) -> AsyncIterator[AsyncConnection]:
+    """Attach the archive to the connection as the `archive` schema, creating it if required.
+
+    The connection must not be in a transaction. It must be the writer
+    connection, as the archive's schema may have to be created or upgraded,
+    unless `read_only`: the schema is then brought up to date by the writer
+    connection first, the first time the archive is attached.
+    The archive is detached again before the connection goes back to the pool.
+    """
+    if read_only and _state.upgraded_archive != archive_file_name():
+        async with write_connection() as writer, attached_archive(writer):
+            pass
+    await connection.exec_driver_sql("ATTACH DATABASE ? AS archive", (str(archive_file_name()),))
+    try:
+        if not read_only:
+            await connection.exec_driver_sql(f"PRAGMA archive.journal_mode={database.get_database_config().journal_mode}")
+        version = (await connection.exec_driver_sql("PRAGMA archive.user_version")).scalar_one()
+        if version > ARCHIVE_SCHEMA_VERSION:
+            message = (
+                f"The archive schema version ({version}) is newer than the version "
+                f"supported by this version of Luna ({ARCHIVE_SCHEMA_VERSION}). Please upgrade Luna."
+            )
+            raise RuntimeError(message)
+        if version < ARCHIVE_SCHEMA_VERSION:
+            if read_only:
+                message = f"The archive schema version ({version}) is out of date, it's upgraded by the writer connection."
+                raise RuntimeError(message)
+            for statement in _ARCHIVE_SCHEMA:
+                await connection.exec_driver_sql(statement)
+            await connection.exec_driver_sql(f"PRAGMA archive.user_version = {ARCHIVE_SCHEMA_VERSION}")
+        await connection.commit()
+        if not read_only:
+            _state.upgraded_archive = archive_file_name()
+        yield connection
+    finally:
+        await connection.rollback()
+        try:
+            await connection.exec_driver_sql("DETACH DATABASE archive")
+        except OperationalError:
+            # E.g. a cursor on the archive is still open, don't pool a connection with it attached.
+            await connection.invalidate()
+
+
+async def archived_chat_ids(limit: int) -> list[int]:
+    """Return the IDs of chats which are flagged as archived, but still in the main database."""
+    async with read_connection() as connection:
+        result = await connection.exec_driver_sql("SELECT id FROM chat WHERE archived LIMIT ?", (limit,))
+        return list(result.scalars())
+
+
+async def move_archived_chats(batch_size: int) -> int:
+    """Move a batch of archived chats and their messages to the archive, in one transaction.
+
+    The archive is only attached if there are archived chats to move.
+
+    Returns:
+        The number of chats which were moved.
+    """
+    chat_ids = await archived_chat_ids(batch_size)
+    if not chat_ids:
+        return 0
+
+    async with write_connection() as connection, attached_archive(connection):
+        for chat_id in chat_ids:
+            await _move_chat(connection, chat_id, source="main", destination="archive")
+        await connection.commit()
+    return len(chat_ids)
+
+
+async def unarchive_chat(chat_id: int) -> int:
+    """Move an archived chat back to the main database, in one transaction.
+
+    Returns:
+        The ID of the chat in the main database, which is a new ID if its old one was taken.
+    """
+    async with write_connection() as connection:
+        # A chat which hasn't been moved yet only has to be flagged.
+        if await _restore_chat(connection, chat_id):
+            await connection.commit()
+            return chat_id
+
+        await connection.rollback()
+        async with attached_archive(connection):
+            new_chat_id = await _move_chat(connection, chat_id, source="archive", destination="main")
+            if not await _restore_chat(connection, new_chat_id):
+                message = f"Archived chat with ID {chat_id} not found."
+                raise RuntimeError(message)
+            await connection.commit()
+        return new_chat_id
+
+
+async def _restore_chat(connection: AsyncConnection, chat_id: int) -> bool:
+    result = await connection.execute(
+        text("UPDATE main.chat SET archived = 0, version = (SELECT coalesce(max(version), 0) + 1 FROM main.chat) WHERE id = :id AND archived"),
+        {"id": chat_id},
+    )
+    return result.rowcount > 0
+
+
+async def _move_chat(connection: AsyncConnection, chat_id: int, source: Schema, destination: Schema) -> int:
+    """Move a chat and its messages from one database to the other, as part of the connection's transaction.
+
+    Returns:
+        The ID of the chat in the destination.
+    """
+
+    async def scalar(statement: str, **parameters: int) -> int:
+        return (await connection.execute(text(statement), parameters)).scalar_one()
+
+    chat = await _chat_identity(connection, source, chat_id)
+    if chat is None:
+        message = f"Chat with ID {chat_id} not found."
+        raise RuntimeError(message)
+
+    new_chat_id = chat_id
+    existing = await _chat_identity(connection, destination, chat_id)
+    if existing is not None:
+        if existing == chat:
+            # A copy left behind by an interrupted move.
+            await _delete_messages(connection, destination, chat_id)
+            await connection.execute(text(f"DELETE FROM {destination}.chat WHERE id = :id"), {"id": chat_id})  # noqa: S608
+        else:
+            new_chat_id = await scalar(f"SELECT coalesce(max(id), 0) + 1 FROM {destination}.chat")  # noqa: S608
+
+    # Shift all message IDs of the chat past the destination's, if any of them could be taken.
+    offset = 0
+    first_id, last_id = chat[-2:]
+    if first_id is not None and await scalar(
+        f"SELECT count(*) FROM (SELECT 1 FROM {destination}.message WHERE id BETWEEN :first AND :last LIMIT 1)",  # noqa: S608
+        first=first_id,
+        last=last_id,
+    ):
+        offset = await scalar(f"SELECT coalesce(max(id), 0) + 1 FROM {destination}.message") - first_id  # noqa: S608
+
+    # The triggers on the main database's messages maintain the stats of its chats.
+    stats = "last_message_at, message_count" if destination == "archive" else "NULL, 0"
+    await connection.execute(
+        text(
+            f"INSERT INTO {destination}.chat ({_CHAT_COLUMNS}) "  # noqa: S608
+            f"SELECT :new_id, model, title, started_at, archived, version, {stats} FROM {source}.chat WHERE id = :id",
+        ),
+        {"id": chat_id, "new_id": new_chat_id},
+    )
+    await connection.execute(
+        text(
+            f"INSERT INTO {destination}.message ({_MESSAGE_COLUMNS}) "  # noqa: S608
+            f"SELECT id + :offset, :new_id, role, content, content_encoding, timestamp, meta, parent_id + :offset, model "
+            f"FROM {source}.message WHERE chat_id = :id ORDER BY id",
+        ),
+        {"id": chat_id, "new_id": new_chat_id, "offset": offset},
+    )
+    if destination == "main":
+        await index_messages(connection, await _message_ids(connection, "main", new_chat_id))
+    # The chat goes first, so the triggers on the messages don't update its stats one at a time. Its messages
+    # still refer to it until they are deleted too, so the foreign keys are only checked at the commit.
+    await connection.exec_driver_sql("PRAGMA defer_foreign_keys = ON")
+    await connection.execute(text(f"DELETE FROM {source}.chat WHERE id = :id"), {"id": chat_id})  # noqa: S608
+    await _delete_messages(connection, source, chat_id)
+    return new_chat_id
+
+
+async def _message_ids(connection: AsyncConnection, schema: Schema, chat_id: int) -> list[int]:
+    result = await connection.execute(text(f"SELECT id FROM {schema}.message WHERE chat_id = :id"), {"id": chat_id})  # noqa: S608
+    return list(result.scalars())
+
+
+async def _delete_messages(connection: AsyncConnection, schema: Schema, chat_id: int) -> None:
+    # Only the main database's messages are in the search index.
+    if schema == "main":
+        await unindex_messages(connection, await _message_ids(connection, "main", chat_id))
+    await connection.execute(text(f"DELETE FROM {schema}.message WHERE chat_id = :id"), {"id": chat_id})  # noqa: S608
+
+
+async def _chat_identity(connection: AsyncConnection, schema: Schema, chat_id: int) -> tuple[Any, ...] | None:
+    """Return what tells a chat apart from others with the same ID, or None if there is no such chat."""
+    messages = f"FROM {schema}.message WHERE chat_id = :id"
+    result = await connection.execute(
+        text(
+            f"SELECT started_at, model, title, (SELECT count(*) {messages}), (SELECT min(id) {messages}), (SELECT max(id) {messages}) "  # noqa: S608
+            f"FROM {schema}.chat WHERE id = :id",
+        ),
+        {"id": chat_id},
+    )
+    row = result.one_or_none()
+    return tuple(row) if row is not None else None
+
+
+async def archived_chat_summaries(
+    preview_length: int,
+    limit: int | None = None,
+    after: tuple[datetime, int] | None = None,
+) -> list[Row[Any]]:
+    """Query the archived chats, both moved and still to be moved, with the same columns as `ChatDao.summaries`.
+
+    Rows are ordered and paginated like `ChatDao.summaries`.
+    """
+    schemas: list[Schema] = ["archive", "main"] if archive_exists() else ["main"]
+
+    def tier(schema: Schema) -> str:
+        preview = (
+            f"SELECT substr(luna_content(content, content_encoding), 1, :preview_length) FROM {schema}.message "  # noqa: S608
+            f"WHERE chat_id = chat.id AND role = 'user' ORDER BY id LIMIT 1"
+        )
+        return (
+            f"SELECT id, model, title, archived, version, ({preview}) AS preview, last_message_at, message_count "  # noqa: S608
+            f"FROM {schema}.chat WHERE archived AND last_message_at IS NOT NULL"
+        )
+
+    statement = f"SELECT * FROM ({' UNION ALL '.join(tier(schema) for schema in schemas)})"  # noqa: S608
+    parameters: dict[str, Any] = {"preview_length": preview_length + 1}
+    if after is not None:
+        statement += " WHERE (last_message_at, id) < (:after_at, :after_id)"
+        parameters.update(after_at=after[0], after_id=after[1])
+    bind_types = [bindparam("after_at", type_=DateTime())] if after is not None else []
+    statement += " ORDER BY last_message_at DESC, id DESC"
+    if limit is not None:
+        statement += " LIMIT :limit"
+        parameters["limit"] = limit
+
+    async with read_connection() as connection:
+        archive: AbstractAsyncContextManager[Any] = attached_archive(connection, read_only=True) if "archive" in schemas else nullcontext()
+        async with archive:
+            statement_clause = text(statement).bindparams(*bind_types).columns(last_message_at=DateTime())
+            result = await connection.execute(statement_clause, parameters)
+            return list(result)
@@ -0,0 +1,169 @@
+# Copyright 2026 Leo Huber
+"""Transparent compression of message content.
+
+Message content of at least `DatabaseConfig.compression_threshold` bytes is
+stored compressed, as a BLOB, and `message.content_encoding` records how it
+was encoded. Code outside the database package only ever sees plain text:
+the converters decode the content, Luna maintains the search index with the
+decoded text through `index_messages` and `unindex_messages`, and SQL which
+needs the text (chat previews) goes through the `luna_content` function,
+which is registered on every connection.
+"""
+
+from __future__ import annotations
+
+import zlib
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import Function, func, text
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from types import ModuleType
+
+    from sqlalchemy.dialects.sqlite.aiosqlite import AsyncAdapt_aiosqlite_connection
+    from sqlalchemy.orm import Mapped
+
+    from luna_chat.config import DatabaseConfig
+
+
+class ContentEncoding(IntEnum):
+    PLAIN = 0
+    ZLIB = 1
+    ZSTD = 2
+
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 6
+
+
+@dataclass
+class CompressionResult:
+    messages: int = 0
+    """The number of messages which were compressed."""
+    size_before: int = 0
+    """The size of their content before, in bytes."""
+    size_after: int = 0
+    """The size of their content after, in bytes."""
+
+
+def zstandard() -> ModuleType:
+    """Return the zstandard module, which is an optional dependency."""
+    # Imported when it is needed, as it is optional.
+    try:
+        import zstandard  # noqa: PLC0415
+    except ImportError:
+        message = "zstd compression requires the zstandard package (pip install zstandard)."
+        raise RuntimeError(message) from None
+    return zstandard
+
+
+def encode_content(content: str, config: DatabaseConfig) -> tuple[str | bytes, ContentEncoding]:
+    """Return the content to store, compressed if it is long enough, and its encoding."""
+    data = content.encode()
+    if config.compression == "none" or len(data) < config.compression_threshold:
+        return content, ContentEncoding.PLAIN
+
+    if config.compression == "zstd":
+        compressed = zstandard().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+        encoding = ContentEncoding.ZSTD
+    else:
+        compressed = zlib.compress(data, ZLIB_LEVEL)
+        encoding = ContentEncoding.ZLIB
+
+    # Not worth decompressing on every read if it barely shrinks.
+    if len(compressed) > len(data) * 0.9:
+        return content, ContentEncoding.PLAIN
+    return compressed, encoding
+
+
+def decode_content(content: str | bytes | None, encoding: int) -> str:
+    """Return the text of content stored with the given encoding."""
+    if content is None:
+        return ""
+    if encoding == ContentEncoding.PLAIN:
+        return content if isinstance(content, str) else content.decode()
+
+    if isinstance(content, str):
+        message = "Compressed content must be stored as bytes."
+        raise TypeError(message)
+    if encoding == ContentEncoding.ZLIB:
+        return zlib.decompress(content).decode()
+    if encoding == ContentEncoding.ZSTD:
+        return zstandard().ZstdDecompressor().decompress(content).decode()
+    message = f"Unknown content encoding {encoding!r}."
+    raise ValueError(message)
+
+
+def register_functions(dbapi_connection: AsyncAdapt_aiosqlite_connection) -> None:
+    """Make `luna_content(content, content_encoding)` available in SQL on the connection."""
+    dbapi_connection.create_function("luna_content", 2, decode_content, deterministic=True)
+
+
+def content_text(content: Mapped[str | bytes], encoding: Mapped[int]) -> Function[str]:
+    """The SQL expression for the text of the content."""
+    return func.luna_content(content, encoding)
+
+
+async def compress_messages(
+    config: DatabaseConfig,
+    batch_size: int = 500,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> CompressionResult:
+    """Compress the content of the existing messages which are long enough.
+
+    Messages are compressed in batches, each in its own transaction, so the
+    command can be interrupted and run again.
+
+    Args:
+        config: The compression settings.
+        batch_size: The number of messages to compress per transaction.
+        on_progress: Called with the number of messages processed so far, and the total.
+    """
+    # The database module registers the SQL functions of this one.
+    from luna_chat.database.database import write_connection  # noqa: PLC0415
+
+    if config.compression == "none":
+        message = 'Compression is disabled, set "compression" in the [database] table of the config file.'
+        raise RuntimeError(message)
+
+    # Replies which are being streamed are compressed once complete.
+    candidates = (
+        "FROM message WHERE content_encoding = 0 AND length(CAST(content AS BLOB)) >= :threshold AND json_extract(meta, '$.in_progress') IS NULL"
+    )
+    result = CompressionResult()
+    async with write_connection() as connection:
+        total = (await connection.execute(text(f"SELECT count(*) {candidates}"), {"threshold": config.compression_threshold})).scalar_one()
+        processed = 0
+        last_id = 0
+        while True:
+            rows = (
+                await connection.execute(
+                    text(f"SELECT id, content {candidates} AND id > :last_id ORDER BY id LIMIT :limit"),
+                    {"threshold": config.compression_threshold, "last_id": last_id, "limit": batch_size},
+                )
+            ).all()
+            if not rows:
+                break
+
+            updates: list[dict[str, Any]] = []
+            for row in rows:
+                content, encoding = encode_content(row.content, config)
+                if encoding != ContentEncoding.PLAIN:
+                    updates.append({"id": row.id, "content": content, "encoding": int(encoding)})
+                    result.messages += 1
+                    result.size_before += len(row.content.encode())
+                    result.size_after += len(content)
+            if updates:
+                # The text stays the same, so the search index does too.
+                await connection.execute(text("UPDATE message SET content = :content, content_encoding = :encoding WHERE id = :id"), updates)
+            await connection.commit()
+
+            processed += len(rows)
+            last_id = rows[-1].id
+            if on_progress is not None:
+                on_progress(processed, total)
+
+    return result
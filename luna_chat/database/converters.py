@@ -1,8 +1,12 @@
+from collections.abc import Sequence
 from typing import TYPE_CHECKING, Any
 
+from sqlalchemy import Row
 
+from luna_chat.database.compression import ContentEncoding, decode_content, encode_content
+from luna_chat.database.database import get_database_config
 from luna_chat.database.models import ChatDao, MessageDao
-from luna_chat.models import ChatData, ChatMessage, get_model
+from luna_chat.models import ChatData, ChatMessage, ChatSummary, SearchHit, get_model
 
 if TYPE_CHECKING:
     from litellm.types.completion import ChatCompletionUserMessageParam
@@ -13,39 +17,131 @@ def chat_message_to_message_dao(
     chat_id: int,
 ) -> MessageDao:
     """Convert a ChatMessage to a SQLModel message."""
+    return MessageDao(**chat_message_to_message_row(message, chat_id))
+
+
+def chat_message_to_message_row(message: ChatMessage, chat_id: int, model: str | None = None) -> dict[str, Any]:
+    """Return the column values of a new `message` row for a ChatMessage, for bulk inserts.
+
+    Args:
+        model: The ID or name of the model to store, that of the message's model if None.
+    """
+    _, content, encoding, meta = _stored_content(message)
+    return {
+        "chat_id": chat_id,
+        "role": message.message["role"],
+        "content": content,
+        "content_encoding": encoding,
+        "timestamp": message.timestamp,
+        "model": model if model is not None else message.model.lookup_key,
+        "meta": meta,
+        "parent_id": message.parent.id if message.parent is not None else message.parent_id,
+    }
+
+
+def chat_message_meta(message: ChatMessage) -> dict[str, Any]:
+    """Return the `MessageDao.meta` of a ChatMessage."""
     meta: dict[str, Any] = {}
-    content = message.message.get("content", "")
-    return MessageDao(
-        chat_id=chat_id,
-        role=message.message["role"],
-        content=content if isinstance(content, str) else "",
-        timestamp=message.timestamp,
-        model=message.model.lookup_key,
-        meta=meta,
-    )
+    if message.in_progress:
+        meta["in_progress"] = True
+    return meta
+
+
+def chat_message_to_content(message: ChatMessage) -> tuple[int, str | bytes, int, dict[str, Any]]:
+    """Return the ID, stored content, content encoding and meta of a ChatMessage which is in the database."""
+    if message.id is None:
+        error_message = "The message isn't in the database."
+        raise ValueError(error_message)
+    return _stored_content(message)
+
+
+def _stored_content(message: ChatMessage) -> tuple[Any, str | bytes, int, dict[str, Any]]:
+    content = message.content or ""
+    stored: str | bytes
+    if message.in_progress:
+        # Saved over and over while streamed, compressed once complete.
+        stored, encoding = content, ContentEncoding.PLAIN
+    else:
+        stored, encoding = encode_content(content, get_database_config())
+    return message.id, stored, encoding, chat_message_meta(message)
 
 
-def chat_dao_to_chat_data(chat_dao: ChatDao) -> ChatData:
-    """Convert the SQLModel chat to a ChatData."""
+def chat_dao_to_chat_data(
+    chat_dao: ChatDao,
+    messages: Sequence[ChatMessage],
+    unloaded_message_count: int = 0,
+    preview: str | None = None,
+) -> ChatData:
+    """Convert the SQLModel chat to a ChatData.
+
+    Args:
+        messages: The messages which were loaded.
+        unloaded_message_count: The number of messages which weren't loaded.
+        preview: The start of the first user message, if it wasn't loaded.
+    """
     model = chat_dao.model
     return ChatData(
         id=chat_dao.id,
         title=chat_dao.title,
         model=get_model(model),
         create_timestamp=chat_dao.started_at if chat_dao.started_at else None,
-        messages=[message_dao_to_chat_message(message, model) for message in chat_dao.messages],
+        messages=list(messages),
+        unloaded_message_count=unloaded_message_count,
+        preview=preview,
+        version=chat_dao.version,
     )
 
 
 def message_dao_to_chat_message(message_dao: MessageDao, model: str) -> ChatMessage:
-    """Convert the SQLModel message to a ChatMessage."""
+    """Convert the SQLModel message to a ChatMessage, from its own model or else `model`, the chat's."""
     message: ChatCompletionUserMessageParam = {
-        "content": message_dao.content,
+        "content": decode_content(message_dao.content, message_dao.content_encoding),
         "role": message_dao.role,  # type: ignore
     }
 
     return ChatMessage(
         message=message,
         timestamp=message_dao.timestamp,
-        model=get_model(model),
+        model=get_model(message_dao.model or model),
+        id=message_dao.id,
+        in_progress=bool(message_dao.meta and message_dao.meta.get("in_progress")),
+        parent_id=message_dao.parent_id,
+    )
+
+
+def branch_row_to_chat_message(row: Row[Any], model: str) -> ChatMessage:
+    """Convert a row returned by `MessageDao.branch` or `MessageDao.ancestors` to a ChatMessage."""
+    message = message_dao_to_chat_message(row[0], model)
+    # Messages without a parent, i.e. the first of a chat, have no siblings.
+    if message.parent_id is not None:
+        message.sibling_index = row.sibling_index
+        message.sibling_count = row.sibling_count
+    return message
+
+
+def summary_row_to_chat_summary(row: Row[Any]) -> ChatSummary:
+    """Convert a row returned by `ChatDao.summaries` to a ChatSummary."""
+    return ChatSummary(
+        id=row.id,
+        model=get_model(row.model),
+        title=row.title,
+        preview=row.preview or "",
+        last_message_at=row.last_message_at,
+        message_count=row.message_count,
+        version=row.version,
+    )
+
+
+def search_row_to_search_hit(row: Row[Any], snippet: str) -> SearchHit:
+    """Convert a row returned by `search_messages`, and its snippet, to a SearchHit."""
+    return SearchHit(
+        chat_id=row.chat_id,
+        message_id=row.message_id,
+        model=get_model(row.model),
+        title=row.title,
+        preview=row.preview or "",
+        role=row.role,
+        timestamp=row.timestamp,
+        snippet=snippet,
+        rank=row.rank,
     )
@@ -1,25 +1,192 @@
+"""The database engine layer.
+
+Writes and reads go through separate engines, created lazily on first use
+with the settings from `configure_database` (sourced from the config file):
+
+- A single writer connection. Writers take turns on it, in the order they
+  asked for it, so there is never a transaction waiting for SQLite's write
+  lock, and writes are applied in the order they were issued.
+- A pool of read-only connections. In WAL mode a read doesn't wait for the
+  writer, it sees the database as of the last commit.
+
+Every connection gets the SQLite pragmas of the `DatabaseConfig` applied,
+and Luna's SQL functions registered, when it is opened.
+"""
+
+import asyncio
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
-from sqlmodel import SQLModel
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, AsyncGenerator
+from sqlalchemy import event
+from luna_chat.config import DatabaseConfig
+from luna_chat.database.compression import register_functions
 from luna_chat.locations import data_directory
 
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine, async_sessionmaker
+
+if TYPE_CHECKING:
+    from sqlalchemy.dialects.sqlite.aiosqlite import AsyncAdapt_aiosqlite_connection
+    from sqlalchemy.pool import ConnectionPoolEntry
+
+    from luna_chat.database.migrations import Migration
 
 
 sqlite_file_name = data_directory() / "luna.sqlite"
 sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
-engine = create_async_engine(sqlite_url)
 
 
-async def create_database():
-    async with engine.begin() as conn:
-        # TODO - check if exists, use Alembic.
-        await conn.run_sync(SQLModel.metadata.create_all)
+@dataclass
+class _DatabaseState:
+    config: DatabaseConfig = field(default_factory=DatabaseConfig)
+    engine: AsyncEngine | None = None
+    read_engine: AsyncEngine | None = None
+    session_factory: async_sessionmaker[AsyncSession] | None = None
+    read_session_factory: async_sessionmaker[AsyncSession] | None = None
+    write_lock: asyncio.Lock | None = None
+
+
+_state = _DatabaseState()
+"""The engine settings, and what is created from them on first use until `dispose_engine`."""
+
+
+def configure_database(config: DatabaseConfig) -> None:
+    """Set the engine settings. Must be called before the database is first used."""
+    if _state.engine is not None or _state.read_engine is not None:
+        message = "The database engine has already been created."
+        raise RuntimeError(message)
+    _state.config = config
+
+
+def get_database_config() -> DatabaseConfig:
+    """Return the settings the engine is, or will be, created with."""
+    return _state.config
+
+
+def get_engine() -> AsyncEngine:
+    """Return the engine of the writer connection, creating it on first use.
+
+    Use `write_connection` or `write_session` rather than connecting to it
+    directly, which doesn't wait for the turn of the caller.
+    """
+    if _state.engine is None:
+        config = _state.config
+        _state.engine = create_async_engine(
+            sqlite_url,
+            echo=config.echo,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=config.pool_timeout,
+        )
+        event.listen(_state.engine.sync_engine, "connect", _on_connect)
+    return _state.engine
+
+
+def get_read_engine() -> AsyncEngine:
+    """Return the engine of the read-only connections, creating it on first use."""
+    if _state.read_engine is None:
+        config = _state.config
+        _state.read_engine = create_async_engine(
+            sqlite_url,
+            echo=config.echo,
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            pool_timeout=config.pool_timeout,
+        )
+        event.listen(_state.read_engine.sync_engine, "connect", _on_read_connect)
+    return _state.read_engine
+
+
+def _on_connect(dbapi_connection: "AsyncAdapt_aiosqlite_connection", _connection_record: "ConnectionPoolEntry") -> None:
+    config = _state.config
+    register_functions(dbapi_connection)
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={config.journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={config.synchronous}")
+        cursor.execute(f"PRAGMA cache_size={int(config.cache_size)}")
+        cursor.execute(f"PRAGMA mmap_size={int(config.mmap_size)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.busy_timeout)}")
+        cursor.execute(f"PRAGMA temp_store={config.temp_store}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
+
+def _on_read_connect(dbapi_connection: "AsyncAdapt_aiosqlite_connection", connection_record: "ConnectionPoolEntry") -> None:
+    _on_connect(dbapi_connection, connection_record)
+    # Rather than opening the file read-only, which fails while the write-ahead log doesn't exist.
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def _get_write_lock() -> asyncio.Lock:
+    if _state.write_lock is None:
+        _state.write_lock = asyncio.Lock()
+    return _state.write_lock
+
+
+async def dispose_engine() -> None:
+    """Close all pooled connections, e.g. before the event loop they were opened on goes away."""
+    for engine in (_state.engine, _state.read_engine):
+        if engine is not None:
+            await engine.dispose()
+    _state.engine = None
+    _state.read_engine = None
+    _state.session_factory = None
+    _state.read_session_factory = None
+    _state.write_lock = None
+
+
+async def create_database() -> list["Migration"]:
+    """Create the database, or upgrade the schema of an existing one.
+
+    Returns:
+        The migrations which were applied.
+    """
+    # The migrations import the models, which import this module.
+    from luna_chat.database.migrations import migrate_database  # noqa: PLC0415
+
+    async with write_connection() as conn:
+        return await conn.run_sync(migrate_database)
+
+
+def database_size() -> int:
+    """Return the size of the database on disk, including the write-ahead log, in bytes."""
+    paths = [sqlite_file_name, sqlite_file_name.with_name(sqlite_file_name.name + "-wal")]
+    return sum(path.stat().st_size for path in paths if path.exists())
+
+
+@asynccontextmanager
+async def write_connection() -> AsyncGenerator[AsyncConnection, None]:
+    """Wait for the turn of the caller, and connect to the writer connection until the block exits."""
+    async with _get_write_lock(), get_engine().connect() as connection:
+        yield connection
+
+
+@asynccontextmanager
+async def read_connection() -> AsyncGenerator[AsyncConnection, None]:
+    """Connect to one of the read-only connections, which can't change the database."""
+    async with get_read_engine().connect() as connection:
+        yield connection
+
+
+@asynccontextmanager
+async def write_session() -> AsyncGenerator[AsyncSession, None]:
+    """Like `write_connection`, for a session. Don't open a write session or connection within it, that waits forever."""
+    if _state.session_factory is None:
+        _state.session_factory = async_sessionmaker(get_engine(), class_=AsyncSession, expire_on_commit=False)
+    async with _get_write_lock(), _state.session_factory() as session:
+        yield session
 
 
 @asynccontextmanager
-async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    async with async_session() as session:
+async def read_session() -> AsyncGenerator[AsyncSession, None]:
+    """Like `read_connection`, for a session."""
+    if _state.read_session_factory is None:
+        _state.read_session_factory = async_sessionmaker(get_read_engine(), class_=AsyncSession, expire_on_commit=False)
+    async with _state.read_session_factory() as session:
         yield session
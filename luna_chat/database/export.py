@@ -0,0 +1,530 @@
+# Copyright 2026 Leo Huber
+"""Export and import of all chats as JSON Lines.
+
+An export is a stream of JSON objects, one per line: a header, followed by
+every chat and its messages, in chat ID order. Files ending in `.gz` or
+`.zst` are compressed. Both directions stream through the data, so memory
+use depends on the batch size rather than the size of the database.
+
+Exports are written in batches of chats, each one a self-contained gzip
+member or zstd frame, and the progress is saved next to the export after
+every batch. An interrupted export resumes after the last complete batch.
+
+Imports save their progress in the database, in the same transaction as
+each batch of chats, so an interrupted import resumes where it stopped and
+importing the same export twice doesn't duplicate any chats. Chats and
+messages get new IDs when they are imported.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import io
+import json
+from collections.abc import Callable
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from typing import IO, TYPE_CHECKING, Any, BinaryIO, Literal, cast
+from uuid import uuid4
+
+from sqlalchemy import Row, Table, func, insert, select, text
+
+from luna_chat.database.archive import archive_exists, archived_chat_table, archived_message_table, attached_archive
+from luna_chat.database.compression import ContentEncoding, decode_content, encode_content, zstandard
+from luna_chat.database.database import get_database_config, read_connection, write_connection
+from luna_chat.database.models import ChatDao, MessageDao
+from luna_chat.database.search import index_messages
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Iterator
+    from contextlib import AbstractAsyncContextManager
+    from pathlib import Path
+
+    from sqlalchemy.ext.asyncio import AsyncConnection
+
+EXPORT_FORMAT = "luna-export"
+EXPORT_FORMAT_VERSION = 1
+
+Compression = Literal["gzip", "zstd"]
+
+ProgressCallback = Callable[[int, int], None]
+"""Called with the amount of work done so far and the total amount of work."""
+
+_READ_SIZE = 1 << 20
+"""About how many bytes of an export are read at a time when importing it."""
+
+
+@dataclass
+class TransferCounts:
+    chats: int = 0
+    messages: int = 0
+
+
+@dataclass
+class _ExportProgress:
+    export_id: str
+    last_chat_id: int
+    """The ID of the last chat in the last complete batch."""
+    size: int
+    """The size of the export file at the end of the last complete batch."""
+    chats: int
+    messages: int
+    tier: int = 0
+    """0 while the chats of the main database are exported, 1 for those in the archive."""
+
+
+@dataclass
+class _ImportedChat:
+    chat: dict[str, Any]
+    messages: list[dict[str, Any]]
+
+
+def compression_for(path: Path) -> Compression | None:
+    """Return the compression to use, based on the file extension."""
+    suffix = path.suffix.lower()
+    if suffix == ".gz":
+        return "gzip"
+    if suffix in (".zst", ".zstd"):
+        return "zstd"
+    return None
+
+
+def export_progress_path(path: Path) -> Path:
+    """Return the path of the file the progress of an export to `path` is saved to."""
+    return path.with_name(path.name + ".progress")
+
+
+@contextmanager
+def _compressed_member(file: BinaryIO, compression: Compression | None) -> Iterator[IO[bytes]]:
+    """Write a gzip member or zstd frame to the file.
+
+    Concatenated members decompress to the concatenation of their contents.
+    """
+    if compression == "gzip":
+        with gzip.GzipFile(fileobj=file, mode="wb") as member:
+            yield cast("IO[bytes]", member)
+    elif compression == "zstd":
+        with zstandard().ZstdCompressor().stream_writer(file, closefd=False) as member:
+            yield member
+    else:
+        yield file
+
+
+def _decompressed(file: BinaryIO, compression: Compression | None) -> IO[bytes]:
+    if compression == "gzip":
+        return cast("IO[bytes]", gzip.GzipFile(fileobj=file, mode="rb"))
+    if compression == "zstd":
+        reader = zstandard().ZstdDecompressor().stream_reader(file, read_across_frames=True, closefd=False)
+        return io.BufferedReader(reader)
+    return file
+
+
+def _encode(record: dict[str, Any]) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+def _format_datetime(value: datetime | None) -> str | None:
+    return value.isoformat() if value is not None else None
+
+
+def _parse_datetime(value: str | None) -> datetime | None:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _chat_record(row: Row[*tuple[Any, ...]]) -> dict[str, Any]:
+    return {
+        "type": "chat",
+        "id": row.id,
+        "model": row.model,
+        "title": row.title,
+        "started_at": _format_datetime(row.started_at),
+        "archived": row.archived,
+    }
+
+
+def _message_record(row: Row[*tuple[Any, ...]]) -> dict[str, Any]:
+    return {
+        "type": "message",
+        "id": row.id,
+        "chat_id": row.chat_id,
+        "parent_id": row.parent_id,
+        "role": row.role,
+        "content": decode_content(row.content, row.content_encoding),
+        "timestamp": _format_datetime(row.timestamp),
+        "model": row.model,
+        "meta": row.meta,
+    }
+
+
+def _read_export_progress(path: Path) -> _ExportProgress | None:
+    try:
+        return _ExportProgress(**json.loads(path.read_text()))
+    except FileNotFoundError:
+        return None
+
+
+def _save_export_progress(path: Path, progress: _ExportProgress) -> None:
+    # Replace the file, so there is always a complete progress file.
+    temporary_path = path.with_name(path.name + ".tmp")
+    temporary_path.write_text(json.dumps(asdict(progress)))
+    temporary_path.replace(path)
+
+
+@dataclass
+class _ExportWriter:
+    """The file of an export and its progress. Its methods block on the disk, they are run in a thread."""
+
+    file: BinaryIO
+    compression: Compression | None
+    progress: _ExportProgress
+    progress_path: Path
+
+    @classmethod
+    def open(cls, path: Path) -> _ExportWriter:
+        """Open the export to resume it if it was interrupted, or else start it with its header."""
+        compression = compression_for(path)
+        progress_path = export_progress_path(path)
+        progress = _read_export_progress(progress_path) if path.exists() else None
+        file = path.open("r+b" if progress is not None else "wb")
+        try:
+            if progress is None:
+                progress = _ExportProgress(export_id=uuid4().hex, last_chat_id=0, size=0, chats=0, messages=0)
+                header = {
+                    "type": "header",
+                    "format": EXPORT_FORMAT,
+                    "version": EXPORT_FORMAT_VERSION,
+                    "export_id": progress.export_id,
+                    "created_at": datetime.now(UTC).isoformat(),
+                }
+                with _compressed_member(file, compression) as member:
+                    member.write(_encode(header))
+                progress.size = file.tell()
+                _save_export_progress(progress_path, progress)
+            else:
+                # Drop whatever was written of the batch which was interrupted.
+                file.truncate(progress.size)
+                file.seek(progress.size)
+        except BaseException:
+            file.close()
+            raise
+        return cls(file, compression, progress, progress_path)
+
+    def write_batch(self, batch: list[bytes], last_chat_id: int, chats: int, messages: int) -> None:
+        with _compressed_member(self.file, self.compression) as member:
+            member.write(b"".join(batch))
+        self.file.flush()
+        progress = self.progress
+        progress.last_chat_id = last_chat_id
+        progress.size = self.file.tell()
+        progress.chats += chats
+        progress.messages += messages
+        _save_export_progress(self.progress_path, progress)
+
+    def close(self, *, completed: bool) -> None:
+        """Close the file, and delete the progress if the export is complete."""
+        self.file.close()
+        if completed:
+            self.progress_path.unlink()
+
+
+async def export_chats(
+    path: Path,
+    batch_size: int = 500,
+    on_progress: ProgressCallback | None = None,
+) -> TransferCounts:
+    """Export all chats and their messages to a JSON Lines file.
+
+    Resumes the previous export to the same path if it was interrupted.
+
+    Args:
+        path: The file to write, compressed if it ends in `.gz` or `.zst`.
+        batch_size: The number of chats to write between saving the progress.
+        on_progress: Called with the number of chats exported so far, and the total.
+
+    Returns:
+        The number of chats and messages in the export.
+    """
+    writer = await asyncio.to_thread(_ExportWriter.open, path)
+    progress = writer.progress
+    completed = False
+    try:
+        with_archive = await asyncio.to_thread(archive_exists)
+        async with read_connection() as connection:
+            # Archived chats which were moved to the archive database are exported after the others.
+            archive: AbstractAsyncContextManager[Any] = attached_archive(connection, read_only=True) if with_archive else nullcontext()
+            async with archive:
+                tiers = [(ChatDao.__table__, MessageDao.__table__)]  # type: ignore[attr-defined]
+                if with_archive:
+                    tiers.append((archived_chat_table, archived_message_table))
+
+                total = progress.chats + await _chats_to_export(connection, tiers, progress)
+                for index, (chat_table, message_table) in enumerate(tiers[progress.tier :], start=progress.tier):
+                    if index > progress.tier:
+                        progress.tier, progress.last_chat_id = index, 0
+                    async for batch in _export_batches(connection, chat_table, message_table, progress.last_chat_id, batch_size):
+                        await asyncio.to_thread(writer.write_batch, *batch)
+                        if on_progress is not None:
+                            on_progress(progress.chats, total)
+
+        if on_progress is not None:
+            on_progress(progress.chats, total)
+        completed = True
+    finally:
+        await asyncio.to_thread(writer.close, completed=completed)
+
+    return TransferCounts(chats=progress.chats, messages=progress.messages)
+
+
+async def _chats_to_export(connection: AsyncConnection, tiers: list[tuple[Table, Table]], progress: _ExportProgress) -> int:
+    """Count the chats which are still to be exported, from the tier the export is at."""
+    count = 0
+    for index, (chat_table, _) in enumerate(tiers[progress.tier :], start=progress.tier):
+        after = progress.last_chat_id if index == progress.tier else 0
+        count += (await connection.execute(select(func.count()).select_from(chat_table).where(chat_table.c.id > after))).scalar_one()
+    return count
+
+
+async def _export_batches(
+    connection: AsyncConnection,
+    chat_table: Table,
+    message_table: Table,
+    after_chat_id: int,
+    batch_size: int,
+) -> AsyncIterator[tuple[list[bytes], int, int, int]]:
+    """Stream the encoded chats after the given ID, with their messages, in batches.
+
+    Yields:
+        The encoded records of each batch, the ID of its last chat, and the number of chats and messages in it.
+    """
+    chats = await connection.stream(
+        select(chat_table.c.id, chat_table.c.model, chat_table.c.title, chat_table.c.started_at, chat_table.c.archived)
+        .where(chat_table.c.id > after_chat_id)
+        .order_by(chat_table.c.id),
+    )
+    # Walks the (chat_id, timestamp) index alongside the chats, rather than sorting all messages.
+    columns = message_table.c
+    messages = await connection.stream(
+        select(
+            columns.id,
+            columns.chat_id,
+            columns.parent_id,
+            columns.role,
+            columns.content,
+            columns.content_encoding,
+            columns.timestamp,
+            columns.model,
+            columns.meta,
+        )
+        .where(columns.chat_id > after_chat_id)
+        .order_by(columns.chat_id, columns.timestamp, columns.id),
+    )
+
+    batch: list[bytes] = []
+    batch_chats = batch_messages = 0
+    last_chat_id = after_chat_id
+    message = await messages.fetchone()
+    async for chat in chats:
+        # Messages of chats which no longer exist are skipped.
+        while message is not None and message.chat_id < chat.id:
+            message = await messages.fetchone()
+        batch.append(_encode(_chat_record(chat)))
+        while message is not None and message.chat_id == chat.id:
+            batch.append(_encode(_message_record(message)))
+            batch_messages += 1
+            message = await messages.fetchone()
+        batch_chats += 1
+        last_chat_id = chat.id
+
+        if batch_chats == batch_size:
+            yield batch, last_chat_id, batch_chats, batch_messages
+            batch, batch_chats, batch_messages = [], 0, 0
+
+    if batch:
+        yield batch, last_chat_id, batch_chats, batch_messages
+    await chats.close()
+    await messages.close()
+
+
+async def import_chats(
+    path: Path,
+    batch_size: int = 500,
+    on_progress: ProgressCallback | None = None,
+) -> TransferCounts:
+    """Import the chats of an export, in addition to the existing chats.
+
+    Resumes the previous import of the same export if it was interrupted,
+    and skips what was already imported.
+
+    Args:
+        path: The export to read, decompressed if it ends in `.gz` or `.zst`.
+        batch_size: The number of chats to insert per transaction.
+        on_progress: Called with the number of bytes of the file read so far, and the file size.
+
+    Returns:
+        The number of chats and messages which were imported.
+    """
+    total = (await asyncio.to_thread(path.stat)).st_size
+    counts = TransferCounts()
+
+    file = await asyncio.to_thread(open, path, "rb")
+    try:
+        reader = _decompressed(file, compression_for(path))
+        export_id = await asyncio.to_thread(_read_header, reader, path)
+
+        async with write_connection() as connection:
+            batch: list[_ImportedChat] = []
+            records = 0
+            async for chat, records in _read_chats(reader, path, await _imported_records(connection, export_id)):
+                batch.append(chat)
+                if len(batch) == batch_size:
+                    await _import_batch(connection, export_id, batch, records, counts)
+                    batch = []
+                    if on_progress is not None:
+                        on_progress(file.tell(), total)
+            if batch:
+                await _import_batch(connection, export_id, batch, records, counts)
+            if on_progress is not None:
+                on_progress(total, total)
+    finally:
+        await asyncio.to_thread(file.close)
+
+    return counts
+
+
+def _read_header(reader: IO[bytes], path: Path) -> str:
+    """Read the header of the export, and return the ID of the export."""
+    header = json.loads(reader.readline() or "{}")
+    if header.get("type") != "header" or header.get("format") != EXPORT_FORMAT:
+        message = f"{path} is not a Luna export."
+        raise ValueError(message)
+    if header["version"] > EXPORT_FORMAT_VERSION:
+        message = f"{path} was exported by a newer version of Luna. Please upgrade Luna."
+        raise ValueError(message)
+    return header["export_id"]
+
+
+async def _read_lines(reader: IO[bytes]) -> AsyncIterator[bytes]:
+    """Read the lines of the file in a thread, about `_READ_SIZE` bytes at a time."""
+    while lines := await asyncio.to_thread(reader.readlines, _READ_SIZE):
+        for line in lines:
+            yield line
+
+
+async def _read_chats(reader: IO[bytes], path: Path, imported_records: int) -> AsyncIterator[tuple[_ImportedChat, int]]:
+    """Read the chats of the export with their messages, skipping the records which were already imported.
+
+    Yields:
+        Each chat, and the number of records up to its end, which are imported once it is.
+    """
+    records = 0
+    chat: _ImportedChat | None = None
+    async for line in _read_lines(reader):
+        records += 1
+        if records <= imported_records:
+            continue
+
+        record = json.loads(line)
+        if record["type"] == "chat":
+            if chat is not None:
+                yield chat, records - 1
+            chat = _ImportedChat(record, [])
+        elif record["type"] == "message":
+            if chat is None or chat.chat["id"] != record["chat_id"]:
+                message = f"Line {records + 1} of {path}: message {record['id']} doesn't follow its chat."
+                raise ValueError(message)
+            chat.messages.append(record)
+        # Unknown record types are skipped, they may be added by newer versions.
+
+    if chat is not None:
+        yield chat, records
+
+
+async def _imported_records(connection: AsyncConnection, export_id: str) -> int:
+    result = await connection.execute(
+        text("SELECT records FROM import_progress WHERE export_id = :export_id"),
+        {"export_id": export_id},
+    )
+    return result.scalar_one_or_none() or 0
+
+
+async def _import_batch(
+    connection: AsyncConnection,
+    export_id: str,
+    batch: list[_ImportedChat],
+    records: int,
+    counts: TransferCounts,
+) -> None:
+    """Insert a batch of chats and their messages in a single transaction."""
+    try:
+        # Writing first takes the database's write lock, so no other writer can
+        # take the IDs assigned below. Assigning IDs up front lets the rows be
+        # inserted with plain multi-row inserts, without RETURNING.
+        await connection.execute(
+            text(
+                "INSERT INTO import_progress (export_id, records) VALUES (:export_id, :records) "
+                "ON CONFLICT (export_id) DO UPDATE SET records = excluded.records",
+            ),
+            {"export_id": export_id, "records": records},
+        )
+        next_chat_id, next_message_id, version = (
+            await connection.execute(
+                select(
+                    select(func.coalesce(func.max(ChatDao.id), 0) + 1).scalar_subquery(),
+                    select(func.coalesce(func.max(MessageDao.id), 0) + 1).scalar_subquery(),
+                    ChatDao.next_version(),
+                ),
+            )
+        ).one()
+
+        config = get_database_config()
+        chat_rows: list[dict[str, Any]] = []
+        message_rows: list[dict[str, Any]] = []
+        for chat_id, imported in enumerate(batch, start=next_chat_id):
+            chat_rows.append(
+                {
+                    "id": chat_id,
+                    "model": imported.chat["model"],
+                    "title": imported.chat["title"],
+                    "started_at": _parse_datetime(imported.chat["started_at"]),
+                    "archived": imported.chat["archived"],
+                    "version": version,
+                },
+            )
+            message_ids = {message["id"]: message_id for message_id, message in enumerate(imported.messages, start=next_message_id)}
+            next_message_id += len(imported.messages)
+            previous_id: int | None = None
+            for message in imported.messages:
+                meta = message["meta"] or {}
+                if meta.get("in_progress"):
+                    content, encoding = message["content"], ContentEncoding.PLAIN
+                else:
+                    content, encoding = encode_content(message["content"], config)
+                message_rows.append(
+                    {
+                        "id": message_ids[message["id"]],
+                        "chat_id": chat_id,
+                        # Exports from before chats had branches don't link the messages.
+                        "parent_id": message_ids.get(message["parent_id"]) if message["parent_id"] is not None else previous_id,
+                        "role": message["role"],
+                        "content": content,
+                        "content_encoding": encoding,
+                        "timestamp": _parse_datetime(message["timestamp"]),
+                        "model": message["model"],
+                        "meta": meta,
+                    },
+                )
+                previous_id = message_ids[message["id"]]
+
+        await connection.execute(insert(ChatDao), chat_rows)
+        if message_rows:
+            await connection.execute(insert(MessageDao), message_rows)
+            await index_messages(connection, [row["id"] for row in message_rows])
+        await connection.commit()
+    except BaseException:
+        await connection.rollback()
+        raise
+
+    counts.chats += len(chat_rows)
+    counts.messages += len(message_rows)
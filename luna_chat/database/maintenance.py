@@ -0,0 +1,204 @@
+# Copyright 2026 Leo Huber
+"""Maintenance of the database: statistics, query planner statistics, vacuuming and integrity checks.
+
+SQLite doesn't count how often indexes are used, so the statistics report
+the size of each index and what `ANALYZE` recorded about it, which is what
+the query planner goes by.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from luna_chat.database import database
+from luna_chat.database.archive import archive_file_name
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncConnection
+
+INCREMENTAL_VACUUM = 2
+"""The value of `PRAGMA auto_vacuum` which makes `PRAGMA incremental_vacuum` possible."""
+
+
+@dataclass
+class TableStats:
+    name: str
+    rows: int
+    size: int | None
+    """The bytes used by the table, None if SQLite was built without the `dbstat` table."""
+
+
+@dataclass
+class IndexStats:
+    name: str
+    table: str
+    size: int | None
+    """The bytes used by the index, None if SQLite was built without the `dbstat` table."""
+    statistics: str | None
+    """The row count and average rows per key recorded by `ANALYZE`, None if it wasn't analyzed yet."""
+
+
+@dataclass
+class DatabaseStats:
+    size: int
+    """The size of the database on disk, including the write-ahead log, in bytes."""
+    archive_size: int
+    """The size of the archive on disk, in bytes."""
+    page_size: int
+    page_count: int
+    free_pages: int
+    """Pages which hold no data, and are reused before the file grows."""
+    auto_vacuum: int
+    """The `PRAGMA auto_vacuum` mode: 0 none, 1 full, 2 incremental."""
+    tables: list[TableStats] = field(default_factory=list)
+    indexes: list[IndexStats] = field(default_factory=list)
+
+
+@dataclass
+class CheckResult:
+    problems: list[str] = field(default_factory=list)
+    """What the checks reported, empty if the database is fine."""
+    messages_to_backfill: int = 0
+    """Messages from before the search index which it doesn't have yet, as the backfill hasn't reached them."""
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+
+async def database_stats() -> DatabaseStats:
+    """Collect the size, row counts, index sizes and free pages of the database."""
+    async with database.read_connection() as connection:
+
+        async def scalar(statement: str) -> int:
+            return (await connection.exec_driver_sql(statement)).scalar_one()
+
+        stats = DatabaseStats(
+            size=database.database_size(),
+            archive_size=archive_file_name().stat().st_size if archive_file_name().exists() else 0,
+            page_size=await scalar("PRAGMA page_size"),
+            page_count=await scalar("PRAGMA page_count"),
+            free_pages=await scalar("PRAGMA freelist_count"),
+            auto_vacuum=await scalar("PRAGMA auto_vacuum"),
+        )
+
+        sizes = await _object_sizes(connection)
+        schema = await connection.exec_driver_sql(
+            "SELECT type, name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index') AND name NOT LIKE 'sqlite_%' ORDER BY name",
+        )
+        schema_rows = schema.all()
+        statistics = await _index_statistics(connection)
+        for row in schema_rows:
+            name = row.name
+            if row.type == "table":
+                # The shadow tables of the search index are counted as part of it.
+                if row.tbl_name.startswith("message_fts_"):
+                    continue
+                rows = await scalar(f'SELECT count(*) FROM "{name}"')  # noqa: S608
+                size = _fts_size(name, sizes) if name == "message_fts" else sizes.get(name)
+                stats.tables.append(TableStats(name, rows, size))
+            else:
+                stats.indexes.append(IndexStats(name, row.tbl_name, sizes.get(name), statistics.get(name)))
+    return stats
+
+
+async def _object_sizes(connection: AsyncConnection) -> dict[str, int]:
+    try:
+        result = await connection.exec_driver_sql("SELECT name, sum(pgsize) AS size FROM dbstat GROUP BY name")
+    except OperationalError:
+        # SQLite was built without SQLITE_ENABLE_DBSTAT_VTAB.
+        await connection.rollback()
+        return {}
+    return {row.name: row.size for row in result}
+
+
+def _fts_size(name: str, sizes: dict[str, int]) -> int | None:
+    shadow_sizes = [size for table, size in sizes.items() if table == name or table.startswith(f"{name}_")]
+    return sum(shadow_sizes) if shadow_sizes else None
+
+
+async def _index_statistics(connection: AsyncConnection) -> dict[str, str]:
+    exists = await connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+    if exists.first() is None:
+        return {}
+    result = await connection.exec_driver_sql("SELECT idx, stat FROM sqlite_stat1 WHERE idx IS NOT NULL")
+    return {row.idx: row.stat for row in result}
+
+
+async def optimize(*, analyze: bool = False) -> None:
+    """Update the query planner statistics.
+
+    Args:
+        analyze: Analyze all tables and indexes. Otherwise `PRAGMA optimize`
+            only analyzes those whose statistics are missing or out of date,
+            which is usually cheap enough to run whenever Luna exits.
+    """
+    async with database.write_connection() as writer:
+        connection = await writer.execution_options(isolation_level="AUTOCOMMIT")
+        if analyze:
+            await connection.exec_driver_sql("ANALYZE")
+        await connection.exec_driver_sql("PRAGMA optimize")
+
+
+async def vacuum(*, full: bool = False) -> None:
+    """Return free pages to the file system.
+
+    The first time, this rebuilds the database with incremental vacuuming
+    enabled. After that only the free pages are released, which is much
+    quicker than rebuilding the file.
+
+    Args:
+        full: Rebuild the database file, which also defragments it.
+    """
+    async with database.write_connection() as writer:
+        # Neither VACUUM nor incremental_vacuum can run inside a transaction.
+        connection = await writer.execution_options(isolation_level="AUTOCOMMIT")
+        auto_vacuum = (await connection.exec_driver_sql("PRAGMA auto_vacuum")).scalar_one()
+        if full or auto_vacuum != INCREMENTAL_VACUUM:
+            # The new mode only takes effect with a VACUUM on the same connection.
+            await connection.exec_driver_sql(f"PRAGMA auto_vacuum = {INCREMENTAL_VACUUM}")
+            await connection.exec_driver_sql("VACUUM")
+        else:
+            await connection.exec_driver_sql("PRAGMA incremental_vacuum")
+        await connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+async def check_database(*, quick: bool = False) -> CheckResult:
+    """Check the integrity of the database and the search index.
+
+    Args:
+        quick: Skip checking that indexes match their tables, which takes
+            a fraction of the time on large databases.
+    """
+    result = CheckResult()
+    async with database.write_connection() as connection:
+        check = "quick_check" if quick else "integrity_check"
+        messages = [row[0] for row in await connection.exec_driver_sql(f"PRAGMA {check}")]
+        if messages != ["ok"]:
+            result.problems.extend(messages)
+
+        for row in await connection.exec_driver_sql("PRAGMA foreign_key_check"):
+            result.problems.append(f"Row {row.rowid} of {row.table} refers to a missing row of {row.parent}")
+
+        try:
+            await connection.exec_driver_sql("INSERT INTO message_fts (message_fts) VALUES ('integrity-check')")
+        except DBAPIError as error:
+            result.problems.append(f"The search index is corrupt: {error}")
+        await connection.rollback()
+
+        # System prompts aren't indexed, and replies only once they are complete. Messages
+        # the backfill hasn't reached yet aren't missing, see `search.backfill_search_index`.
+        unindexed = await connection.exec_driver_sql(
+            "SELECT coalesce(sum(id > backfill.next), 0) AS missing, coalesce(sum(id <= backfill.next), 0) AS to_backfill "
+            "FROM message, (SELECT coalesce(max(next_message_id), 0) AS next FROM search_backfill) AS backfill "
+            "WHERE role != 'system' AND json_extract(meta, '$.in_progress') IS NULL "
+            "AND NOT EXISTS (SELECT 1 FROM message_fts WHERE message_fts.rowid = message.id)",
+        )
+        counts = unindexed.one()
+        if counts.missing:
+            result.problems.append(f"{counts.missing} messages are missing from the search index")
+        result.messages_to_backfill = counts.to_backfill
+    return result
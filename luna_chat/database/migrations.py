@@ -0,0 +1,190 @@
+# Copyright 2026 Leo Huber
+"""Versioned schema migrations.
+
+The schema version of a database is stored in `PRAGMA user_version`. On
+startup, every migration with a higher version is applied in order, each one
+in its own transaction, so existing databases are upgraded in place.
+
+Migrations are only ever appended to the end of `MIGRATIONS`, never edited
+or reordered once released. They must also work on a fresh database, where
+the first migration has already created the tables from the current models.
+"""
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Literal
+
+from sqlalchemy import Connection
+from sqlmodel import SQLModel
+
+# Registers the tables with the SQLModel metadata.
+import luna_chat.database.models  # noqa: F401
+
+MigrationFunction = Callable[[Connection], None]
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: MigrationFunction
+
+
+MIGRATIONS: list[Migration] = []
+"""All migrations, ordered by version."""
+
+
+def migration(description: str) -> Callable[[MigrationFunction], MigrationFunction]:
+    """Register the decorated function as the next migration."""
+
+    def register(upgrade: MigrationFunction) -> MigrationFunction:
+        MIGRATIONS.append(Migration(len(MIGRATIONS) + 1, description, upgrade))
+        return upgrade
+
+    return register
+
+
+def schema_version(connection: Connection) -> int:
+    return connection.exec_driver_sql("PRAGMA user_version").scalar_one()
+
+
+def migrate_database(connection: Connection) -> list[Migration]:
+    """Apply all pending migrations and return the ones which were applied."""
+    current_version = schema_version(connection)
+    connection.commit()
+    if current_version > len(MIGRATIONS):
+        message = (
+            f"The database schema version ({current_version}) is newer than the latest version "
+            f"supported by this version of Luna ({len(MIGRATIONS)}). Please upgrade Luna."
+        )
+        raise RuntimeError(message)
+
+    applied: list[Migration] = []
+    for pending in MIGRATIONS[current_version:]:
+        # The sqlite3 driver doesn't open transactions for DDL statements by itself.
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            pending.upgrade(connection)
+            connection.exec_driver_sql(f"PRAGMA user_version = {pending.version:d}")
+        except Exception:
+            connection.rollback()
+            raise
+        connection.commit()
+        applied.append(pending)
+    return applied
+
+
+def _column_names(connection: Connection, table: str) -> set[str]:
+    return {row.name for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _add_column(connection: Connection, table: str, column: str, definition: str) -> None:
+    """Add a column, unless the table was created with it already."""
+    if column not in _column_names(connection, table):
+        connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+@migration("Create the initial schema")
+def _create_initial_schema(connection: Connection) -> None:
+    # Only creates missing tables, databases created before migrations
+    # existed are brought up to date by the following migrations.
+    SQLModel.metadata.create_all(connection)
+
+
+@migration("Track changes to chats")
+def _add_chat_version(connection: Connection) -> None:
+    _add_column(connection, "chat", "version", "INTEGER NOT NULL DEFAULT 0")
+    connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_chat_version ON chat (version)")
+
+
+@migration("Index messages by chat")
+def _index_messages_by_chat(connection: Connection) -> None:
+    connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_message_chat_id_timestamp ON message (chat_id, timestamp)")
+
+
+@migration("Store the time of the last message and the message count on the chat")
+def _denormalize_chat_stats(connection: Connection) -> None:
+    _add_column(connection, "chat", "last_message_at", "DATETIME")
+    _add_column(connection, "chat", "message_count", "INTEGER NOT NULL DEFAULT 0")
+    connection.exec_driver_sql(
+        """
+        UPDATE chat SET
+            last_message_at = (SELECT max(timestamp) FROM message WHERE message.chat_id = chat.id),
+            message_count = (SELECT count(*) FROM message WHERE message.chat_id = chat.id)
+        """,
+    )
+    connection.exec_driver_sql(
+        """
+        CREATE TRIGGER IF NOT EXISTS message_after_insert_chat_stats AFTER INSERT ON message
+        BEGIN
+            UPDATE chat SET
+                last_message_at = CASE
+                    WHEN last_message_at IS NULL OR new.timestamp > last_message_at THEN new.timestamp
+                    ELSE last_message_at
+                END,
+                message_count = message_count + 1
+            WHERE id = new.chat_id;
+        END
+        """,
+    )
+    connection.exec_driver_sql(
+        """
+        CREATE TRIGGER IF NOT EXISTS message_after_delete_chat_stats AFTER DELETE ON message
+        BEGIN
+            UPDATE chat SET
+                last_message_at = (SELECT max(timestamp) FROM message WHERE message.chat_id = old.chat_id),
+                message_count = message_count - 1
+            WHERE id = old.chat_id;
+        END
+        """,
+    )
+    connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_chat_archived_last_message_at ON chat (archived, last_message_at, id)")
+
+
+@migration("Index the content of messages for full-text search")
+def _create_search_index(connection: Connection) -> None:
+    # The index only keeps the terms of the messages, the snippets of search results are made from the
+    # messages. Luna keeps it up to date where it writes messages, see `luna_chat.database.search`.
+    connection.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(content, content = '', tokenize = 'unicode61 remove_diacritics 2')",
+    )
+    # The messages which existed before the index are added in the background,
+    # newest first, see `luna_chat.database.search.backfill_search_index`.
+    connection.exec_driver_sql("CREATE TABLE IF NOT EXISTS search_backfill (next_message_id INTEGER NOT NULL)")
+    connection.exec_driver_sql("INSERT INTO search_backfill (next_message_id) SELECT coalesce(max(id), 0) FROM message")
+
+
+@migration("Track the progress of imports")
+def _create_import_progress(connection: Connection) -> None:
+    # The number of records of each export which have been imported, so
+    # interrupted imports can be resumed, see `luna_chat.database.export`.
+    connection.exec_driver_sql("CREATE TABLE IF NOT EXISTS import_progress (export_id TEXT PRIMARY KEY, records INTEGER NOT NULL)")
+
+
+@migration("Compress the content of long messages")
+def _add_message_content_encoding(connection: Connection) -> None:
+    # Existing messages stay as they are until `luna db compress` is run, see
+    # `luna_chat.database.compression`. The search index gets the text.
+    _add_column(connection, "message", "content_encoding", "INTEGER NOT NULL DEFAULT 0")
+
+
+def link_replies_statement(schema: Literal["main", "archive"] = "main") -> str:
+    """Return SQL which makes each message without a parent, except the first of
+    each chat, a reply to the message before it.
+
+    Messages were only ordered by their timestamps before chats could have
+    branches, this turns such chats into a single branch.
+    """
+    return f"""
+        UPDATE {schema}.message SET parent_id = previous.previous_id
+        FROM (SELECT id, lag(id) OVER (PARTITION BY chat_id ORDER BY timestamp, id) AS previous_id FROM {schema}.message) AS previous
+        WHERE previous.id = message.id AND message.parent_id IS NULL AND previous.previous_id IS NOT NULL
+    """  # noqa: S608
+
+
+@migration("Link messages into branches")
+def _link_message_branches(connection: Connection) -> None:
+    # The branches of a chat are walked through `parent_id`, see `MessageDao.branch`.
+    _add_column(connection, "chat", "active_message_id", "INTEGER")
+    connection.exec_driver_sql(link_replies_statement())
+    connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_message_parent_id ON message (parent_id)")
@@ -1,12 +1,134 @@
 from datetime import datetime
-from typing import Any, Optional
+from collections.abc import Sequence
+from functools import cache, lru_cache
+from typing import TYPE_CHECKING, Any, Literal, Optional
 
-from sqlalchemy import Column, DateTime, func, JSON, desc
+from sqlalchemy import (
+    Column,
+    ColumnElement,
+    DateTime,
+    Index,
+    Label,
+    Row,
+    ScalarSelect,
+    Table,
+    Text,
+    TextClause,
+    TypeDecorator,
+    bindparam,
+    func,
+    JSON,
+    desc,
+    literal,
+    or_,
+    text,
+    tuple_,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncAttrs
-from sqlalchemy.orm import selectinload
-from sqlmodel import Field, Relationship, SQLModel, select
+from sqlalchemy.orm import aliased
+from sqlmodel import Field, Relationship, SQLModel, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from luna_chat.database.database import get_session
+from luna_chat.database.compression import ContentEncoding, content_text
+from luna_chat.database.database import read_session, write_session
+
+if TYPE_CHECKING:
+    from sqlmodel.sql.expression import Select
+
+INSERT_BATCH_SIZE = 500
+"""The number of rows per multi-row INSERT, which keeps the number of parameters below SQLite's limit."""
+
+
+async def insert_returning_ids(session: AsyncSession, table: Table, rows: Sequence[dict[str, Any]]) -> list[int]:
+    """Insert rows with multi-row INSERT ... RETURNING, as part of the session's transaction.
+
+    Args:
+        rows: The values of the new rows, all with the same columns.
+
+    Returns:
+        The IDs of the new rows, in the order of the given rows.
+    """
+    ids: list[int] = []
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        batch = rows[start : start + INSERT_BATCH_SIZE]
+        statement = _multi_row_insert(table, tuple(batch[0]), len(batch))
+        parameters = {f"{column}_{index}": value for index, row in enumerate(batch) for column, value in row.items()}
+        connection = await session.connection()
+        result = await connection.execute(statement, parameters)
+        # SQLite returns the rows in no particular order, but assigns
+        # increasing IDs to them in the order of the VALUES.
+        ids.extend(sorted(result.scalars()))
+    return ids
+
+
+@lru_cache(maxsize=32)
+def _multi_row_insert(table: Table, columns: tuple[str, ...], row_count: int) -> TextClause:
+    # SQLAlchemy doesn't cache the compilation of multi-row inserts, but it does cache that of text statements.
+    rows = ", ".join("(" + ", ".join(f":{column}_{index}" for column in columns) + ")" for index in range(row_count))
+    statement = text(f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES {rows} RETURNING id")  # noqa: S608
+    return statement.bindparams(*(bindparam(f"{column}_{index}", type_=table.c[column].type) for index in range(row_count) for column in columns))
+
+
+@cache
+def _branch_query(
+    leaf: Literal["active", "message", "parent"],
+    *,
+    start: bool,
+    limit: bool,
+    including: bool,
+    root: bool,
+) -> "Select[MessageDao, Any, Any, Any]":
+    """Build the query of `MessageDao.branch` and `MessageDao.ancestors`, once for each combination of its options.
+
+    Args:
+        leaf: Where the branch ends: at the chat's active message (`:chat_id`),
+            at a message (`:leaf_id`), or at the parent of a message (`:leaf_id`).
+        start: Stop at the message `:start_id`, rather than at the root.
+        limit: Only return the `:limit` last messages, and the root.
+        including: Also return those after the message `:including_id`.
+        root: Return the root, otherwise it is left out.
+    """
+    if leaf == "active":
+        leaf_id: Any = ChatDao.active_leaf(bindparam("chat_id"))
+    elif leaf == "message":
+        leaf_id = bindparam("leaf_id")
+    else:
+        leaf_id = select(MessageDao.parent_id).where(MessageDao.id == bindparam("leaf_id")).scalar_subquery()
+
+    # The message `leaf_id` and its ancestors, with their `depth` below it.
+    path = select(MessageDao.id, MessageDao.parent_id, literal(0).label("depth")).where(MessageDao.id == leaf_id).cte("path", recursive=True)
+    parent = aliased(MessageDao)
+    step = select(parent.id, parent.parent_id, path.c.depth + 1).where(parent.id == path.c.parent_id)
+    if start:
+        step = step.where(path.c.id != bindparam("start_id"))
+    path = path.union_all(step)
+
+    sibling = aliased(MessageDao)
+    siblings = select(func.count()).select_from(sibling).where(sibling.parent_id == MessageDao.parent_id).correlate(MessageDao)
+    statement = (
+        select(
+            MessageDao,
+            siblings.where(col(sibling.id) < col(MessageDao.id)).scalar_subquery().label("sibling_index"),
+            siblings.scalar_subquery().label("sibling_count"),
+            select(func.count()).select_from(path).correlate(None).scalar_subquery().label("length"),
+        )
+        # An outer join makes SQLite look the messages of the path up by ID, rather than scan all messages for them.
+        .select_from(path)
+        .outerjoin(MessageDao, col(MessageDao.id) == path.c.id)
+        .order_by(desc(path.c.depth))
+    )
+
+    is_root = path.c.parent_id == None  # noqa: E711
+    if limit:
+        recent: Any = path.c.depth < bindparam("limit")
+        if including:
+            depth = select(path.c.depth).where(path.c.id == bindparam("including_id")).correlate(None).scalar_subquery()
+            recent = or_(recent, path.c.depth <= depth)
+        statement = statement.where(or_(recent, is_root) if root else recent)
+    if not root:
+        statement = statement.where(~is_root)
+    return statement
 
 
 class SystemPromptsDao(AsyncAttrs, SQLModel, table=True):
@@ -18,14 +140,34 @@ class SystemPromptsDao(AsyncAttrs, SQLModel, table=True):
     created_at: datetime | None = Field(sa_column=Column(DateTime(), server_default=func.now()))
 
 
+class MessageContent(TypeDecorator[str | bytes]):
+    """The content of a message: text, or bytes when it's compressed.
+
+    The column keeps its TEXT affinity, which SQLite stores BLOBs under as they are.
+    """
+
+    impl = Text
+    cache_ok = True
+
+
 class MessageDao(AsyncAttrs, SQLModel, table=True):
     __tablename__ = "message"
+    __table_args__ = (
+        Index("ix_message_chat_id_timestamp", "chat_id", "timestamp"),
+        Index("ix_message_parent_id", "parent_id"),
+    )
 
     id: int | None = Field(default=None, primary_key=True)
     chat_id: Optional[int] = Field(foreign_key="chat.id")
     chat: Optional["ChatDao"] = Relationship(back_populates="messages")
     role: str
-    content: str
+    content: str | bytes = Field(sa_column=Column(MessageContent, nullable=False))
+    """The text of the message, or the compressed text, see `content_encoding`.
+
+    Use the converters, or `content_text` in SQL, to get the text.
+    """
+    content_encoding: int = Field(default=ContentEncoding.PLAIN, sa_column_kwargs={"server_default": "0"})
+    """How `content` is stored, a `ContentEncoding`."""
     timestamp: datetime | None = Field(sa_column=Column(DateTime(), server_default=func.now()))
     meta: dict[Any, Any] = Field(sa_column=Column(JSON), default={})
     parent_id: Optional[int] = Field(foreign_key="message.id", default=None, nullable=True)
@@ -33,17 +175,133 @@ class MessageDao(AsyncAttrs, SQLModel, table=True):
         back_populates="replies",
         sa_relationship_kwargs={"remote_side": "MessageDao.id"},
     )
-    """The message this message is responding to."""
+    """The message this message is responding to.
+
+    Editing or regenerating a message adds another reply to its parent, so
+    the messages of a chat form a tree, and each path from its root is a
+    branch of the conversation.
+    """
     replies: list["MessageDao"] = Relationship(back_populates="parent")
     """The replies to this message
-    (could be multiple replies e.g. from different models).
+    (could be multiple replies e.g. from different models, or edits).
     """
     model: str | None
     """The model that wrote this response. (Could switch models mid-chat, possibly)"""
 
+    @staticmethod
+    async def update_contents(session: AsyncSession, contents: Sequence[tuple[int, str | bytes, int, dict[str, Any]]]) -> None:
+        """Save the content and meta of messages by ID, as part of the session's transaction.
+
+        Args:
+            contents: Tuples of message ID, content, content encoding and meta.
+        """
+        statement = (
+            update(MessageDao)
+            .where(col(MessageDao.id) == bindparam("message_id"))
+            .values(content=bindparam("new_content"), content_encoding=bindparam("new_encoding"), meta=bindparam("new_meta"))
+        )
+        rows = [
+            {"message_id": message_id, "new_content": content, "new_encoding": encoding, "new_meta": meta}
+            for message_id, content, encoding, meta in contents
+        ]
+        connection = await session.connection()
+        await connection.execute(statement, rows)
+
+    @staticmethod
+    async def branch(
+        chat_id: int,
+        leaf_id: int | None = None,
+        start_id: int | None = None,
+        limit: int | None = None,
+        including_message_id: int | None = None,
+    ) -> list[Row[Any]]:
+        """Query the messages of a branch of a chat, oldest first.
+
+        The branch is walked up from its last message to the root (usually
+        the system prompt) with a single recursive query, which follows
+        `parent_id` through the primary key, so it doesn't matter how many
+        other branches the chat has.
+
+        Args:
+            leaf_id: The last message of the branch, the chat's active branch if None (see `ChatDao.active_message_id`).
+            start_id: Start the branch at this message, rather than at the root.
+            limit: Only return the root and the `limit` most recent messages after it.
+            including_message_id: Return more than `limit` messages, if required to include the message with this ID.
+
+        Returns:
+            Rows of the `MessageDao`, its `sibling_index` and `sibling_count` (see `ChatMessage`),
+            and the `length` of the whole branch.
+        """
+        statement = _branch_query(
+            leaf="active" if leaf_id is None else "message",
+            start=start_id is not None,
+            limit=limit is not None,
+            including=limit is not None and including_message_id is not None,
+            root=True,
+        )
+        parameters = {"chat_id": chat_id, "leaf_id": leaf_id, "start_id": start_id, "limit": limit, "including_id": including_message_id}
+        async with read_session() as session:
+            results = await session.exec(statement, params={name: value for name, value in parameters.items() if value is not None})
+            return list(results)  # type: ignore[arg-type]
+
+    @staticmethod
+    async def ancestors(message_id: int, limit: int | None = None) -> list[Row[Any]]:
+        """Query the messages before the given one on its branch, except for the root, oldest first.
+
+        Args:
+            limit: Only return the `limit` most recent of those messages.
+
+        Returns:
+            Rows with the same columns as `branch`.
+        """
+        statement = _branch_query(leaf="parent", start=False, limit=limit is not None, including=False, root=False)
+        parameters = {"leaf_id": message_id, "limit": limit}
+        async with read_session() as session:
+            results = await session.exec(statement, params={name: value for name, value in parameters.items() if value is not None})
+            return list(results)  # type: ignore[arg-type]
+
+    @staticmethod
+    async def sibling_ids(message_id: int) -> list[int]:
+        """Query the IDs of the replies to the parent of the given message, including itself, oldest first."""
+        async with read_session() as session:
+            parent_id = select(MessageDao.parent_id).where(MessageDao.id == message_id).scalar_subquery()
+            statement = select(MessageDao.id).where(col(MessageDao.parent_id) == parent_id).order_by(col(MessageDao.id))
+            results = await session.exec(statement)
+            return list(results) or [message_id]  # type: ignore[arg-type]
+
+    @staticmethod
+    async def latest_leaf(message_id: int) -> int:
+        """Query the ID of the last added message which descends from the given one, or is the given one.
+
+        Replies are always added after the messages they reply to, so that is the
+        last message of the most recently continued branch through the given message.
+        """
+        async with read_session() as session:
+            subtree = select(MessageDao.id).where(MessageDao.id == message_id).cte("subtree", recursive=True)
+            child = aliased(MessageDao)
+            subtree = subtree.union_all(select(child.id).where(child.parent_id == subtree.c.id))
+            result = await session.exec(select(func.max(subtree.c.id)))
+            leaf_id = result.one()
+            if leaf_id is None:
+                message = f"Message with ID {message_id} not found."
+                raise RuntimeError(message)
+            return leaf_id
+
+    @staticmethod
+    async def set_parents(session: AsyncSession, parent_ids: Sequence[tuple[int, int | None]]) -> None:
+        """Set the parents of messages, as part of the session's transaction.
+
+        Args:
+            parent_ids: Pairs of message ID and the ID of the message it replies to.
+        """
+        statement = update(MessageDao).where(col(MessageDao.id) == bindparam("message_id")).values(parent_id=bindparam("new_parent_id"))
+        connection = await session.connection()
+        await connection.execute(statement, [{"message_id": message_id, "new_parent_id": parent_id} for message_id, parent_id in parent_ids])
+
 
 class ChatDao(AsyncAttrs, SQLModel, table=True):
     __tablename__ = "chat"
+    __table_args__ = (Index("ix_chat_archived_last_message_at", "archived", "last_message_at", "id"),)
 
     id: int = Field(default=None, primary_key=True)
     model: str
@@ -51,36 +309,178 @@ class ChatDao(AsyncAttrs, SQLModel, table=True):
     started_at: datetime | None = Field(sa_column=Column(DateTime(), server_default=func.now()))
     messages: list[MessageDao] = Relationship(back_populates="chat")
     archived: bool = Field(default=False)
+    version: int = Field(default=0, index=True, sa_column_kwargs={"server_default": "0"})
+    """The global change version of the last write to this chat.
+
+    Every write bumps it past the highest version of all chats, so
+    `version > n` selects all chats which changed since version `n`.
+    """
+    last_message_at: datetime | None = Field(default=None, sa_column=Column(DateTime()))
+    """The timestamp of the most recent message, maintained by a trigger on `message`."""
+    message_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    """The number of messages, of all branches, maintained by triggers on `message`."""
+    active_message_id: int | None = Field(default=None)
+    """The last message of the branch which is shown, None for the message which was added last.
+
+    Adding messages resets it, as they continue the branch which was shown.
+    """
+
+    @staticmethod
+    def next_version() -> ScalarSelect[Any]:
+        """The version after the latest one of any chat, as a SQL expression."""
+        return select(func.coalesce(func.max(ChatDao.version), 0) + 1).scalar_subquery()
+
+    @staticmethod
+    def active_leaf(chat_id: ColumnElement[Any]) -> ColumnElement[Any]:
+        """The ID of the last message of the chat's active branch, as a SQL expression."""
+        latest = select(func.max(MessageDao.id)).where(MessageDao.chat_id == chat_id).scalar_subquery()
+        return func.coalesce(select(ChatDao.active_message_id).where(ChatDao.id == chat_id).scalar_subquery(), latest)
+
+    @staticmethod
+    async def bump_version(session: AsyncSession, chat_id: int, **values: int | None) -> int | None:
+        """Mark the chat as changed, as part of the session's transaction.
+
+        Args:
+            values: Other columns to set at the same time.
+
+        Returns:
+            The new version of the chat, None if there is no chat with the given ID.
+        """
+        statement = update(ChatDao).where(col(ChatDao.id) == chat_id).values(version=ChatDao.next_version(), **values).returning(col(ChatDao.version))
+        result = await session.exec(statement)
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def bump_versions(session: AsyncSession, chat_ids: Sequence[int]) -> int:
+        """Mark the chats as changed, all with the same new version, as part of the session's transaction.
+
+        Returns:
+            The new version.
+        """
+        statement = update(ChatDao).where(col(ChatDao.id).in_(chat_ids)).values(version=ChatDao.next_version()).returning(col(ChatDao.version))
+        result = await session.exec(statement)
+        return max(result.scalars(), default=0)
+
+    @staticmethod
+    async def latest_version() -> int:
+        async with read_session() as session:
+            result = await session.exec(select(func.coalesce(func.max(ChatDao.version), 0)))
+            return result.one()
+
+    @staticmethod
+    def preview_column(preview_length: int) -> Label[str]:
+        # Only fetch one character more than the preview length, so we
+        # know whether the preview needs to be truncated.
+        return (
+            select(func.substr(content_text(col(MessageDao.content), col(MessageDao.content_encoding)), 1, preview_length + 1))
+            .where(MessageDao.chat_id == ChatDao.id, MessageDao.role == "user")
+            .order_by(col(MessageDao.id))
+            .limit(1)
+            .correlate(ChatDao)
+            .scalar_subquery()
+            .label("preview")
+        )
+
+    @staticmethod
+    def _summary_columns(preview_length: int) -> tuple[Any, ...]:
+        return (
+            ChatDao.id,
+            ChatDao.model,
+            ChatDao.title,
+            ChatDao.archived,
+            ChatDao.version,
+            ChatDao.preview_column(preview_length),
+            ChatDao.last_message_at,
+            ChatDao.message_count,
+        )
 
     @staticmethod
-    async def all() -> list["ChatDao"]:
-        async with get_session() as session:
-            # Create a subquery that finds the maximum
-            # (most recent) timestamp for each chat.
-            max_timestamp: Any = func.max(MessageDao.timestamp).label("max_timestamp")
-            subquery = select(MessageDao.chat_id, max_timestamp).group_by(MessageDao.chat_id).alias("subquery")
+    async def summaries(
+        preview_length: int,
+        limit: int | None = None,
+        after: tuple[datetime, int] | None = None,
+    ) -> list[Row[Any]]:
+        """Query the data shown in the chat list, without loading any messages.
 
+        Each row contains the id, model, title, archived flag and change version,
+        the first `preview_length + 1` characters of the first user message, the
+        timestamp of the most recent message and the number of messages of a
+        non-archived chat.
+
+        Rows are ordered by `(last_message_at, id)` descending, which is also the
+        keyset used for pagination: pass the values of the last row seen as `after`
+        to get the next page of (at most) `limit` rows.
+        """
+        async with read_session() as session:
             statement = (
-                select(ChatDao)
-                .join(subquery, subquery.c.chat_id == ChatDao.id)
-                .where(ChatDao.archived == False)  # noqa: E712
-                .order_by(desc(subquery.c.max_timestamp))
-                .options(selectinload(ChatDao.messages))
+                select(*ChatDao._summary_columns(preview_length))
+                .where(ChatDao.archived == False, ChatDao.last_message_at != None)  # noqa: E711, E712
+                .order_by(desc(col(ChatDao.last_message_at)), desc(col(ChatDao.id)))
             )
+            if after is not None:
+                statement = statement.where(tuple_(ChatDao.last_message_at, ChatDao.id) < tuple_(*after))
+            if limit is not None:
+                statement = statement.limit(limit)
+            results = await session.exec(statement)
+            return list(results)
+
+    @staticmethod
+    async def count() -> int:
+        """Count the non-archived chats which contain at least one message."""
+        async with read_session() as session:
+            statement = select(func.count(col(ChatDao.id))).where(ChatDao.archived == False, ChatDao.last_message_at != None)  # noqa: E711, E712
+            result = await session.exec(statement)
+            return result.one()
+
+    @staticmethod
+    async def changed_since(preview_length: int, version: int) -> list[Row[Any]]:
+        """Query the summaries of all chats (including archived ones) written
+        after the given change version, with the same columns as `summaries`.
+        """
+        async with read_session() as session:
+            statement = select(*ChatDao._summary_columns(preview_length)).where(ChatDao.version > version).order_by(ChatDao.version)
             results = await session.exec(statement)
             return list(results)
 
     @staticmethod
     async def from_id(chat_id: int) -> "ChatDao":
-        async with get_session() as session:
-            statement = select(ChatDao).where(ChatDao.id == int(chat_id)).options(selectinload(ChatDao.messages))
+        """Query a chat, without its messages."""
+        async with read_session() as session:
+            statement = select(ChatDao).where(ChatDao.id == int(chat_id))
             result = await session.exec(statement)
             return result.one()
 
     @staticmethod
-    async def rename_chat(chat_id: int, new_title: str) -> None:
-        async with get_session() as session:
-            chat = await ChatDao.from_id(chat_id)
-            chat.title = new_title
-            session.add(chat)
+    async def preview(chat_id: int, preview_length: int) -> str | None:
+        """Query the first `preview_length + 1` characters of the first user message of a chat."""
+        async with read_session() as session:
+            statement = select(ChatDao.preview_column(preview_length)).where(ChatDao.id == chat_id)
+            result = await session.exec(statement)
+            return result.one_or_none()
+
+    @staticmethod
+    async def rename_chat(chat_id: int, new_title: str) -> int | None:
+        """Rename the chat and return its new version, None if there is no chat with the given ID."""
+        async with write_session() as session:
+            statement = (
+                update(ChatDao)
+                .where(col(ChatDao.id) == chat_id)
+                .values(title=new_title, version=ChatDao.next_version())
+                .returning(col(ChatDao.version))
+            )
+            result = await session.exec(statement)
+            version = result.scalar_one_or_none()
+            await session.commit()
+            return version
+
+    @staticmethod
+    async def set_active_message(chat_id: int, message_id: int | None) -> int | None:
+        """Show the branch ending with the given message, and return the new version of the chat.
+
+        Returns:
+            The new version of the chat, None if there is no chat with the given ID.
+        """
+        async with write_session() as session:
+            version = await ChatDao.bump_version(session, chat_id, active_message_id=message_id)
             await session.commit()
+            return version
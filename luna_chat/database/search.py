@@ -0,0 +1,198 @@
+# Copyright 2026 Leo Huber
+"""Full-text search over the content of all messages, backed by the SQLite FTS5
+`message_fts` table.
+
+The index is contentless: it only keeps the terms of each message, not a
+second copy of its content. Snippets are made from the messages themselves.
+
+Luna keeps the index up to date where it writes messages, with
+`index_messages` and `unindex_messages`, rather than with triggers: the
+content of messages may be compressed, and only Luna can decompress it,
+so triggers would fail in other SQLite clients.
+"""
+
+import re
+import unicodedata
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+from sqlalchemy import Row, bindparam, column, literal_column, table, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel import col, select
+
+from luna_chat.database.compression import decode_content
+from luna_chat.database.database import read_session, write_session
+from luna_chat.database.models import ChatDao, MessageDao
+
+SNIPPET_START = "\x02"
+"""Marks the start of a matched term in a snippet."""
+SNIPPET_END = "\x03"
+"""Marks the end of a matched term in a snippet."""
+
+SNIPPET_TOKENS = 16
+"""The number of words in a snippet."""
+
+message_fts = table("message_fts", column("rowid"), column("rank"))
+
+_INDEX_BATCH_SIZE = 500
+"""The number of messages looked up at a time, which keeps the number of parameters below SQLite's limit."""
+
+_TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+"""The words as the index splits text into them, runs of letters and digits."""
+
+
+def match_query(query: str) -> str | None:
+    """Turn what the user typed into an FTS5 query.
+
+    Every word has to match, the last one as a prefix so results show up as
+    the user types. Punctuation is dropped rather than interpreted as FTS5
+    query syntax. Returns None if there is nothing to search for.
+    """
+    terms = _TERM_PATTERN.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    return " ".join(quoted) + "*"
+
+
+def _fold(word: str) -> str:
+    """Fold a word as the index does, which ignores case and diacritics."""
+    decomposed = unicodedata.normalize("NFKD", word.casefold())
+    return "".join(character for character in decomposed if not unicodedata.combining(character))
+
+
+def make_snippet(content: str, query: str, length: int = SNIPPET_TOKENS) -> str:
+    """Return the excerpt of the content with the most matches of the query, with the matches marked.
+
+    Words match as they do in the index, ignoring case and diacritics, and
+    the last word of the query as a prefix.
+    """
+    *terms, last_term = [_fold(term) for term in _TOKEN_PATTERN.findall(query)] or [""]
+    words = list(_TOKEN_PATTERN.finditer(content))
+    if not words:
+        return content
+    matches = []
+    for word in words:
+        folded = _fold(word.group())
+        matches.append(bool(last_term) and (folded in terms or folded.startswith(last_term)))
+
+    # The excerpt with the most matches, which are centered in it.
+    window = sum(matches[:length])
+    best_count, best_start = window, 0
+    for start in range(1, len(words) - length + 1):
+        window += matches[start + length - 1] - matches[start - 1]
+        if window > best_count:
+            best_count, best_start = window, start
+    matched = [index for index in range(best_start, min(best_start + length, len(words))) if matches[index]]
+    if matched:
+        margin = (length - (matched[-1] - matched[0] + 1)) // 2
+        best_start = max(0, min(matched[0] - margin, len(words) - length))
+    end = min(best_start + length, len(words))
+
+    parts = ["…"] if best_start > 0 else []
+    # The text before the first word and after the last word is kept at the ends of the content.
+    position = words[best_start].start() if best_start > 0 else 0
+    for index in range(best_start, end):
+        word = words[index]
+        if matches[index]:
+            parts += [content[position : word.start()], SNIPPET_START, word.group(), SNIPPET_END]
+            position = word.end()
+    if end < len(words):
+        parts += [content[position : words[end - 1].end()], "…"]
+    else:
+        parts.append(content[position:])
+    return "".join(parts)
+
+
+async def search_messages(query: str, limit: int, offset: int, preview_length: int) -> list[tuple[Row[Any], str]]:
+    """Return the best matching messages of non-archived chats, best match first, with their snippets."""
+    match = match_query(query)
+    if match is None:
+        return []
+
+    async with read_session() as session:
+        statement = (
+            select(
+                col(MessageDao.id).label("message_id"),  # type: ignore[call-overload]
+                MessageDao.chat_id,
+                MessageDao.role,
+                MessageDao.timestamp,
+                ChatDao.title,
+                ChatDao.model,
+                ChatDao.preview_column(preview_length),
+                MessageDao.content,
+                MessageDao.content_encoding,
+                message_fts.c.rank,
+            )
+            .select_from(message_fts)
+            .join(MessageDao, col(MessageDao.id) == message_fts.c.rowid)
+            .join(ChatDao, col(ChatDao.id) == MessageDao.chat_id)
+            .where(literal_column("message_fts").op("MATCH")(match), ChatDao.archived == False)  # noqa: E712
+            .order_by(message_fts.c.rank)
+            .limit(limit)
+            .offset(offset)
+        )
+        results = await session.exec(statement)
+        return [(row, make_snippet(decode_content(row.content, row.content_encoding), query)) for row in results]
+
+
+async def index_messages(connection: AsyncConnection, message_ids: Sequence[int]) -> None:
+    """Add the messages which belong in the search index and aren't in it yet, as part of the connection's transaction.
+
+    System prompts are repeated in every chat, so they aren't indexed, and
+    responses are only indexed once they are complete.
+    """
+    condition = (
+        "role != 'system' AND json_extract(meta, '$.in_progress') IS NULL "
+        "AND NOT EXISTS (SELECT 1 FROM message_fts WHERE message_fts.rowid = message.id)"
+    )
+    async for entries in _message_texts(connection, message_ids, condition):
+        await connection.execute(text("INSERT INTO message_fts (rowid, content) VALUES (:id, :content)"), entries)
+
+
+async def unindex_messages(connection: AsyncConnection, message_ids: Sequence[int]) -> None:
+    """Remove the messages from the search index, before they are deleted, as part of the connection's transaction.
+
+    The terms of a message are removed with the text which was indexed, as
+    the index doesn't keep it. Messages which aren't in the index are skipped.
+    """
+    condition = "EXISTS (SELECT 1 FROM message_fts WHERE message_fts.rowid = message.id)"
+    async for entries in _message_texts(connection, message_ids, condition):
+        await connection.execute(text("INSERT INTO message_fts (message_fts, rowid, content) VALUES ('delete', :id, :content)"), entries)
+
+
+async def _message_texts(connection: AsyncConnection, message_ids: Sequence[int], condition: str) -> AsyncIterator[list[dict[str, Any]]]:
+    """Yield the IDs and texts of the messages which meet the SQL condition, in batches."""
+    statement = text(f"SELECT id, content, content_encoding FROM message WHERE id IN :ids AND {condition}").bindparams(  # noqa: S608
+        bindparam("ids", expanding=True),
+    )
+    for start in range(0, len(message_ids), _INDEX_BATCH_SIZE):
+        rows = await connection.execute(statement, {"ids": message_ids[start : start + _INDEX_BATCH_SIZE]})
+        entries = [{"id": row.id, "content": decode_content(row.content, row.content_encoding)} for row in rows]
+        if entries:
+            yield entries
+
+
+async def backfill_search_index(batch_size: int) -> int:
+    """Index the next batch of messages which existed before the search index was created.
+
+    Messages are indexed newest first, in batches of `batch_size` message IDs,
+    each in its own short transaction so the app stays responsive.
+
+    Returns:
+        The number of message IDs left to backfill, 0 when done.
+    """
+    async with write_session() as session:
+        connection = await session.connection()
+        result = await connection.execute(text("SELECT next_message_id FROM search_backfill"))
+        next_message_id = result.scalar_one_or_none() or 0
+        if next_message_id <= 0:
+            return 0
+
+        low = max(next_message_id - batch_size, 0)
+        message_ids = await connection.execute(text("SELECT id FROM message WHERE id > :low AND id <= :high"), {"low": low, "high": next_message_id})
+        await index_messages(connection, list(message_ids.scalars()))
+        await connection.execute(text("UPDATE search_backfill SET next_message_id = :low"), {"low": low})
+        await session.commit()
+        return low
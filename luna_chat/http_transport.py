@@ -0,0 +1,71 @@
+# Copyright 2026 Leo Huber
+"""An HTTP transport which keeps the connections of streamed responses.
+
+The OpenAI client stops reading a streamed response at its `[DONE]` event,
+and closes it. The event is the end of the content, but not of the body:
+the HTTP framing after it, e.g. the last chunk of a chunked body, hasn't
+been read, and a connection with an unread response is closed rather than
+put back into the pool. Reading the rest of the body first keeps it, so the
+next request doesn't connect again.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from typing import TYPE_CHECKING
+
+import httpx
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+_STREAM_END = b"data: [DONE]"
+"""The last event of a streamed response."""
+
+
+class KeepAliveTransport(httpx.AsyncBaseTransport):
+    """Reads the rest of a response which is closed after its last event, before closing it."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, drain_timeout: float = 1.0) -> None:
+        """
+        Args:
+            transport: The transport which sends the requests.
+            drain_timeout: How long to read the rest of a response for at most, in seconds.
+        """
+        self._transport = transport
+        self._drain_timeout = drain_timeout
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._transport.handle_async_request(request)
+        if not isinstance(response.stream, httpx.AsyncByteStream):
+            message = "The transport can only send requests asynchronously."
+            raise TypeError(message)
+        response.stream = _DrainedStream(response.stream, self._drain_timeout)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class _DrainedStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, drain_timeout: float) -> None:
+        self._stream = stream
+        self._parts = aiter(stream)
+        self._drain_timeout = drain_timeout
+        self._tail = b""
+        """The end of what was read, to tell whether the last event was."""
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for part in self._parts:
+            self._tail = (self._tail + part)[-2 * len(_STREAM_END) :]
+            yield part
+
+    async def aclose(self) -> None:
+        # A response which is closed before its last event, e.g. as the reply is stopped, is closed right away.
+        if self._tail.rstrip().endswith(_STREAM_END):
+            with contextlib.suppress(httpx.HTTPError, TimeoutError):
+                async with asyncio.timeout(self._drain_timeout):
+                    async for _ in self._parts:
+                        pass
+        await self._stream.aclose()
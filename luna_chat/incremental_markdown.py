@@ -0,0 +1,143 @@
+# Copyright 2026 Leo Huber
+"""Markdown rendering which only re-renders what changed.
+
+A streamed response grows at its end, so rendering it all for each update
+makes streaming long responses quadratic. The markdown is split into its
+top-level blocks (paragraphs, lists, code blocks, ...). All but the last
+block are complete, as text appended later can only change or extend the
+last one, so their rendering is kept for as long as the width doesn't
+change. Only the text from the start of the last block is parsed and
+rendered again.
+
+The output is the same as rendering all of the markdown with
+`rich.markdown.Markdown`, which renders the blocks one after the other.
+Whether it starts a block with a blank line depends on the element it
+rendered before, so each block is rendered after one which renders nothing
+but leaves the same choice, if needed.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from markdown_it import MarkdownIt
+from rich.markdown import Markdown, UnknownElement
+
+from luna_chat.models import MessageBuffer
+
+if TYPE_CHECKING:
+    from rich.console import Console, ConsoleOptions, RenderResult
+    from rich.segment import Segment
+
+_parser = MarkdownIt().enable("strikethrough").enable("table")
+"""Parses like `rich.markdown.Markdown` does."""
+
+_REFERENCE_DEFINITION = re.compile(r"^ {0,3}\[[^\]]+\]:", re.MULTILINE)
+"""Link reference definitions change the rendering of links anywhere in the markdown."""
+
+_NEWLINE = re.compile(r"\r\n?|\n")
+"""Line breaks, as the parser counts lines."""
+
+_LIST_NUMBER = re.compile(r" {0,3}[0-9]{1,9}")
+"""The start of an ordered list item, while it is still a paragraph, as the `.` after the number hasn't arrived yet."""
+
+_AFTER_NEW_LINE = "<!---->\n\n"
+"""An HTML comment renders nothing, but makes `Markdown` start the next block with a blank line."""
+
+
+@dataclass
+class _Block:
+    markdown: Markdown
+    new_line: bool
+    """Whether the block is followed by a blank line, if another block follows it."""
+    width: int | None = None
+    """The width the segments were rendered at."""
+    segments: list[Segment] = field(default_factory=list)
+
+
+class IncrementalMarkdown:
+    def __init__(self, markup: str | MessageBuffer = "") -> None:
+        self._source: str | MessageBuffer = ""
+        self._length = 0
+        """How much of the source was read."""
+        self._blocks: list[_Block] = []
+        """The complete blocks."""
+        self._tail = ""
+        """The text after the complete blocks, which is rendered on each render."""
+        self._has_last_block = False
+        self._has_references = False
+        self.update(markup)
+
+    def update(self, markup: str | MessageBuffer) -> None:
+        """Set the markdown to render.
+
+        If it is the markdown rendered before, with text appended to it, or
+        the same buffer, only the appended text is read. Otherwise rendering
+        starts over.
+        """
+        if isinstance(markup, MessageBuffer):
+            appended = markup is self._source and len(markup) >= self._length
+            text = markup.text_from(self._length) if appended else markup.text
+        else:
+            if markup is self._source:
+                return
+            appended = isinstance(self._source, str) and markup.startswith(self._source)
+            text = markup[self._length :] if appended else markup
+        self._source = markup
+        if not appended:
+            self._length = 0
+            self._blocks.clear()
+            self._tail = ""
+            self._has_references = False
+        if text or not appended:
+            self._length += len(text)
+            self._append(text)
+
+    def _append(self, text: str) -> None:
+        self._tail += text
+        if self._has_references or _REFERENCE_DEFINITION.search(self._tail):
+            self._has_references = True
+            return
+
+        # The blocks which end before a blank line are the same whatever follows them, except that
+        # a number after a list may become its next item. Without a blank line, what follows the
+        # start of a block, e.g. `-` after a list item, may turn it into part of the block before.
+        tail = self._tail
+        line_starts = [0, *(match.end() for match in _NEWLINE.finditer(tail)), len(tail)]
+        blocks = [
+            (token.map, Markdown.elements.get(token.type, UnknownElement).new_line)
+            for token in _parser.parse(tail)
+            if token.level == 0 and token.nesting >= 0 and token.map
+        ]
+        last = len(blocks) - 1
+        if last > 0:
+            start, end = blocks[last][0]
+            if _LIST_NUMBER.fullmatch(tail[line_starts[start] : line_starts[end]]):
+                last -= 1
+        while last > 0 and blocks[last - 1][0][1] == blocks[last][0][0]:
+            last -= 1
+        for (start, end), new_line in blocks[:last]:
+            source = tail[line_starts[start] : line_starts[end]]
+            self._blocks.append(_Block(Markdown(self._after_blocks(source)), new_line))
+        if last > 0:
+            self._tail = tail[line_starts[blocks[last][0][0]] :]
+        self._has_last_block = bool(blocks)
+
+    def _after_blocks(self, source: str) -> str:
+        """Return the source of a block, to be rendered as if it followed the complete blocks."""
+        return _AFTER_NEW_LINE + source if self._blocks and self._blocks[-1].new_line else source
+
+    def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
+        if self._has_references:
+            yield Markdown(str(self._source))
+            return
+
+        for block in self._blocks:
+            if block.width != options.max_width:
+                block.segments = list(console.render(block.markdown, options))
+                block.width = options.max_width
+            yield from block.segments
+        if self._has_last_block:
+            yield Markdown(self._after_blocks(self._tail))
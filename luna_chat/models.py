@@ -1,15 +1,15 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import UTC, datetime
 from typing import TYPE_CHECKING
 
 
 from luna_chat.config import LaunchConfig, LunaChatModel
 
-from textual._context import active_app
-
 if TYPE_CHECKING:
+    from collections.abc import Iterable
+
     from litellm.types.completion import ChatCompletionMessageParam
 
 
@@ -17,25 +17,123 @@ class UnknownModel(LunaChatModel):
     pass
 
 
+UNKNOWN_MODEL = UnknownModel(id="unknown", name="unknown model")
+"""Stands in for models which are no longer configured, e.g. in old chats."""
+
+
+class ModelRegistry:
+    """The configured models, indexed by ID and by name.
+
+    Lookups return the model objects of the config, so every message of a
+    chat shares the same instance. Unknown IDs and names all resolve to
+    `UNKNOWN_MODEL`, without being added to the index.
+    """
+
+    def __init__(self, models: Iterable[LunaChatModel]) -> None:
+        models = list(models)
+        # IDs take precedence over names, and later models over earlier ones with the same key.
+        self._models: dict[str, LunaChatModel] = {model.name: model for model in models}
+        self._models.update({model.id: model for model in models if model.id is not None})
+
+    def get(self, model_id_or_name: str) -> LunaChatModel:
+        return self._models.get(model_id_or_name, UNKNOWN_MODEL)
+
+
+@dataclass
+class _ModelsState:
+    registry: ModelRegistry | None = None
+
+
+_state = _ModelsState()
+"""The models of the config passed to `configure_models`."""
+
+
+def configure_models(config: LaunchConfig | None) -> None:
+    """Look models up in the given config when `get_model` isn't passed one, None forgets the config."""
+    _state.registry = config.model_registry if config is not None else None
+
+
 def get_model(model_id_or_name: str, config: LaunchConfig | None = None) -> LunaChatModel:
     """Given the id or name of a model as a string, return the LunaChatModel.
 
-    Models are looked up by ID first.
+    Models are looked up by ID first. Without a config, the one passed to
+    `configure_models` is used, which the app and the CLI do on startup.
     """
-    if config is None:
-        app = active_app.get()
-        if hasattr(app, "launch_config"):
-            config = app.launch_config
-        else:
-            raise AttributeError("The active app does not have a 'launch_config' attribute.")
-    try:
-        return {model.id: model for model in config.all_models}[model_id_or_name]
-    except KeyError:
-        try:
-            return {model.name: model for model in config.all_models}[model_id_or_name]
-        except KeyError:
-            pass
-    return UnknownModel(id="unknown", name="unknown model")
+    if config is not None:
+        return config.model_registry.get(model_id_or_name)
+    if _state.registry is None:
+        message = "No config to look models up in, pass one or call 'configure_models' first."
+        raise RuntimeError(message)
+    return _state.registry.get(model_id_or_name)
+
+
+PREVIEW_LENGTH = 77
+"""The number of characters of the first user message shown as a chat preview."""
+
+
+def truncate_preview(content: str) -> str:
+    """Shorten the content of a message so it can be shown as a preview."""
+    if len(content) > PREVIEW_LENGTH:
+        return content[:PREVIEW_LENGTH] + "..."
+    return content
+
+
+def as_utc(timestamp: datetime) -> datetime:
+    """Timestamps are stored as naive UTC datetimes, attach the UTC timezone."""
+    return timestamp.astimezone().replace(tzinfo=UTC)
+
+
+class MessageBuffer:
+    """The text of a message which is appended to in chunks, e.g. a response being streamed.
+
+    Appending doesn't copy the text received so far. The chunks are only
+    joined when all of the text is read, and then only once until more is
+    appended.
+    """
+
+    def __init__(self, text: str = "") -> None:
+        self._chunks = [text] if text else []
+        self._length = len(text)
+        self._newline_count = text.count("\n")
+        self._text: str | None = text
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __str__(self) -> str:
+        return self.text
+
+    @property
+    def line_count(self) -> int:
+        return self._newline_count + 1
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(self._chunks)
+            self._chunks = [self._text]
+        return self._text
+
+    def append(self, chunk: str) -> None:
+        if not chunk:
+            return
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        self._newline_count += chunk.count("\n")
+        self._text = None
+
+    def text_from(self, start: int) -> str:
+        """Return the text from the given position on, without joining the chunks before it."""
+        if self._text is not None:
+            return self._text[start:]
+        index = len(self._chunks)
+        position = self._length
+        while index > 0 and position > start:
+            index -= 1
+            position -= len(self._chunks[index])
+        if index == len(self._chunks):
+            return ""
+        return self._chunks[index][start - position :] + "".join(self._chunks[index + 1 :])
 
 
 @dataclass
@@ -43,6 +141,45 @@ class ChatMessage:
     message: ChatCompletionMessageParam
     timestamp: datetime | None
     model: LunaChatModel
+    id: int | None = None
+    """The ID of the message in the database, None if it hasn't been loaded from there."""
+    in_progress: bool = False
+    """True while the response is being streamed, or if streaming it was interrupted."""
+    parent_id: int | None = None
+    """The ID of the message this one replies to, None for the first message of a chat."""
+    parent: ChatMessage | None = field(default=None, repr=False, compare=False)
+    """The message this one replies to, if it was written in this session.
+
+    Its ID is only known once it's saved, which may be in the same transaction as this message.
+    """
+    sibling_index: int = 0
+    """The position of this message among the replies to its parent, oldest first."""
+    sibling_count: int = 1
+    """The number of replies to the parent of this message, i.e. of branches the chat has at this point."""
+    content_buffer: MessageBuffer | None = field(default=None, repr=False, compare=False)
+    """The text content, once text was appended to it with `append_content`.
+
+    `message["content"]` is only brought up to date by `sync_content`.
+    """
+
+    @property
+    def content(self) -> str | None:
+        """The text content, None if the message has none, e.g. for tool calls."""
+        if self.content_buffer is not None:
+            return self.content_buffer.text
+        content = self.message.get("content")
+        return content if isinstance(content, str) else None
+
+    def append_content(self, chunk: str) -> None:
+        """Append text to the content, e.g. a chunk of a response which is streamed."""
+        if self.content_buffer is None:
+            self.content_buffer = MessageBuffer(self.content or "")
+        self.content_buffer.append(chunk)
+
+    def sync_content(self) -> None:
+        """Write the text appended with `append_content` into `message`."""
+        if self.content_buffer is not None:
+            self.message["content"] = self.content_buffer.text
 
 
 @dataclass
@@ -52,9 +189,19 @@ class ChatData:
     title: str | None
     create_timestamp: datetime | None
     messages: list[ChatMessage]
+    """The system prompt, followed by the loaded messages of the active branch."""
+    unloaded_message_count: int = 0
+    """The number of messages of the active branch between the system prompt and `messages[1]` which haven't been loaded yet."""
+    preview: str | None = None
+    """The start of the first user message, set if it hasn't been loaded yet."""
+    version: int = 0
+    """The change version of the chat when it was loaded."""
 
     @property
     def short_preview(self) -> str:
+        if self.unloaded_message_count and self.preview is not None:
+            return truncate_preview(self.preview)
+
         first_message = self.first_user_message.message
 
         if "content" in first_message:
@@ -63,10 +210,7 @@ class ChatData:
             # In the case of tool calls or image generation requests, we can
             # have non-string types here. We're not handling/considering this atm.
             if first_message_content and isinstance(first_message_content, str):
-                if len(first_message_content) > 77:
-                    return first_message_content[:77] + "..."
-                else:
-                    return first_message_content
+                return truncate_preview(first_message_content)
 
         return ""
 
@@ -84,10 +228,93 @@ class ChatData:
     ) -> list[ChatMessage]:
         return self.messages[1:]
 
+    @property
+    def message_count(self) -> int:
+        """The number of messages of the active branch, excluding the system prompt, including those not loaded yet."""
+        return len(self.messages) - 1 + self.unloaded_message_count
+
     @property
     def update_time(self) -> datetime:
         message_timestamp = self.messages[-1].timestamp
         if message_timestamp is not None:
-            return message_timestamp.astimezone().replace(tzinfo=UTC)
+            return as_utc(message_timestamp)
         else:
             raise ValueError("The message timestamp is None.")
+
+
+ChatListCursor = tuple[datetime, int]
+"""Keyset pagination cursor for the chat list: `(last_message_at, id)` of the last row seen."""
+
+
+@dataclass
+class ChatSummary:
+    """A lightweight projection of a chat, as shown in the chat list.
+
+    Unlike `ChatData` it doesn't carry any messages, only what is required
+    to render a list entry. The full chat is loaded once it gets opened.
+    """
+
+    id: int
+    model: LunaChatModel
+    title: str | None
+    preview: str
+    """The (truncated) content of the first user message."""
+    last_message_at: datetime | None
+    message_count: int
+    version: int = 0
+    """The change version of the chat when this summary was loaded."""
+
+    @property
+    def short_preview(self) -> str:
+        return truncate_preview(self.preview)
+
+    @property
+    def cursor(self) -> ChatListCursor | None:
+        """The cursor to continue paginating after this chat."""
+        if self.last_message_at is None:
+            return None
+        return self.last_message_at, self.id
+
+    @property
+    def update_time(self) -> datetime:
+        if self.last_message_at is not None:
+            return as_utc(self.last_message_at)
+        else:
+            raise ValueError("The message timestamp is None.")
+
+
+@dataclass
+class ChatChanges:
+    """The chats written since a given change version, see `ChatsManager.changed_since`."""
+
+    version: int
+    """The latest change version, to be passed to the next `changed_since` call."""
+    updated: list[ChatSummary]
+    """New or modified chats, which should be (re)inserted into the chat list."""
+    removed: list[int]
+    """The IDs of chats which should be removed from the chat list (e.g. archived)."""
+    chat_count: int | None
+    """The number of chats in the chat list after applying the changes, None if nothing changed."""
+
+
+@dataclass
+class SearchHit:
+    """A message matching a full-text search, see `ChatsManager.search`."""
+
+    chat_id: int
+    message_id: int
+    model: LunaChatModel
+    title: str | None
+    preview: str
+    """The (truncated) content of the first user message of the chat."""
+    role: str
+    timestamp: datetime | None
+    snippet: str
+    """An excerpt of the message around the matches, which are wrapped in
+    `SNIPPET_START` and `SNIPPET_END` (see `luna_chat.database.search`)."""
+    rank: float
+    """The relevance of the match, lower is better."""
+
+    @property
+    def short_preview(self) -> str:
+        return truncate_preview(self.preview)
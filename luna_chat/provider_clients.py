@@ -0,0 +1,147 @@
+# Copyright 2026 Leo Huber
+"""Clients for the APIs of the models, which keep their connections open.
+
+Each model gets a client of its own, made the first time it's needed, as
+models can have their own API key, base URL and organization. These are set
+on the client, rather than globally in litellm, so concurrent requests to
+different models don't change each other's settings. A client keeps its
+connections open between requests, and can connect before the first one,
+so a reply doesn't wait for the DNS lookup and the TCP and TLS handshakes.
+
+litellm can only be given a client of ours for some providers. Requests to
+the models of other providers go through litellm's own clients.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from textual import log
+
+from luna_chat.config import ConnectionsConfig, LunaChatModel
+
+if TYPE_CHECKING:
+    import httpx
+    from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+    from openai import AsyncOpenAI
+
+_API_ORIGINS = {
+    "openai": "https://api.openai.com",
+    "anthropic": "https://api.anthropic.com",
+    "gemini": "https://generativelanguage.googleapis.com",
+}
+"""The litellm providers which requests can be given a client for, and where their API is if a model has no `api_base`."""
+
+_READ_TIMEOUT = 600.0
+"""How many seconds to wait for the next chunk of a response, as litellm does."""
+
+
+@dataclass
+class _ModelClient:
+    client: AsyncOpenAI | AsyncHTTPHandler
+    """What litellm is given as the `client` of the requests to the model."""
+    http_client: httpx.AsyncClient
+    """The connection pool the client sends requests with."""
+    origin: str
+    """Where the API of the model is, which warming up connects to."""
+    replaced_client: httpx.AsyncClient | None = None
+    """The client which litellm's handler made for itself before it was given `http_client`, until it's closed."""
+
+
+class ProviderClients:
+    """The clients of the APIs of the models, by model."""
+
+    def __init__(self, config: ConnectionsConfig | None = None) -> None:
+        self.config = config or ConnectionsConfig()
+        self._clients: dict[str, _ModelClient | None] = {}
+        """The client of each model by its lookup key, None for models which use litellm's clients."""
+        self._lock = asyncio.Lock()
+
+    async def get(self, model: LunaChatModel) -> AsyncOpenAI | AsyncHTTPHandler | None:
+        """Return the client to pass to litellm for a request to the model, or None to let litellm make one."""
+        model_client = await self._model_client(model)
+        return model_client.client if model_client else None
+
+    async def warm_up(self, model: LunaChatModel) -> None:
+        """Connect to the API of the model, so the connection is open for its next request."""
+        model_client = await self._model_client(model)
+        if model_client is None:
+            return
+
+        # httpx was imported as the client was made.
+        import httpx  # noqa: PLC0415
+
+        try:
+            # Any response will do, all that matters is the connection it leaves in the pool.
+            await model_client.http_client.head(model_client.origin)
+        except httpx.HTTPError as error:
+            log.debug(f"Couldn't connect to the API of {model.lookup_key!r}: {error!r}")
+
+    async def close(self) -> None:
+        """Close the connections of all the clients."""
+        model_clients = [model_client for model_client in self._clients.values() if model_client is not None]
+        self._clients.clear()
+        for model_client in model_clients:
+            await model_client.http_client.aclose()
+
+    async def _model_client(self, model: LunaChatModel) -> _ModelClient | None:
+        async with self._lock:
+            if model.lookup_key not in self._clients:
+                # Importing litellm and openai the first time is slow, so this is run in a thread.
+                model_client = await asyncio.to_thread(_create_client, model, self.config)
+                if model_client is not None and model_client.replaced_client is not None:
+                    await model_client.replaced_client.aclose()
+                    model_client.replaced_client = None
+                self._clients[model.lookup_key] = model_client
+            return self._clients[model.lookup_key]
+
+
+def _create_client(model: LunaChatModel, config: ConnectionsConfig) -> _ModelClient | None:
+    # Importing litellm, openai and httpx is slow, so they're imported here, in the thread the client is made in.
+    from litellm import get_llm_provider  # noqa: PLC0415
+
+    api_base = model.api_base.unicode_string() if model.api_base else None
+    try:
+        _, provider, _, _ = get_llm_provider(model.name, api_base=api_base)
+    except Exception as error:  # noqa: BLE001 - whatever the error, litellm reports it again when the model is used
+        # litellm reports the models it doesn't know when they are used.
+        log.debug(f"Not making a client for {model.lookup_key!r}: {error!r}")
+        return None
+    if provider not in _API_ORIGINS:
+        return None
+
+    import httpx  # noqa: PLC0415
+
+    from luna_chat.http_transport import KeepAliveTransport  # noqa: PLC0415
+
+    timeout = httpx.Timeout(_READ_TIMEOUT, connect=config.connect_timeout)
+    transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(keepalive_expiry=config.keepalive_expiry))
+    http_client = httpx.AsyncClient(timeout=timeout, transport=KeepAliveTransport(transport))
+    client: AsyncOpenAI | AsyncHTTPHandler
+    if provider == "openai":
+        from openai import AsyncOpenAI, OpenAIError  # noqa: PLC0415
+
+        try:
+            client = AsyncOpenAI(
+                api_key=model.api_key.get_secret_value() if model.api_key else None,
+                organization=model.organization,
+                base_url=api_base,
+                timeout=timeout,
+                max_retries=model.max_retries,
+                http_client=http_client,
+            )
+        except OpenAIError as error:
+            # E.g. there's no API key, which litellm reports when the model is used.
+            log.debug(f"Not making a client for {model.lookup_key!r}: {error!r}")
+            return None
+    else:
+        from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler  # noqa: PLC0415
+
+        # The handler can't be given a client when it's made, so the one it makes is closed once it's replaced.
+        client = AsyncHTTPHandler()
+        replaced_client = client.client
+        client.client = http_client
+        return _ModelClient(client, http_client, api_base or _API_ORIGINS[provider], replaced_client)
+    return _ModelClient(client, http_client, api_base or _API_ORIGINS[provider])
@@ -0,0 +1,57 @@
+# Copyright 2026 Leo Huber
+"""Reading a streamed response ahead of showing it.
+
+The chunks of a response are read by a task of their own into a bounded
+queue, and the chat takes them from the queue as it gets to them. So the
+next chunks are read while the chat shows the last ones, and when the chat
+falls behind, reading pauses until it catches up rather than queueing
+chunks without limit. Both run in the event loop of the app, so chunks are
+handed over without waking another thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, cast
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, AsyncIterable
+
+
+@dataclass
+class _Failed:
+    exception: Exception
+
+
+_END = object()
+"""Queued after the last chunk."""
+
+
+async def read_ahead[T](chunks: AsyncIterable[T], max_queued: int) -> AsyncGenerator[T]:
+    """Iterate over chunks which are read by a task, up to `max_queued` chunks ahead.
+
+    An exception raised reading the chunks is raised here, after the chunks
+    read before it. Closing the iterator cancels the reading, so use it with
+    `contextlib.aclosing` to stop reading when iterating stops early.
+    """
+    queue: asyncio.Queue[object] = asyncio.Queue(max(1, max_queued))
+
+    async def read() -> None:
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        except Exception as exception:  # noqa: BLE001 - it's raised again where the chunks are iterated
+            await queue.put(_Failed(exception))
+        else:
+            await queue.put(_END)
+
+    reader = asyncio.create_task(read())
+    try:
+        while (item := await queue.get()) is not _END:
+            if isinstance(item, _Failed):
+                raise item.exception
+            yield cast("T", item)
+    finally:
+        reader.cancel()
+        await asyncio.wait([reader])
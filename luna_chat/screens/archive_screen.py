@@ -0,0 +1,33 @@
+# Copyright 2026 Leo Huber
+from typing import ClassVar
+
+from textual import on
+from textual.app import ComposeResult
+from textual.binding import Binding, BindingType
+from textual.screen import Screen
+from textual.widgets import Footer
+
+from luna_chat.widgets.archived_chat_list import ArchivedChatList
+
+
+class ArchiveScreen(Screen[int | None]):
+    """Browse the archived chats.
+
+    The archive database is only queried while this screen is open. Returns
+    the ID of the chat to open, if one was opened.
+    """
+
+    BINDINGS: ClassVar[list[BindingType]] = [
+        Binding("escape", "app.pop_screen", "Back", key_display="esc"),
+    ]
+
+    def compose(self) -> ComposeResult:
+        yield ArchivedChatList(id="archived-chat-list")
+        yield Footer()
+
+    @on(ArchivedChatList.ChatUnarchived)
+    def chat_unarchived(self, event: ArchivedChatList.ChatUnarchived) -> None:
+        if event.open:
+            self.dismiss(event.chat_id)
+        else:
+            self.notify("The chat is back in the chat list.", title="Chat unarchived")
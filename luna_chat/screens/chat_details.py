@@ -89,4 +89,4 @@ class ChatDetails(ModalScreen[None]):
                     yield Rule()
 
                     yield Label("Message count", classes="heading")
-                    yield Label(str(len(chat.messages) - 1), classes="datum")
+                    yield Label(str(chat.message_count), classes="datum")
@@ -25,13 +25,16 @@ class ChatScreen(Screen[None]):
     def __init__(
         self,
         chat_data: ChatData,
+        focus_message_id: int | None = None,
     ):
         super().__init__()
         self.chat_data = chat_data
+        self.focus_message_id = focus_message_id
+        """The message to scroll to when the chat is opened, e.g. from a search result."""
         self.chats_manager = ChatsManager()
 
     def compose(self) -> ComposeResult:
-        yield Chat(self.chat_data)
+        yield Chat(self.chat_data, focus_message_id=self.focus_message_id)
         yield Footer()
 
     @on(Chat.NewUserMessage)
@@ -50,12 +53,20 @@ class ChatScreen(Screen[None]):
         response_status.display = True
 
     @on(Chat.AgentResponseComplete)
-    async def agent_response_complete(self, event: Chat.AgentResponseComplete) -> None:
-        """Allow the user to send messages again."""
+    @on(Chat.AgentResponseInterrupted)
+    async def agent_response_complete(self, event: Chat.AgentResponseComplete | Chat.AgentResponseInterrupted) -> None:
+        """Allow the user to send messages again.
+
+        The response itself is saved by the Chat while it is streamed.
+        """
         self.query_one(ResponseStatus).display = False
         self.query_one(Chat).allow_input_submit = True
-        log.debug(f"Agent response complete. Adding message " f"to chat_id {event.chat_id!r}: {event.message}")
-        if self.chat_data.id is None:
-            raise RuntimeError("Chat has no ID. This is likely a bug in Luna.")
+        log.debug(f"Agent response finished in chat_id {self.chat_data.id!r}: {event.message}")
 
-        await self.chats_manager.add_message_to_chat(chat_id=self.chat_data.id, message=event.message)
+    @on(Chat.AgentResponseFailed)
+    @on(Chat.FanOutFinished)
+    def allow_new_messages(self) -> None:
+        """Allow the user to send messages again, after the response failed or was stopped before it
+        started, or after the responses of several models finished."""
+        self.query_one(ResponseStatus).display = False
+        self.query_one(Chat).allow_input_submit = True
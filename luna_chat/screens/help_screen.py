@@ -60,6 +60,14 @@ but if you just wish to scroll a little, you can use `shift+up` and `shift+down`
 - `g,G`: Go to first/last chat.
 - `enter,l`: Open chat.
 
+Press `/` to search the messages of all chats. The chat list shows the
+best matches as you type. Press `down` or `enter` to move to the results,
+and `enter` to open the chat at the matching message.
+Press `esc` in the search box to return to the chat history.
+
+Archived chats are moved to a separate archive database. Press `f2` to browse
+them, `u` to unarchive the highlighted chat, or `enter` to unarchive and open it.
+
 ### The options window
 
 Press `ctrl+o` to open the _options window_.
@@ -126,6 +134,19 @@ You can use the arrow keys to move up and down through messages.
 
 - `ctrl+r`: Rename the chat (or click the chat title).
 - `f2`: View more information about the chat.
+- `f4`: Send the message to all of the models listed in `fan_out_models` in the config file
+    at once, and show their replies side by side. The chat continues from the first reply,
+    the others are kept as branches.
+- `ctrl+s`: Stop the reply which is being streamed. What was received is kept, and can be continued.
+- `ctrl+g`: Continue a reply which was cut off, e.g. because Luna was closed while it was streamed.
+
+Long chats open with their latest messages. Older messages are added as you
+scroll to the top, or press `g`.
+
+Editing a message, or regenerating a reply, starts a new _branch_ of the chat
+from the message before it. The earlier versions are kept: a message which
+has other versions shows which one it is, e.g. `2/3`, and `[` and `]` switch
+between them.
 
 _With a message focused_:
 
@@ -141,7 +162,10 @@ _With a message focused_:
 - `enter`: View more details about a message.
     - The amount of details available may vary depending on the model
         or provider being used.
-- `g`: Focus the first message.
+- `e`: Edit your message in the prompt box, `esc` cancels the edit.
+- `r`: Regenerate the reply.
+- `[,]`: Show the previous/next version of the message, and the branch of the chat following it.
+- `g`: Focus the first message, adding older messages first if there are any.
 - `G`: Focus the latest message.
 - `m`: Move focus to the prompt box.
 - `up,down,k,j`: Navigate through messages.
@@ -1,17 +1,19 @@
-from typing import TYPE_CHECKING, cast
+from typing import TYPE_CHECKING, ClassVar, cast
 
 from textual import on
 from textual.app import ComposeResult
-from textual.binding import Binding
+from textual.binding import Binding, BindingType
 from textual.events import ScreenResume
 from textual.screen import Screen
 from textual.signal import Signal
-from textual.widgets import Footer
+from textual.widgets import Footer, Input
 
 from luna_chat.chats_manager import ChatsManager
 from luna_chat.runtime_config import RuntimeConfig
+from luna_chat.screens.archive_screen import ArchiveScreen
 from luna_chat.screens.chat_screen import ChatScreen
 from luna_chat.widgets.app_header import AppHeader
+from luna_chat.widgets.chat import Chat
 from luna_chat.widgets.chat_list import ChatList
 from luna_chat.widgets.chat_options import OptionsModal
 from luna_chat.widgets.prompt_input import PromptInput
@@ -25,6 +27,13 @@ class HomePromptInput(PromptInput):
     BINDINGS = [Binding("escape", "app.quit", "Quit", key_display="esc")]
 
 
+class SearchInput(Input):
+    BINDINGS: ClassVar[list[BindingType]] = [
+        Binding("escape", "screen.close_search", "Close search", key_display="esc"),
+        Binding("down", "app.focus('chat-list')", "Results", show=False),
+    ]
+
+
 class HomeScreen(Screen[None]):
     CSS = """\
 ChatList {
@@ -32,6 +41,9 @@ ChatList {
     width: 1fr;
     background: $background 15%;
 }
+SearchInput {
+    display: none;
+}
 """
 
     BINDINGS = [
@@ -50,6 +62,18 @@ ChatList {
             key_display="^o",
             tooltip="Change the model, system prompt, and check where Luna" " is storing your data.",
         ),
+        Binding(
+            "/",
+            "search",
+            "Search",
+            tooltip="Search the messages of all chats.",
+        ),
+        Binding(
+            "f2",
+            "archive",
+            "Archive",
+            tooltip="Browse the archived chats, and unarchive them.",
+        ),
     ]
 
     def __init__(
@@ -69,22 +93,39 @@ ChatList {
     def compose(self) -> ComposeResult:
         yield AppHeader(self.config_signal)
         yield HomePromptInput(id="home-prompt")
-        yield ChatList()
+        yield SearchInput(placeholder="Search messages", id="search-input")
+        yield ChatList(id="chat-list")
         yield Welcome()
         yield Footer()
 
     @on(ScreenResume)
     async def reload_screen(self) -> None:
+        # Show the messages written on the chat screen which are still queued.
+        await self.luna.message_write_queue.flush()
         chat_list = self.query_one(ChatList)
-        await chat_list.reload_and_refresh()
+        await chat_list.sync()
         self.show_welcome_if_required()
 
     @on(ChatList.ChatOpened)
     async def open_chat_screen(self, event: ChatList.ChatOpened):
-        chat_id = event.chat.id
-        assert chat_id is not None
-        chat = await self.chats_manager.get_chat(chat_id)
-        await self.app.push_screen(ChatScreen(chat))
+        await self.open_chat(event.chat_id, focus_message_id=event.message_id, version=event.version)
+
+    async def open_chat(self, chat_id: int, focus_message_id: int | None = None, version: int | None = None) -> None:
+        chat = await self.chats_manager.get_chat(
+            chat_id,
+            message_limit=Chat.PAGE_SIZE,
+            including_message_id=focus_message_id,
+            version=version,
+        )
+        await self.app.push_screen(ChatScreen(chat, focus_message_id=focus_message_id))
+
+    @on(Input.Changed, "#search-input")
+    async def search_changed(self, event: Input.Changed) -> None:
+        await self.query_one(ChatList).search(event.value)
+
+    @on(Input.Submitted, "#search-input")
+    def search_submitted(self) -> None:
+        self.query_one(ChatList).focus()
 
     @on(ChatList.CursorEscapingTop)
     def cursor_escaping_top(self):
@@ -112,6 +153,25 @@ ChatList {
             callback=self.update_config,
         )
 
+    async def action_archive(self) -> None:
+        await self.app.push_screen(ArchiveScreen(), callback=self.archive_closed)
+
+    async def archive_closed(self, chat_id: int | None) -> None:
+        if chat_id is not None:
+            await self.open_chat(chat_id)
+
+    def action_search(self) -> None:
+        search_input = self.query_one(SearchInput)
+        search_input.display = True
+        search_input.focus()
+
+    async def action_close_search(self) -> None:
+        search_input = self.query_one(SearchInput)
+        search_input.display = False
+        search_input.clear()
+        await self.query_one(ChatList).close_search()
+        self.query_one(HomePromptInput).focus()
+
     def update_config(self, runtime_config: RuntimeConfig) -> None:
         app = cast("Luna", self.app)
         app.runtime_config = runtime_config
@@ -0,0 +1,125 @@
+# Copyright 2026 Leo Huber
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, ClassVar, cast
+
+from textual import events, on, work
+from textual.binding import Binding, BindingType
+from textual.message import Message
+from textual.widgets import OptionList
+
+from luna_chat.chats_manager import ChatsManager
+from luna_chat.widgets.chat_list import ChatListItem
+
+if TYPE_CHECKING:
+    from luna_chat.app import Luna
+    from luna_chat.models import ChatListCursor
+
+
+class ArchivedChatList(OptionList):
+    """The archived chats, loaded a page at a time from the archive database."""
+
+    BINDINGS: ClassVar[list[BindingType]] = [
+        Binding(
+            "u",
+            "unarchive_chat",
+            "Unarchive",
+            tooltip="Move the highlighted chat back to the chat list.",
+        ),
+        Binding("j,down", "cursor_down", "Down", show=False),
+        Binding("k,up", "cursor_up", "Up", show=False),
+        Binding("l,right,enter", "select", "Open", show=False),
+        Binding("g,home", "first", "First", show=False),
+        Binding("G,end", "last", "Last", show=False),
+        Binding("pagedown", "page_down", "Page Down", show=False),
+        Binding("pageup", "page_up", "Page Up", show=False),
+    ]
+
+    PAGE_SIZE = 50
+    """The number of chats loaded from the database at once."""
+
+    PREFETCH_DISTANCE = 10
+    """Load the next page when the cursor gets this close to the last loaded chat."""
+
+    def __init__(
+        self,
+        name: str | None = None,
+        id: str | None = None,  # noqa: A002
+        classes: str | None = None,
+    ) -> None:
+        super().__init__(name=name, id=id, classes=classes)
+        self._cursor: ChatListCursor | None = None
+        self._exhausted = False
+        """True once the last page has been loaded."""
+        self._loading_page = False
+
+    @dataclass
+    class ChatUnarchived(Message):
+        chat_id: int
+        """The ID of the chat in the chat list."""
+        open: bool
+        """Whether the chat should be opened."""
+
+    def on_mount(self) -> None:
+        self.border_title = "Archive"
+        self.load_next_page()
+
+    @on(OptionList.OptionHighlighted)
+    @on(events.Focus)
+    def show_border_subtitle(self) -> None:
+        if self.highlighted is not None:
+            self.border_subtitle = f"{self.highlighted + 1} / {self.option_count}"
+        elif self.option_count > 0:
+            self.highlighted = 0
+
+    @on(OptionList.OptionHighlighted)
+    def prefetch_on_highlight(self, event: OptionList.OptionHighlighted) -> None:
+        if event.option_index >= self.option_count - self.PREFETCH_DISTANCE:
+            self.load_next_page()
+
+    def load_next_page(self) -> None:
+        """Append the next page of archived chats in the background, if there is one."""
+        if self._loading_page or self._exhausted:
+            return
+
+        self._loading_page = True
+        self._load_next_page(self._cursor)
+
+    @work(group="archive_page")
+    async def _load_next_page(self, cursor: ChatListCursor | None) -> None:
+        try:
+            chats = await ChatsManager.list_archived_chats(limit=self.PAGE_SIZE, after=cursor)
+        finally:
+            self._loading_page = False
+
+        self._exhausted = len(chats) < self.PAGE_SIZE
+        if chats:
+            self._cursor = chats[-1].cursor
+            self.add_options([ChatListItem(chat, cast("Luna", self.app).launch_config) for chat in chats])
+        self.update_border_title()
+        if self.highlighted is None and self.option_count > 0:
+            self.highlighted = 0
+
+    def update_border_title(self) -> None:
+        more = "" if self._exhausted else "+"
+        self.border_title = f"Archive ({self.option_count}{more})"
+
+    @on(OptionList.OptionSelected)
+    async def open_chat(self, event: OptionList.OptionSelected) -> None:
+        await self._unarchive(event.option_index, then_open=True)
+
+    async def action_unarchive_chat(self) -> None:
+        if self.highlighted is not None:
+            await self._unarchive(self.highlighted, then_open=False)
+
+    async def _unarchive(self, index: int, *, then_open: bool) -> None:
+        item = cast("ChatListItem", self.get_option_at_index(index))
+        chat_id = await ChatsManager.unarchive_chat(item.chat.id)
+        self.remove_option_at_index(index)
+        self.update_border_title()
+        if self.highlighted is not None:
+            self.border_subtitle = f"{self.highlighted + 1} / {self.option_count}"
+        else:
+            self.border_subtitle = None
+        self.post_message(self.ChatUnarchived(chat_id, open=then_open))
@@ -1,23 +1,29 @@
 from __future__ import annotations
 
+import asyncio
 import datetime
+import time
+from contextlib import aclosing
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, cast
+from typing import TYPE_CHECKING, cast, override
 
+from rich.markup import escape
 from textual.widgets import Label
 
 from luna_chat import constants
 from textual import log, on, work, events
 from textual.app import ComposeResult
 from textual.binding import Binding
-from textual.containers import VerticalScroll
+from textual.containers import Horizontal, VerticalScroll
 from textual.css.query import NoMatches
 from textual.message import Message
 from textual.reactive import reactive
 from textual.widget import Widget
 
 from luna_chat.chats_manager import ChatsManager
+from luna_chat.chunk_coalescer import ChunkCoalescer
 from luna_chat.models import ChatData, ChatMessage
+from luna_chat.read_ahead import read_ahead
 from luna_chat.screens.chat_details import ChatDetails
 from luna_chat.widgets.agent_is_typing import ResponseStatus
 from luna_chat.widgets.chat_header import ChatHeader, TitleStatic
@@ -26,15 +32,63 @@ from luna_chat.widgets.chatbox import Chatbox
 
 
 if TYPE_CHECKING:
+    from collections.abc import AsyncIterable
+
+    from litellm import CustomStreamWrapper
+    from litellm.types.utils import ModelResponseStream
+
     from luna_chat.app import Luna
+    from luna_chat.config import LunaChatModel
     from litellm.types.completion import (
+        ChatCompletionMessageParam,
         ChatCompletionUserMessageParam,
         ChatCompletionAssistantMessageParam,
     )
 
 
 class ChatPromptInput(PromptInput):
-    BINDINGS = [Binding("escape", "app.pop_screen", "Close chat", key_display="esc")]
+    BINDINGS = [Binding("escape", "close", "Close chat", key_display="esc")]
+
+    def action_close(self) -> None:
+        chat = next((node for node in self.ancestors if isinstance(node, Chat)), None)
+        if chat is not None and chat.editing is not None:
+            chat.cancel_edit()
+        else:
+            self.app.pop_screen()
+
+
+CONTINUE_PROMPT = "Your previous response was cut off. Continue it exactly where it stopped, without repeating anything."
+"""Sent after an interrupted response to have the model continue it. Not saved in the chat."""
+
+
+def _trim_messages(messages: list[ChatCompletionMessageParam], model_name: str) -> list[ChatCompletionMessageParam]:
+    """Trim the messages to fit the context of the model.
+
+    Importing litellm the first time and counting tokens are slow, so this is run in a thread.
+    """
+    from litellm.utils import trim_messages
+
+    return trim_messages(messages, model_name)  # type: ignore
+
+
+@dataclass
+class _ResponseInProgress:
+    """A response which is being streamed, and when it was last saved."""
+
+    message: ChatMessage
+    last_checkpoint: float
+    chunks_since_checkpoint: int = 0
+
+
+def _model_label(model: LunaChatModel) -> str:
+    return escape(model.display_name or model.name)
+
+
+class FanOutReplies(Horizontal):
+    """The replies of several models to the same message, side by side.
+
+    The chat continues from the first reply, the others are alternative branches.
+    """
 
 
 class Chat(Widget):
@@ -56,16 +110,37 @@ class Chat(Widget):
             show=False,
         ),
         Binding(key="f2", action="details", description="Chat info"),
+        Binding(key="f4", action="fan_out", description="Ask all models"),
+        Binding(key="ctrl+s", action="stop_response", description="Stop reply", key_display="^s"),
+        Binding(key="ctrl+g", action="continue_response", description="Continue reply", key_display="^g"),
     ]
 
+    PAGE_SIZE = 50
+    """The number of messages mounted when a chat is opened, and added when scrolling to the top."""
+
+    LOAD_OLDER_DISTANCE = 5
+    """Load older messages when scrolled this close to the top."""
+
     allow_input_submit = reactive(True)
     """Used to lock the chat input while the agent is responding."""
 
-    def __init__(self, chat_data: ChatData) -> None:
+    def __init__(self, chat_data: ChatData, focus_message_id: int | None = None) -> None:
         super().__init__()
         self.chat_data = chat_data
+        self.focus_message_id = focus_message_id
         self.luna = cast("Luna", self.app)
         self.model = chat_data.model
+        self._responses_in_progress: dict[int, _ResponseInProgress] = {}
+        """The responses which are being streamed, by the `id()` of their message."""
+        self._stop_requested_at: float | None = None
+        """When stopping the response was requested, to measure how long it takes."""
+        self._unmounted_message_count = 0
+        """The number of loaded messages, after the system prompt, which aren't mounted yet."""
+        self._older_messages_lock = asyncio.Lock()
+        self.editing: ChatMessage | None = None
+        """The message being edited in the prompt, which the submitted message replaces in a new branch."""
+        self._replaced_message: ChatMessage | None = None
+        """The message which the next message replaces in a new branch."""
 
     @dataclass
     class AgentResponseStarted(Message):
@@ -82,7 +157,24 @@ class Chat(Widget):
         """Sent when the agent fails to respond e.g. cant connect.
         Can be used to reset UI state."""
 
-        last_message: ChatMessage
+        user_message: ChatMessage | None
+        """The message the response was asked for, which is put back into the prompt. None when continuing a response."""
+        stopped: bool = False
+        """True if the response was stopped before it started, rather than failing."""
+
+    @dataclass
+    class AgentResponseInterrupted(Message):
+        """Sent when streaming a response fails part way through.
+        The partial response is kept, and can be continued."""
+
+        message: ChatMessage
+        chatbox: Chatbox
+
+    @dataclass
+    class FanOutFinished(Message):
+        """Sent when the responses of several models to a message have finished streaming, or were stopped."""
+
+        replies: list[ChatMessage]
 
     @dataclass
     class NewUserMessage(Message):
@@ -102,6 +194,7 @@ class Chat(Widget):
         When the component is mounted, we need to check if there is a new chat to start
         """
         await self.load_chat(self.chat_data)
+        self.watch(self.chat_container, "scroll_y", self.load_older_messages_near_top, init=False)
 
     @property
     def chat_container(self) -> VerticalScroll:
@@ -112,6 +205,14 @@ class Chat(Widget):
         """True if the conversation is empty, False otherwise."""
         return len(self.chat_data.messages) == 1  # Contains system message at first.
 
+    @property
+    def chat_id(self) -> int:
+        """The ID of the chat, which is saved before it is opened."""
+        if self.chat_data.id is None:
+            message = "The chat hasn't been saved."
+            raise RuntimeError(message)
+        return self.chat_data.id
+
     def scroll_to_latest_message(self):
         container = self.chat_container
         container.refresh()
@@ -119,11 +220,25 @@ class Chat(Widget):
 
     @on(AgentResponseFailed)
     def restore_state_on_agent_failure(self, event: Chat.AgentResponseFailed) -> None:
-        original_prompt = event.last_message.message.get("content", "")
-        if isinstance(original_prompt, str):
-            self.query_one(ChatPromptInput).text = original_prompt
+        prompt = self.query_one(ChatPromptInput)
+        if event.user_message is not None:
+            original_prompt = event.user_message.message.get("content", "")
+            if isinstance(original_prompt, str):
+                prompt.text = original_prompt
+        prompt.submit_ready = True
+        if event.stopped:
+            self.record_stop_latency()
+        else:
+            # A stop requested as the request failed didn't stop anything.
+            self._stop_requested_at = None
+        self.refresh_bindings()
 
-    async def new_user_message(self, content: str) -> None:
+    async def new_user_message(self, content: str, models: list[LunaChatModel] | None = None) -> None:
+        """Send a message to the model of the chat.
+
+        Args:
+            models: Send the message to these models at once instead, and show their replies side by side.
+        """
         log.debug(f"User message submitted in chat {self.chat_data.id!r}: {content!r}")
 
         now_utc = datetime.datetime.now(datetime.timezone.utc)
@@ -132,7 +247,22 @@ class Chat(Widget):
             "role": "user",
         }
 
-        user_chat_message = ChatMessage(user_message, now_utc, self.chat_data.model)
+        edited = self.editing
+        if edited is not None:
+            # The edited message and those after it stay in their branch.
+            self.cancel_edit()
+            await self.load_all_messages()
+            await self.remove_messages_from(edited)
+            self.replace_next_message(edited)
+        else:
+            # Replying to an interrupted response accepts it as it is.
+            interrupted = self.interrupted_response
+            if interrupted is not None:
+                interrupted.in_progress = False
+                self.luna.message_write_queue.enqueue_update(interrupted)
+                self.refresh_bindings()
+
+        user_chat_message = self.new_message(user_message, now_utc)
         self.chat_data.messages.append(user_chat_message)
         user_message_chatbox = Chatbox(user_chat_message, self.chat_data.model)
 
@@ -143,36 +273,43 @@ class Chat(Widget):
         self.scroll_to_latest_message()
         self.post_message(self.NewUserMessage(content))
 
-        await ChatsManager.add_message_to_chat(chat_id=self.chat_data.id, message=user_chat_message)
+        self.luna.message_write_queue.enqueue(self.chat_id, user_chat_message)
 
         prompt = self.query_one(ChatPromptInput)
         prompt.submit_ready = False
-        self.stream_agent_response()
+        await self.load_all_messages()
+        if models:
+            self.stream_fan_out(models)
+        else:
+            self.stream_agent_response()
 
-    @work(thread=True, group="agent_response")
-    async def stream_agent_response(self) -> None:
-        model = self.chat_data.model
-        log.debug(f"Creating streaming response with model {model.name!r}")
+    @work(group="agent_response")
+    async def stream_agent_response(self, continue_response: ChatMessage | None = None, model: LunaChatModel | None = None) -> None:
+        """Stream the response of the model to the chat.
 
-        import litellm
-        from litellm import ModelResponse, acompletion
-        from litellm.utils import trim_messages
+        Cancelling the worker stops reading the response, which is then kept as interrupted.
 
-        raw_messages = [message.message for message in self.chat_data.messages]
+        Args:
+            continue_response: An interrupted response to continue, rather than starting a new one.
+            model: The model to respond, by default the model of the response continued or of the chat.
+        """
+        if model is None:
+            model = continue_response.model if continue_response is not None else self.chat_data.model
+        log.debug(f"Creating streaming response with model {model.name!r}")
 
-        messages: list[ChatCompletionUserMessageParam] = trim_messages(raw_messages, model.name)  # type: ignore
+        raw_messages = [message.message for message in self.chat_data.messages]
+        # The last message is the interrupted response when continuing it.
+        user_message = self.chat_data.messages[-1] if continue_response is None else None
+        if continue_response is not None:
+            raw_messages.append({"content": CONTINUE_PROMPT, "role": "user"})
 
-        litellm.organization = model.organization
+        self.refresh_bindings()
         try:
-            response = await acompletion(
-                messages=messages,
-                stream=True,
-                model=model.name,
-                temperature=model.temperature,
-                max_retries=model.max_retries,
-                api_key=model.api_key.get_secret_value() if model.api_key else None,
-                api_base=model.api_base.unicode_string() if model.api_base else None,
-            )
+            response = await self.request_response(model, raw_messages)
+        except asyncio.CancelledError:
+            # Stopped before the response started.
+            self.post_message(self.AgentResponseFailed(user_message, stopped=True))
+            raise
         except Exception as exception:
             self.app.notify(
                 f"{exception}",
@@ -180,44 +317,42 @@ class Chat(Widget):
                 severity="error",
                 timeout=constants.ERROR_NOTIFY_TIMEOUT_SECS,
             )
-            self.post_message(self.AgentResponseFailed(self.chat_data.messages[-1]))
+            self.post_message(self.AgentResponseFailed(user_message))
             return
 
-        ai_message: ChatCompletionAssistantMessageParam = {
-            "content": "",
-            "role": "assistant",
-        }
-        now = datetime.datetime.now(datetime.timezone.utc)
-
-        message = ChatMessage(message=ai_message, model=model, timestamp=now)
-        response_chatbox = Chatbox(
-            message=message,
-            model=self.chat_data.model,
-            classes="response-in-progress",
-        )
-        self.post_message(self.AgentResponseStarted())
-        self.app.call_from_thread(self.chat_container.mount, response_chatbox)
+        if continue_response is None:
+            ai_message: ChatCompletionAssistantMessageParam = {
+                "content": "",
+                "role": "assistant",
+            }
+            now = datetime.datetime.now(datetime.UTC)
+
+            message = self.new_message(ai_message, now, model)
+            response_chatbox = Chatbox(
+                message=message,
+                model=model,
+                classes="response-in-progress",
+            )
+            self.post_message(self.AgentResponseStarted())
+            await self.chat_container.mount(response_chatbox)
+        else:
+            message = continue_response
+            response_chatbox = self.get_chatbox(message)
+            response_chatbox.set_classes("assistant-message response-in-progress")
+            self.post_message(self.AgentResponseStarted())
 
-        assert self.chat_container is not None, "Textual has mounted container at this point in the lifecycle."
+        self.start_checkpoints(message)
+        response_chatbox.border_title = "Agent is responding..."
 
         try:
-            chunk_count = 0
-            async for chunk in response:
-                chunk = cast(ModelResponse, chunk)
-                response_chatbox.border_title = "Agent is responding..."
-
-                chunk_content = chunk.choices[0].delta.content
-                if isinstance(chunk_content, str):
-                    self.app.call_from_thread(response_chatbox.append_chunk, chunk_content)
-                else:
-                    break
-
-                scroll_y = self.chat_container.scroll_y
-                max_scroll_y = self.chat_container.max_scroll_y
-                if scroll_y in range(max_scroll_y - 3, max_scroll_y + 1):
-                    self.app.call_from_thread(self.chat_container.scroll_end, animate=False)
-
-                chunk_count += 1
+            await self.stream_response(response, response_chatbox)
+        except asyncio.CancelledError:
+            if response_chatbox.is_attached:
+                self.post_message(self.AgentResponseInterrupted(message=message, chatbox=response_chatbox))
+            else:
+                # The chat was closed, and no longer handles messages.
+                self.finish_checkpoints(message, completed=False)
+            raise
         except Exception:
             self.notify(
                 "There was a problem using this model. " "Please check your configuration file.",
@@ -225,7 +360,7 @@ class Chat(Widget):
                 severity="error",
                 timeout=constants.ERROR_NOTIFY_TIMEOUT_SECS,
             )
-            self.post_message(self.AgentResponseFailed(self.chat_data.messages[-1]))
+            self.post_message(self.AgentResponseInterrupted(message=message, chatbox=response_chatbox))
         else:
             self.post_message(
                 self.AgentResponseComplete(
@@ -235,6 +370,268 @@ class Chat(Widget):
                 )
             )
 
+    @work(group="agent_response")
+    async def stream_fan_out(self, models: list[LunaChatModel]) -> None:
+        """Stream the responses of several models to the last message at once, side by side.
+
+        Each response is a reply to the message, i.e. a branch of the chat.
+        """
+        raw_messages = [message.message for message in self.chat_data.messages]
+        parent = self.chat_data.messages[-1]
+        now = datetime.datetime.now(datetime.timezone.utc)
+        chatboxes = [
+            Chatbox(
+                message=ChatMessage({"content": "", "role": "assistant"}, now, model, parent=parent),
+                model=model,
+                classes="response-in-progress",
+            )
+            for model in models
+        ]
+        self.refresh_bindings()
+        self.post_message(self.AgentResponseStarted())
+        replies = FanOutReplies(*chatboxes)
+        await self.chat_container.mount(replies)
+        for chatbox in chatboxes:
+            chatbox.border_title = f"{_model_label(chatbox.model)} is responding..."
+        started: list[Chatbox] = []
+        try:
+            await asyncio.gather(*(self.stream_fan_out_reply(raw_messages, chatbox, started) for chatbox in chatboxes))
+        finally:
+            # The replies are saved in the order their responses started, which is their order as branches.
+            for index, chatbox in enumerate(started):
+                chatbox.message.sibling_index = index
+                chatbox.message.sibling_count = len(started)
+                chatbox.border_subtitle = chatbox.branch_label
+            # The columns of the models which didn't respond have no reply to show.
+            started_ids = {id(chatbox) for chatbox in started}
+            if replies.is_attached:
+                if started:
+                    for chatbox in chatboxes:
+                        if id(chatbox) not in started_ids:
+                            chatbox.remove()
+                else:
+                    replies.remove()
+            self.post_message(self.FanOutFinished([chatbox.message for chatbox in chatboxes if id(chatbox) in started_ids]))
+
+    async def stream_fan_out_reply(self, raw_messages: list[ChatCompletionMessageParam], chatbox: Chatbox, started: list[Chatbox]) -> None:
+        """Stream the response of the model of the message in the chatbox, one of those shown side by side.
+
+        The reply is only saved once the response starts, when the chatbox is added to `started`.
+        """
+        message = chatbox.message
+        try:
+            response = await self.request_response(message.model, raw_messages)
+            self.start_checkpoints(message)
+            started.append(chatbox)
+            await self.stream_response(response, chatbox)
+        except asyncio.CancelledError:
+            if chatbox in started:
+                self.finish_fan_out_reply(chatbox, completed=False)
+            raise
+        except Exception as exception:  # noqa: BLE001 - a model which fails leaves no reply, and doesn't stop the others
+            self.notify(
+                f"{exception}",
+                title=f"Error from {_model_label(message.model)}",
+                severity="error",
+                timeout=constants.ERROR_NOTIFY_TIMEOUT_SECS,
+            )
+            if chatbox in started:
+                self.finish_fan_out_reply(chatbox, completed=False)
+        else:
+            self.finish_fan_out_reply(chatbox, completed=True)
+
+    def finish_fan_out_reply(self, chatbox: Chatbox, *, completed: bool) -> None:
+        self.finish_checkpoints(chatbox.message, completed=completed)
+        if not chatbox.is_attached:
+            return
+        if completed:
+            chatbox.remove_class("response-in-progress")
+            chatbox.border_title = _model_label(chatbox.model)
+        else:
+            self.show_interrupted(chatbox)
+            chatbox.border_title = f"{_model_label(chatbox.model)} (interrupted)"
+
+    async def request_response(self, model: LunaChatModel, raw_messages: list[ChatCompletionMessageParam]) -> CustomStreamWrapper:
+        """Ask the model for a response to the messages, which is streamed."""
+        messages = await asyncio.to_thread(_trim_messages, raw_messages, model.name)
+
+        from litellm import acompletion
+
+        response = await acompletion(
+            messages=messages,
+            stream=True,
+            model=model.name,
+            temperature=model.temperature,
+            max_retries=model.max_retries,
+            api_key=model.api_key.get_secret_value() if model.api_key else None,
+            api_base=model.api_base.unicode_string() if model.api_base else None,
+            organization=model.organization,
+            client=await self.luna.provider_clients.get(model),
+        )
+        return cast("CustomStreamWrapper", response)
+
+    async def stream_response(self, response: AsyncIterable[ModelResponseStream], chatbox: Chatbox) -> None:
+        """Show the chunks of a streamed response in the chatbox as they arrive.
+
+        Cancelling closes the stream, which closes the connection, so the
+        model stops generating the response.
+        """
+        message = chatbox.message
+        streaming = self.luna.launch_config.streaming
+
+        def show_chunks(text: str, chunk_count: int) -> None:
+            if chatbox.is_attached:
+                self.append_response_chunk(chatbox, text, chunk_count)
+            else:
+                # The chat was closed, the text is only saved.
+                message.append_content(text)
+
+        coalescer = ChunkCoalescer(show_chunks, streaming.frame_rate)
+        try:
+            async with aclosing(read_ahead(response, streaming.max_queued_chunks)) as chunks:
+                # The stream is read to its end, even past the last content, so its connection is kept for the next request.
+                async for chunk in chunks:
+                    chunk_content = chunk.choices[0].delta.content
+                    if isinstance(chunk_content, str):
+                        coalescer.add(chunk_content)
+        except asyncio.CancelledError:
+            close_stream = getattr(response, "aclose", None)
+            if close_stream is not None:
+                await close_stream()
+            raise
+        finally:
+            coalescer.close()
+
+    def new_message(self, message: ChatCompletionMessageParam, timestamp: datetime.datetime, model: LunaChatModel | None = None) -> ChatMessage:
+        """Create a message which replies to the last one, and replaces a message if `replace_next_message` was called.
+
+        The message is from the model of the chat unless another `model` is given.
+        """
+        messages = self.chat_data.messages
+        chat_message = ChatMessage(message, timestamp, model or self.chat_data.model, parent=messages[-1] if messages else None)
+        replaced, self._replaced_message = self._replaced_message, None
+        if replaced is not None:
+            # It's the most recent of the replies to its parent.
+            chat_message.sibling_index = replaced.sibling_count
+            chat_message.sibling_count = replaced.sibling_count + 1
+        return chat_message
+
+    def replace_next_message(self, message: ChatMessage) -> None:
+        """Make the next new message an alternative to the given one, as another reply to its parent."""
+        self._replaced_message = message
+
+    def shown_message(self, message: ChatMessage) -> ChatMessage:
+        """Return the message of the chat which the given one is shown with.
+
+        That's the message itself, or for one of the replies shown side by
+        side, the reply the chat continues from.
+        """
+        if any(loaded is message for loaded in self.chat_data.messages):
+            return message
+        chatbox = self.get_chatbox(message)
+        if isinstance(chatbox.parent, FanOutReplies):
+            loaded = {id(loaded) for loaded in self.chat_data.messages}
+            for reply in chatbox.parent.query(Chatbox):
+                if id(reply.message) in loaded:
+                    return reply.message
+        return message
+
+    async def remove_messages_from(self, message: ChatMessage) -> None:
+        """Remove a message and those after it from the chat, but not from the database, to show another branch."""
+        messages = self.chat_data.messages
+        index = next(index for index, loaded in enumerate(messages) if loaded is message)
+        removed = {id(removed) for removed in messages[index:]}
+        del messages[index:]
+        # The replies shown side by side with a removed one are removed with it.
+        widgets: list[Widget] = [
+            chatbox.parent if isinstance(chatbox.parent, FanOutReplies) else chatbox
+            for chatbox in self.query(Chatbox)
+            if id(chatbox.message) in removed
+        ]
+        focused = self.screen.focused
+        if focused is not None and any(widget is focused or widget in focused.ancestors for widget in widgets):
+            # Otherwise the focus moves to the first message, scrolling to the top.
+            self.query_one(ChatPromptInput).focus(scroll_visible=False)
+        await self.chat_container.remove_children(widgets)
+        if self.editing is not None and id(self.editing) in removed:
+            self.cancel_edit()
+        self.refresh_bindings()
+
+    @property
+    def is_responding(self) -> bool:
+        """True while the model is asked for a response, or responding."""
+        return not self.query_one(ChatPromptInput).submit_ready
+
+    @on(Chatbox.EditRequested)
+    def edit_message(self, event: Chatbox.EditRequested) -> None:
+        """Put the content of the message into the prompt, to send it in its place."""
+        content = event.chatbox.message.message.get("content")
+        if not isinstance(content, str):
+            return
+        self.editing = event.chatbox.message
+        prompt = self.query_one(ChatPromptInput)
+        prompt.text = content
+        prompt.border_title = "Edit the message, it's sent as a new branch ([b]esc[/] to cancel)"
+        prompt.focus()
+
+    def cancel_edit(self) -> None:
+        self.editing = None
+        prompt = self.query_one(ChatPromptInput)
+        prompt.clear()
+        prompt.border_title = "Enter your [u]m[/]essage..."
+
+    @on(Chatbox.RegenerateRequested)
+    async def regenerate_response(self, event: Chatbox.RegenerateRequested) -> None:
+        """Ask the model for another response in place of the message, in a new branch."""
+        message = event.chatbox.message
+        if self.is_responding:
+            self.app.bell()
+            self.notify("Please wait for response to complete.")
+            return
+
+        prompt = self.query_one(ChatPromptInput)
+        prompt.submit_ready = False
+        await self.load_all_messages()
+        await self.remove_messages_from(self.shown_message(message))
+        self.replace_next_message(message)
+        # A reply from a model the message was sent to alongside others is regenerated by the same model.
+        self.stream_agent_response(model=message.model)
+
+    @on(Chatbox.BranchSwitchRequested)
+    async def switch_branch(self, event: Chatbox.BranchSwitchRequested) -> None:
+        """Show another branch from the parent of the message.
+
+        Only the messages from the message onwards are replaced, those before
+        it are shared by both branches and stay mounted.
+        """
+        if self.is_responding:
+            self.app.bell()
+            self.notify("Please wait for response to complete.")
+            return
+
+        # The other branches are looked up in the database, which must have the messages of this one.
+        await self.luna.message_write_queue.flush()
+        message = event.chatbox.message
+        if message.id is None:
+            return
+        sibling_ids = await ChatsManager.sibling_ids(message.id)
+        if len(sibling_ids) <= 1 or message.id not in sibling_ids:
+            return
+        sibling_id = sibling_ids[(sibling_ids.index(message.id) + event.offset) % len(sibling_ids)]
+        branch = await ChatsManager.switch_branch(self.chat_id, sibling_id)
+
+        await self.remove_messages_from(self.shown_message(message))
+        self.chat_data.messages.extend(branch)
+        chatboxes = [Chatbox(branch_message, self.chat_data.model) for branch_message in branch]
+        await self.chat_container.mount_all(chatboxes)
+        # It takes the place of the message, which was on screen.
+        chatboxes[0].focus(scroll_visible=False)
+
+        interrupted = self.interrupted_response
+        if interrupted is not None:
+            self.show_interrupted(self.get_chatbox(interrupted))
+        self.refresh_bindings()
+
     @on(AgentResponseFailed)
     @on(AgentResponseStarted)
     async def agent_started_responding(self, event: AgentResponseFailed | AgentResponseStarted) -> None:
@@ -249,11 +646,151 @@ class Chat(Widget):
     @on(AgentResponseComplete)
     def agent_finished_responding(self, event: AgentResponseComplete) -> None:
         # Ensure the thread is updated with the message from the agent
-        self.chat_data.messages.append(event.message)
+        if self.chat_data.messages[-1] is not event.message:
+            self.chat_data.messages.append(event.message)
+        self.finish_checkpoints(event.message, completed=True)
         event.chatbox.border_title = "Agent"
-        event.chatbox.remove_class("response-in-progress")
+        event.chatbox.remove_class("response-in-progress", "response-interrupted")
+        prompt = self.query_one(ChatPromptInput)
+        prompt.submit_ready = True
+        # In case it completed as it was stopped.
+        self.record_stop_latency()
+
+    @on(AgentResponseInterrupted)
+    def agent_interrupted(self, event: AgentResponseInterrupted) -> None:
+        if self.chat_data.messages[-1] is not event.message:
+            self.chat_data.messages.append(event.message)
+        self.finish_checkpoints(event.message, completed=False)
+        self.show_interrupted(event.chatbox)
+        prompt = self.query_one(ChatPromptInput)
+        prompt.submit_ready = True
+        self.record_stop_latency()
+
+    def start_checkpoints(self, message: ChatMessage) -> None:
+        """Start saving the response while it is streamed, so it survives a crash."""
+        self._responses_in_progress[id(message)] = _ResponseInProgress(message, last_checkpoint=time.monotonic())
+        message.in_progress = True
+        if message.id is None:
+            self.luna.message_write_queue.enqueue(self.chat_id, message)
+        else:
+            self.luna.message_write_queue.enqueue_update(message)
+        self.refresh_bindings()
+
+    def append_response_chunk(self, chatbox: Chatbox, chunk: str, chunk_count: int = 1) -> None:
+        """Show streamed text, which may be several chunks collected over a frame."""
+        container = self.chat_container
+        following = container.scroll_y >= container.max_scroll_y - 3
+        chatbox.append_chunk(chunk)
+        if following:
+            container.scroll_end(animate=False)
+        # Checkpoints only mark the message as changed, the write queue reads the
+        # content when it writes, so slow writes coalesce rather than pile up.
+        response = self._responses_in_progress.get(id(chatbox.message))
+        if response is None:
+            return
+        response.chunks_since_checkpoint += chunk_count
+        config = self.luna.launch_config.streaming
+        now = time.monotonic()
+        if response.chunks_since_checkpoint >= config.checkpoint_chunks or now - response.last_checkpoint >= config.checkpoint_interval:
+            self.luna.message_write_queue.enqueue_update(chatbox.message)
+            response.last_checkpoint = now
+            response.chunks_since_checkpoint = 0
+
+    def finish_checkpoints(self, message: ChatMessage, *, completed: bool) -> None:
+        """Save the final content of the response.
+
+        Args:
+            completed: False if the response was cut off, it's then kept
+                marked as in progress so it can be continued.
+        """
+        self._responses_in_progress.pop(id(message), None)
+        message.in_progress = not completed
+        message.sync_content()
+        self.luna.message_write_queue.enqueue_update(message)
+        if self.is_attached:
+            self.refresh_bindings()
+
+    def show_interrupted(self, chatbox: Chatbox) -> None:
+        chatbox.remove_class("response-in-progress")
+        chatbox.add_class("response-interrupted")
+        chatbox.border_title = "Agent (interrupted)"
+
+    @property
+    def interrupted_response(self) -> ChatMessage | None:
+        """The last message, if it is a response which was cut off."""
+        last_message = self.chat_data.messages[-1] if self.chat_data.messages else None
+        if last_message is not None and last_message.in_progress and id(last_message) not in self._responses_in_progress:
+            return last_message
+        return None
+
+    @override
+    def check_action(self, action: str, parameters: tuple[object, ...]) -> bool | None:
+        if action == "continue_response":
+            return self.interrupted_response is not None
+        if action == "stop_response":
+            return self.is_responding
+        if action == "fan_out":
+            return bool(self.luna.launch_config.fan_out_models)
+        return True
+
+    async def action_fan_out(self) -> None:
+        """Send the message in the prompt to the fan-out models at once."""
+        prompt = self.query_one(ChatPromptInput)
+        if not prompt.text.strip():
+            return
+        if self.is_responding or not self.allow_input_submit:
+            self.app.bell()
+            self.notify("Please wait for response to complete.")
+            return
+        content = prompt.text
+        prompt.clear()
+        await self.new_user_message(content, models=self.luna.launch_config.fan_out_model_objects)
+
+    @on(FanOutFinished)
+    async def fan_out_finished(self, event: FanOutFinished) -> None:
+        # Without replies, the chat continues from the message.
+        first_reply = event.replies[0] if event.replies else None
+        if first_reply is not None:
+            self.chat_data.messages.append(first_reply)
         prompt = self.query_one(ChatPromptInput)
         prompt.submit_ready = True
+        self.record_stop_latency()
+        self.refresh_bindings()
+
+        # The last message which was saved is the end of the branch shown when the chat is opened again.
+        await self.luna.message_write_queue.flush()
+        if first_reply is not None and first_reply.id is not None:
+            await ChatsManager.switch_branch(self.chat_id, first_reply.id)
+
+    def action_stop_response(self) -> None:
+        """Stop the response, keeping what was received as an interrupted response."""
+        if not self.is_responding or self._stop_requested_at is not None:
+            return
+        self._stop_requested_at = time.monotonic()
+        self.workers.cancel_group(self, "agent_response")
+
+    def record_stop_latency(self) -> None:
+        """Record how long stopping the response took, once the prompt is ready again."""
+        if self._stop_requested_at is None:
+            return
+        latency = time.monotonic() - self._stop_requested_at
+        self._stop_requested_at = None
+        self.luna.stop_latencies.append(latency)
+        log.debug(f"Stopped the response in chat {self.chat_data.id!r} in {latency * 1000:.1f}ms")
+
+    async def action_continue_response(self) -> None:
+        message = self.interrupted_response
+        if message is None:
+            return
+        self.query_one(ChatPromptInput).submit_ready = False
+        self.allow_input_submit = False
+        await self.load_all_messages()
+        self.stream_agent_response(continue_response=message)
+
+    async def on_unmount(self) -> None:
+        # Save the chunks received since the last checkpoint.
+        for response in self._responses_in_progress.values():
+            self.luna.message_write_queue.enqueue_update(response.message)
 
     @on(PromptInput.PromptSubmitted)
     async def user_chat_message_submitted(self, event: PromptInput.PromptSubmitted) -> None:
@@ -280,12 +817,34 @@ class Chat(Widget):
     def get_latest_chatbox(self) -> Chatbox:
         return self.query(Chatbox).last()
 
+    def get_chatbox(self, message: ChatMessage) -> Chatbox:
+        for chatbox in self.query(Chatbox):
+            if chatbox.message is message:
+                return chatbox
+        error_message = f"No chatbox for message {message.id!r}"
+        raise NoMatches(error_message)
+
     def focus_latest_message(self) -> None:
         try:
             self.get_latest_chatbox().focus()
         except NoMatches:
             pass
 
+    def focus_message(self, message_id: int | None) -> bool:
+        """Scroll to and focus the message with the given ID.
+
+        Returns:
+            True if the message was found, False otherwise.
+        """
+        if message_id is None:
+            return False
+        for chatbox in self.query(Chatbox):
+            if chatbox.message.id == message_id:
+                self.chat_container.scroll_to_widget(chatbox, animate=False, top=True)
+                chatbox.focus(scroll_visible=False)
+                return True
+        return False
+
     def action_rename(self) -> None:
         title_static = self.query_one(TitleStatic)
         title_static.begin_rename()
@@ -293,12 +852,71 @@ class Chat(Widget):
     def action_focus_latest_message(self) -> None:
         self.focus_latest_message()
 
-    def action_focus_first_message(self) -> None:
+    async def action_focus_first_message(self) -> None:
+        await self.load_older_messages()
         try:
             self.query(Chatbox).first().focus()
         except NoMatches:
             pass
 
+    @property
+    def has_older_messages(self) -> bool:
+        """True if some messages above the first mounted one aren't mounted yet."""
+        return self._unmounted_message_count > 0 or self.chat_data.unloaded_message_count > 0
+
+    def load_older_messages_near_top(self, scroll_y: float) -> None:
+        if scroll_y <= self.LOAD_OLDER_DISTANCE and self.has_older_messages and not self._older_messages_lock.locked():
+            self.run_worker(self.load_older_messages(), group="older_messages")
+
+    async def load_older_messages(self) -> None:
+        """Mount the page of messages above the first mounted one, keeping the scroll position."""
+        async with self._older_messages_lock:
+            messages = self.chat_data.messages
+            if self._unmounted_message_count > 0:
+                end = 1 + self._unmounted_message_count
+                older = messages[max(end - self.PAGE_SIZE, 1) : end]
+                self._unmounted_message_count -= len(older)
+            elif self.chat_data.unloaded_message_count > 0:
+                older = await self._fetch_older_messages(limit=self.PAGE_SIZE)
+            else:
+                return
+
+            container = self.chat_container
+            height = container.virtual_size.height
+            chatboxes = [Chatbox(message, self.chat_data.model) for message in older]
+            await container.mount_all(chatboxes, before=0)
+
+            def keep_scroll_position() -> None:
+                # The mounted messages push down what was on screen, by the height they add.
+                added_height = container.virtual_size.height - height
+                container.scroll_to(y=container.scroll_y + added_height, animate=False, immediate=True)
+
+            self.call_after_refresh(keep_scroll_position)
+
+    async def load_all_messages(self) -> None:
+        """Load all the messages which weren't loaded when the chat was opened, without mounting them.
+
+        The model is sent the whole conversation, so this is required before it responds.
+        """
+        async with self._older_messages_lock:
+            if self.chat_data.unloaded_message_count > 0:
+                older = await self._fetch_older_messages(limit=None)
+                self._unmounted_message_count += len(older)
+
+    async def _fetch_older_messages(self, limit: int | None) -> list[ChatMessage]:
+        """Load messages before the oldest loaded one, and add them to the chat data."""
+        messages = self.chat_data.messages
+        oldest = messages[1] if len(messages) > 1 else None
+        if oldest is None or oldest.id is None:
+            return []
+        older = await ChatsManager.get_messages(self.chat_id, before=oldest.id, limit=limit)
+        messages[1:1] = older
+        if limit is None or len(older) < limit:
+            self.chat_data.unloaded_message_count = 0
+        else:
+            self.chat_data.unloaded_message_count = max(self.chat_data.unloaded_message_count - len(older), 0)
+        return older
+
     def action_scroll_container_up(self) -> None:
         if self.chat_container:
             self.chat_container.scroll_up()
@@ -313,7 +931,8 @@ class Chat(Widget):
     async def load_chat(self, chat_data: ChatData) -> None:
         chatboxes = [Chatbox(chat_message, chat_data.model) for chat_message in chat_data.non_system_messages]
         await self.chat_container.mount_all(chatboxes)
-        self.chat_container.scroll_end(animate=False, force=True)
+        if not self.focus_message(self.focus_message_id):
+            self.chat_container.scroll_end(animate=False, force=True)
         chat_header = self.query_one(ChatHeader)
         chat_header.update_header(
             chat=chat_data,
@@ -322,9 +941,17 @@ class Chat(Widget):
 
         # If the last message didn't receive a response, try again.
         messages = chat_data.messages
-        if messages and messages[-1].message["role"] == "user":
+        interrupted = self.interrupted_response
+        if interrupted is not None:
+            self.show_interrupted(self.get_chatbox(interrupted))
+            self.notify(
+                "The last reply was cut off. Press [b]ctrl+g[/] to continue it.",
+                title="Reply interrupted",
+            )
+        elif messages and messages[-1].message["role"] == "user":
             prompt = self.query_one(ChatPromptInput)
             prompt.submit_ready = False
+            await self.load_all_messages()
             self.stream_agent_response()
 
     def action_close(self) -> None:
@@ -1,28 +1,40 @@
 from __future__ import annotations
 
+import asyncio
 import datetime
 from dataclasses import dataclass
-from typing import cast
+from typing import TYPE_CHECKING, cast
 
 import humanize
 from rich.console import RenderResult, Console, ConsoleOptions
 from rich.markup import escape
 from rich.padding import Padding
 from rich.text import Text
-from textual import events, log, on
+from textual import events, log, on, work
 from textual.binding import Binding
 from textual.message import Message
 from textual.widgets import OptionList
 from textual.widgets.option_list import Option
 
 from luna_chat.chats_manager import ChatsManager
-from luna_chat.config import LaunchConfig
-from luna_chat.models import ChatData
+from luna_chat.database.search import SNIPPET_END, SNIPPET_START
+
+if TYPE_CHECKING:
+    from luna_chat.app import Luna
+    from luna_chat.config import LaunchConfig, LunaChatModel
+    from luna_chat.models import ChatListCursor, ChatSummary, SearchHit
+
+
+def model_subtitle(model: LunaChatModel) -> Text:
+    subtitle = f"[dim]{escape(model.display_name or model.name)}"
+    if model.provider:
+        subtitle += f" [i]by[/] {escape(model.provider)}"
+    return Text.from_markup(subtitle)
 
 
 @dataclass
 class ChatListItemRenderable:
-    chat: ChatData
+    chat: ChatSummary
     config: LaunchConfig
 
     def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
@@ -30,11 +42,7 @@ class ChatListItemRenderable:
         delta = now - self.chat.update_time
         time_ago = humanize.naturaltime(delta)
         time_ago_text = Text(time_ago, style="dim i")
-        model = self.chat.model
-        subtitle = f"[dim]{escape(model.display_name or model.name)}"
-        if model.provider:
-            subtitle += f" [i]by[/] {escape(model.provider)}"
-        model_text = Text.from_markup(subtitle)
+        model_text = model_subtitle(self.chat.model)
         title = self.chat.title or self.chat.short_preview.replace("\n", " ")
         yield Padding(
             Text.assemble(title, "\n", model_text, "\n", time_ago_text),
@@ -43,7 +51,7 @@ class ChatListItemRenderable:
 
 
 class ChatListItem(Option):
-    def __init__(self, chat: ChatData, config: LaunchConfig) -> None:
+    def __init__(self, chat: ChatSummary, config: LaunchConfig) -> None:
         """
         Args:
             chat: The chat associated with this option.
@@ -53,6 +61,40 @@ class ChatListItem(Option):
         self.config = config
 
 
+@dataclass
+class SearchResultItemRenderable:
+    hit: SearchHit
+
+    def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
+        title = self.hit.title or self.hit.short_preview.replace("\n", " ")
+        author = "You" if self.hit.role == "user" else "Agent"
+        snippet = Text.assemble((f"{author}: ", "dim"), *self._snippet_parts())
+        yield Padding(
+            Text.assemble(title, "\n", snippet, "\n", model_subtitle(self.hit.model)),
+            pad=(0, 0, 0, 1),
+        )
+
+    def _snippet_parts(self) -> list[tuple[str, str]]:
+        parts: list[tuple[str, str]] = []
+        for index, part in enumerate(self.hit.snippet.replace("\n", " ").split(SNIPPET_START)):
+            if index == 0:
+                parts.append((part, ""))
+            else:
+                match, _, rest = part.partition(SNIPPET_END)
+                parts.extend([(match, "bold underline"), (rest, "")])
+        return parts
+
+
+class SearchResultItem(Option):
+    def __init__(self, hit: SearchHit) -> None:
+        """
+        Args:
+            hit: The search hit associated with this option.
+        """
+        super().__init__(SearchResultItemRenderable(hit))
+        self.hit = hit
+
+
 class ChatList(OptionList):
     BINDINGS = [
         Binding(
@@ -78,9 +120,44 @@ class ChatList(OptionList):
         Binding("pageup", "page_up", "Page Up", show=False),
     ]
 
+    PAGE_SIZE = 50
+    """The number of chats loaded from the database at once."""
+
+    PREFETCH_DISTANCE = 10
+    """Load the next page when the cursor gets this close to the last loaded chat."""
+
+    SEARCH_PAGE_SIZE = 50
+    """The number of search results loaded at once."""
+
+    def __init__(
+        self,
+        *content: Option,
+        name: str | None = None,
+        id: str | None = None,  # noqa: A002
+        classes: str | None = None,
+        disabled: bool = False,
+    ) -> None:
+        super().__init__(*content, name=name, id=id, classes=classes, disabled=disabled)
+        self.options: list[ChatListItem] = []
+        self.total_count = 0
+        """The number of chats in the database, including those not loaded yet."""
+        self._cursor: ChatListCursor | None = None
+        self._exhausted = False
+        """True once the last page has been loaded."""
+        self._loading_page = False
+        self._version: int | None = None
+        """The change version the loaded chats are up to date with."""
+        self.search_query: str | None = None
+        """The current search, None if the list shows the chat history."""
+        self._search_exhausted = False
+
     @dataclass
     class ChatOpened(Message):
-        chat: ChatData
+        chat_id: int
+        message_id: int | None = None
+        """The message to jump to, when opened from a search result."""
+        version: int | None = None
+        """The change version of the chat as listed, if known."""
 
     class CursorEscapingTop(Message):
         """Cursor attempting to move out-of-bounds at top of list."""
@@ -88,15 +165,15 @@ class ChatList(OptionList):
     class CursorEscapingBottom(Message):
         """Cursor attempting to move out-of-bounds at bottom of list."""
 
-    async def on_mount(self) -> None:
-        await self.reload_and_refresh()
-
     @on(OptionList.OptionSelected)
-    async def post_chat_opened(self, event: OptionList.OptionSelected) -> None:
-        assert isinstance(event.option, ChatListItem)
-        chat = event.option.chat
-        await self.reload_and_refresh()
-        self.post_message(ChatList.ChatOpened(chat=chat))
+    def post_chat_opened(self, event: OptionList.OptionSelected) -> None:
+        if isinstance(event.option, SearchResultItem):
+            hit = event.option.hit
+            self.post_message(ChatList.ChatOpened(chat_id=hit.chat_id, message_id=hit.message_id))
+        else:
+            assert isinstance(event.option, ChatListItem)
+            chat = event.option.chat
+            self.post_message(ChatList.ChatOpened(chat_id=chat.id, version=chat.version))
 
     @on(OptionList.OptionHighlighted)
     @on(events.Focus)
@@ -109,14 +186,121 @@ class ChatList(OptionList):
     def on_blur(self) -> None:
         self.border_subtitle = None
 
+    @on(OptionList.OptionHighlighted)
+    def prefetch_on_highlight(self, event: OptionList.OptionHighlighted) -> None:
+        if event.option_index >= self.option_count - self.PREFETCH_DISTANCE:
+            self.load_next_page()
+
+    def watch_scroll_y(self, old_value: float, new_value: float) -> None:
+        super().watch_scroll_y(old_value, new_value)
+        if self.max_scroll_y - new_value <= self.scrollable_content_region.height:
+            self.load_next_page()
+
+    async def sync(self) -> None:
+        """Bring the list up to date with the database.
+
+        The first call loads the first page, subsequent calls only apply
+        the chats which changed in the meantime. Does nothing while the
+        list shows search results.
+        """
+        if self.search_query is not None:
+            return
+        if self._version is None:
+            await self.reload_and_refresh()
+        else:
+            await self.apply_changes(self._version)
+
+    async def apply_changes(self, version: int) -> None:
+        """Patch, insert, reorder or remove only the chats which changed since
+        the given version, keeping the highlight on the same chat."""
+        changes = await ChatsManager.changed_since(version)
+        self._version = changes.version
+        if not changes.updated and not changes.removed:
+            return
+
+        highlighted_chat_id = None
+        if self.highlighted is not None:
+            highlighted_chat_id = self.options[self.highlighted].chat.id
+
+        for chat_id in changes.removed:
+            index = self._chat_index(chat_id)
+            if index is not None:
+                self._remove_chat_at(index)
+        for chat in changes.updated:
+            self._apply_update(chat)
+
+        if changes.chat_count is not None:
+            self.total_count = changes.chat_count
+        self.border_title = self.get_border_title()
+
+        highlighted = self._chat_index(highlighted_chat_id) if highlighted_chat_id is not None else None
+        if highlighted is not None:
+            self.highlighted = highlighted
+        self.refresh()
+
+    def _apply_update(self, chat: ChatSummary) -> None:
+        """Show the changed chat in place, or move it to where it belongs now."""
+        cursor = chat.cursor
+        if cursor is None:
+            # Chats without messages aren't listed.
+            return
+        index = self._chat_index(chat.id)
+        if index is not None:
+            if self._is_in_order(index, cursor):
+                item = self.options[index]
+                item.chat = chat
+                self.replace_option_prompt_at_index(index, ChatListItemRenderable(chat, item.config))
+                return
+            self._remove_chat_at(index)
+
+        if not self._exhausted and self._cursor is not None and cursor < self._cursor:
+            # Not loaded yet, it will be part of a later page.
+            return
+        index = next(
+            (index for index, item in enumerate(self.options) if item.chat.cursor is None or item.chat.cursor < cursor),
+            len(self.options),
+        )
+        self._insert_chat_at(index, ChatListItem(chat, cast("Luna", self.app).launch_config))
+
+    def _is_in_order(self, index: int, cursor: ChatListCursor) -> bool:
+        """Whether a chat with the given cursor belongs at the index of the list, between its neighbours."""
+        before = self.options[index - 1].chat.cursor if index > 0 else None
+        after = self.options[index + 1].chat.cursor if index + 1 < len(self.options) else None
+        # Chats without a cursor, i.e. without messages, come first.
+        return (before is None or before > cursor) and (index + 1 == len(self.options) or (after is not None and after < cursor))
+
+    def _chat_index(self, chat_id: int) -> int | None:
+        return next((index for index, item in enumerate(self.options) if item.chat.id == chat_id), None)
+
+    def _remove_chat_at(self, index: int) -> None:
+        self.options.pop(index)
+        self.remove_option_at_index(index)
+
+    def _insert_chat_at(self, index: int, item: ChatListItem) -> None:
+        self.options.insert(index, item)
+        # OptionList can only append options. The list has no separators, and its options no IDs,
+        # so inserting into both lists OptionList keeps its content in is all `add_options` would do.
+        self._contents.insert(index, item)
+        self._options.insert(index, item)
+        self._refresh_lines()
+
     async def reload_and_refresh(self, new_highlighted: int = -1) -> None:
         """Reload the chats and refresh the widget. Can be used to
         update the ordering/previews/titles etc contained in the list.
 
+        Only the first page is loaded (or as many chats as were loaded
+        before, so the highlight doesn't jump), the remaining pages are
+        fetched as the cursor or scroll position approaches the bottom.
+
         Args:
             new_highlighted: The index to highlight after refresh.
         """
-        self.options = await self.load_chat_list_items()
+        limit = max(self.PAGE_SIZE, len(self.options))
+        self._version = await ChatsManager.latest_version()
+        self.options = await self.load_chat_list_items(limit)
+        self.total_count = await ChatsManager.count_chats()
+        self._exhausted = len(self.options) < limit
+        self._cursor = self.options[-1].chat.cursor if self.options else None
         old_highlighted = self.highlighted
         self.clear_options()
         self.add_options(self.options)
@@ -128,16 +312,103 @@ class ChatList(OptionList):
 
         self.refresh()
 
-    async def load_chat_list_items(self) -> list[ChatListItem]:
-        chats = await self.load_chats()
+    def load_next_page(self) -> None:
+        """Append the next page of chats to the list in the background, if there is one."""
+        if self.search_query is not None:
+            self.load_next_search_page()
+            return
+
+        if self._loading_page or self._exhausted or self._cursor is None:
+            return
+
+        self._loading_page = True
+        self._load_next_page(self._cursor)
+
+    @work(group="chat_list_page")
+    async def _load_next_page(self, cursor: ChatListCursor) -> None:
+        try:
+            items = await self.load_chat_list_items(self.PAGE_SIZE, after=cursor)
+        finally:
+            self._loading_page = False
+
+        if cursor != self._cursor:
+            # The list was reloaded while this page was loading.
+            return
+
+        self._exhausted = len(items) < self.PAGE_SIZE
+        if items:
+            self._cursor = items[-1].chat.cursor
+            self.options.extend(items)
+            self.add_options(items)
+            if self.has_focus:
+                self.border_subtitle = self.get_border_subtitle()
+
+    async def load_chat_list_items(self, limit: int, after: ChatListCursor | None = None) -> list[ChatListItem]:
+        chats = await self.load_chats(limit, after)
         return [ChatListItem(chat, self.app.launch_config) for chat in chats]
 
-    async def load_chats(self) -> list[ChatData]:
-        all_chats = await ChatsManager.all_chats()
-        return all_chats
+    async def load_chats(self, limit: int, after: ChatListCursor | None = None) -> list[ChatSummary]:
+        return await ChatsManager.list_chat_summaries(limit=limit, after=after)
+
+    async def search(self, query: str) -> None:
+        """Replace the chats with the messages matching the query.
+
+        An empty query shows the chat history again.
+        """
+        if query.strip():
+            self._search(query)
+        else:
+            await self.close_search()
+
+    @work(group="search", exclusive=True)
+    async def _search(self, query: str) -> None:
+        # Debounce, this worker is cancelled if the user keeps typing.
+        await asyncio.sleep(0.1)
+        hits = await ChatsManager.search(query, limit=self.SEARCH_PAGE_SIZE)
+        self.search_query = query
+        self._search_exhausted = len(hits) < self.SEARCH_PAGE_SIZE
+        self.clear_options()
+        self.add_options([SearchResultItem(hit) for hit in hits])
+        self.border_title = self.get_border_title()
+        if hits:
+            self.highlighted = 0
+
+    def load_next_search_page(self) -> None:
+        if self._loading_page or self._search_exhausted or self.search_query is None:
+            return
+
+        self._loading_page = True
+        self._load_next_search_page(self.search_query, self.option_count)
+
+    @work(group="search")
+    async def _load_next_search_page(self, query: str, offset: int) -> None:
+        try:
+            hits = await ChatsManager.search(query, limit=self.SEARCH_PAGE_SIZE, offset=offset)
+        finally:
+            self._loading_page = False
+
+        if query != self.search_query or offset != self.option_count:
+            return
+
+        self._search_exhausted = len(hits) < self.SEARCH_PAGE_SIZE
+        self.add_options([SearchResultItem(hit) for hit in hits])
+        self.border_title = self.get_border_title()
+
+    async def close_search(self) -> None:
+        """Show the chat history again."""
+        if self.search_query is None:
+            return
+
+        self.workers.cancel_group(self, "search")
+        self.search_query = None
+        self.clear_options()
+        self.add_options(self.options)
+        self.highlighted = 0 if self.options else None
+        self.border_title = self.get_border_title()
+        await self.sync()
 
     async def action_archive_chat(self) -> None:
-        if self.highlighted is None:
+        if self.highlighted is None or self.search_query is not None:
             return
 
         item = cast(ChatListItem, self.get_option_at_index(self.highlighted))
@@ -146,6 +417,9 @@ class ChatList(OptionList):
 
         chat_id = item.chat.id
         await ChatsManager.archive_chat(chat_id)
+        self.total_count -= 1
+        # The chat is moved to the archive database in the background.
+        cast("Luna", self.app).move_archived_chats(delay=1.0)
 
         self.border_title = self.get_border_title()
         self.border_subtitle = self.get_border_subtitle()
@@ -156,14 +430,19 @@ class ChatList(OptionList):
         self.refresh()
 
     def get_border_title(self) -> str:
-        return f"History ({len(self.options)})"
+        if self.search_query is not None:
+            more = "" if self._search_exhausted else "+"
+            return f"Search results ({self.option_count}{more})"
+        return f"History ({self.total_count})"
 
     def get_border_subtitle(self) -> str:
         if self.highlighted is None:
             return ""
-        return f"{self.highlighted + 1} / {self.option_count}"
+        if self.search_query is not None:
+            return f"{self.highlighted + 1} / {self.option_count}"
+        return f"{self.highlighted + 1} / {self.total_count}"
 
-    def create_chat(self, chat_data: ChatData) -> None:
+    def create_chat(self, chat_data: ChatSummary) -> None:
         new_chat_list_item = ChatListItem(chat_data, self.app.launch_config)
         log.debug(f"Creating new chat {new_chat_list_item!r}")
 
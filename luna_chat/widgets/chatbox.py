@@ -1,6 +1,7 @@
 from __future__ import annotations
 import bisect
 from dataclasses import dataclass
+from typing import override
 
 from rich.console import RenderableType
 from rich.markdown import Markdown
@@ -16,6 +17,7 @@ from textual.widgets.text_area import Selection
 from textual.document._syntax_aware_document import SyntaxAwareDocumentError
 
 from luna_chat.config import LunaChatModel
+from luna_chat.incremental_markdown import IncrementalMarkdown
 from luna_chat.models import ChatMessage
 
 
@@ -219,11 +221,35 @@ class Chatbox(Widget, can_focus=True):
             description="Focus prompt",
             key_display="esc",
         ),
+        Binding(key="e", action="edit", description="Edit"),
+        Binding(key="r", action="regenerate", description="Regenerate"),
+        Binding(key="left_square_bracket", action="switch_branch(-1)", description="Previous branch", key_display="["),
+        Binding(key="right_square_bracket", action="switch_branch(1)", description="Next branch", key_display="]"),
     ]
 
     class CursorEscapingBottom(Message):
         """Sent when the cursor moves down from the bottom message."""
 
+    @dataclass
+    class EditRequested(Message):
+        """Sent to edit a message, which starts a new branch from its parent."""
+
+        chatbox: Chatbox
+
+    @dataclass
+    class RegenerateRequested(Message):
+        """Sent to replace a response with a new one, in a new branch."""
+
+        chatbox: Chatbox
+
+    @dataclass
+    class BranchSwitchRequested(Message):
+        """Sent to show the branch through another reply to the parent of the message."""
+
+        chatbox: Chatbox
+        offset: int
+        """The offset of that reply from this message, among the replies ordered by age."""
+
     selection_mode = reactive(False, init=False)
 
     def __init__(
@@ -243,6 +269,8 @@ class Chatbox(Widget, can_focus=True):
         )
         self.message = message
         self.model = model
+        self._rendered_markdown = IncrementalMarkdown()
+        """Renders the content, only re-rendering what changed as chunks are appended to it."""
 
     def on_mount(self) -> None:
         litellm_message = self.message.message
@@ -253,6 +281,25 @@ class Chatbox(Widget, can_focus=True):
         else:
             self.add_class("human-message")
             self.border_title = "You"
+        self.border_subtitle = self.branch_label
+
+    @property
+    def branch_label(self) -> str:
+        """Which of the alternative versions of the message this is, e.g. `2/3`, if there are any."""
+        if self.message.sibling_count <= 1:
+            return ""
+        return f"{self.message.sibling_index + 1}/{self.message.sibling_count}"
+
+    @override
+    def check_action(self, action: str, parameters: tuple[object, ...]) -> bool | None:
+        role = self.message.message["role"]
+        if action == "edit":
+            return role == "user"
+        if action == "regenerate":
+            return role == "assistant"
+        if action == "switch_branch":
+            return self.message.sibling_count > 1
+        return True
 
     def action_up(self) -> None:
         self.screen.focus_previous(Chatbox)
@@ -263,14 +310,23 @@ class Chatbox(Widget, can_focus=True):
         else:
             self.screen.focus_next(Chatbox)
 
+    def action_edit(self) -> None:
+        self.post_message(self.EditRequested(self))
+
+    def action_regenerate(self) -> None:
+        self.post_message(self.RegenerateRequested(self))
+
+    def action_switch_branch(self, offset: int) -> None:
+        self.post_message(self.BranchSwitchRequested(self, offset))
+
     def action_select(self) -> None:
         self.selection_mode = not self.selection_mode
         self.set_class(self.selection_mode, "selecting")
 
     def action_copy_to_clipboard(self) -> None:
         if not self.selection_mode:
-            text_to_copy = self.message.message.get("content")
-            if isinstance(text_to_copy, str):
+            text_to_copy = self.message.content
+            if text_to_copy is not None:
                 try:
                     import pyperclip
 
@@ -293,9 +349,8 @@ class Chatbox(Widget, can_focus=True):
         if value:
             async with self.batch():
                 self.border_subtitle = "SELECT"
-                content = self.message.message.get("content")
                 text_area = SelectionTextArea(
-                    content if isinstance(content, str) else "",
+                    self.message.content or "",
                     read_only=True,
                     language="markdown",
                     classes="selection-mode",
@@ -304,7 +359,7 @@ class Chatbox(Widget, can_focus=True):
                 text_area._rewrap_and_refresh_virtual_size()
                 text_area.focus(scroll_visible=False)
         else:
-            self.border_subtitle = ""
+            self.border_subtitle = self.branch_label
             try:
                 self.query_one(SelectionTextArea)
             except NoMatches:
@@ -334,11 +389,7 @@ class Chatbox(Widget, can_focus=True):
     @property
     def markdown(self) -> Markdown:
         """Return the content as a Rich Markdown object."""
-        content = self.message.message.get("content")
-        if not isinstance(content, str):
-            content = ""
-
-        return Markdown(content)
+        return Markdown(self.message.content or "")
 
     def render(self) -> RenderableType:
         if self.selection_mode:
@@ -360,12 +411,12 @@ class Chatbox(Widget, can_focus=True):
                 )
             else:
                 return ""
-        return self.markdown
+        buffer = self.message.content_buffer
+        self._rendered_markdown.update(buffer if buffer is not None else self.message.content or "")
+        return self._rendered_markdown
 
     def append_chunk(self, chunk: str) -> None:
         """Append a chunk of text to the end of the message."""
-        content = self.message.message.get("content")
-        if isinstance(content, str):
-            content += chunk
-            self.message.message["content"] = content
+        if self.message.content_buffer is not None or self.message.content is not None:
+            self.message.append_content(chunk)
             self.refresh(layout=True)
@@ -0,0 +1,207 @@
+# Copyright 2026 Leo Huber
+"""Write-behind queue for new messages.
+
+Messages are written to the database in the background, so the UI doesn't
+wait for the disk. Writes issued close together, such as a user message and
+the start of the reply, are coalesced into a single transaction, and
+repeated updates of the same message are coalesced into one. Writes which
+fail are put back at the front of the queue and retried, so a database
+which is locked for a moment doesn't lose messages.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from textual import log
+
+from luna_chat.chats_manager import ChatsManager
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from luna_chat.models import ChatMessage
+
+
+@dataclass
+class _PendingMessage:
+    chat_id: int
+    message: ChatMessage
+    future: asyncio.Future[int]
+
+
+class MessageWriteQueue:
+    def __init__(
+        self,
+        delay: float = 0.05,
+        on_error: Callable[[Exception], None] | None = None,
+        max_retries: int = 5,
+        retry_delay: float = 0.5,
+    ) -> None:
+        """
+        Args:
+            delay: How long to wait for more writes before starting a transaction, in seconds.
+            on_error: Called when a batch of messages could not be written.
+            max_retries: How many times a failed write is retried before its messages are given up on.
+            retry_delay: How long to wait before the first retry, in seconds. The wait doubles with each retry.
+        """
+        self.delay = delay
+        self.on_error = on_error
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._pending: list[_PendingMessage] = []
+        self._updates: dict[int, ChatMessage] = {}
+        """The messages to save the content of, by object ID."""
+        self._failures = 0
+        """How many times in a row writing the pending messages failed."""
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        """Set while no messages are waiting to be written."""
+        self._idle.set()
+        self._closing = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+        self._closed = False
+
+    @property
+    def pending_count(self) -> int:
+        """The number of messages which haven't been written yet."""
+        return len(self._pending) + len(self._updates)
+
+    def enqueue(self, chat_id: int, message: ChatMessage) -> asyncio.Future[int]:
+        """Append a message to a chat in the background.
+
+        The ID of the new message is set on it once it has been written.
+
+        Returns:
+            A future which resolves to the ID of the new message.
+        """
+        self._check_open()
+        future: asyncio.Future[int] = asyncio.get_running_loop().create_future()
+        self._pending.append(_PendingMessage(chat_id, message, future))
+        self._schedule()
+        return future
+
+    def enqueue_update(self, message: ChatMessage) -> None:
+        """Save the content of a message which was added before, in the background.
+
+        The content is read when the update is written, so several updates
+        of the same message before then only cost a single write.
+        """
+        self._check_open()
+        self._updates[id(message)] = message
+        self._schedule()
+
+    async def wait_until_idle(self) -> None:
+        """Wait until no messages are waiting to be written."""
+        await self._idle.wait()
+
+    def _check_open(self) -> None:
+        if self._closed:
+            message = "The message write queue has been closed."
+            raise RuntimeError(message)
+
+    def _schedule(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="message-write-queue")
+        self._idle.clear()
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._closed:
+            await self._wakeup.wait()
+            # Give writes issued right after this one the chance to join the transaction.
+            await self._wait(self.delay)
+            self._wakeup.clear()
+            await self.flush()
+            if self._failures:
+                await self._wait(self.retry_delay * 2 ** (self._failures - 1))
+                self._wakeup.set()
+
+    async def _wait(self, delay: float) -> None:
+        """Wait for `delay` seconds, or until the queue is closed."""
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(self._closing.wait(), delay)
+
+    async def flush(self) -> None:
+        """Write all pending messages now.
+
+        If the write fails, the messages are put back at the front of the
+        queue and retried in the background. They are only given up on, and
+        their futures fail, once `max_retries` retries failed too.
+        """
+        async with self._write_lock:
+            try:
+                await self._write()
+            finally:
+                if not self._pending and not self._updates:
+                    self._idle.set()
+
+    async def _write(self) -> None:
+        batch = self._without_orphans(self._pending)
+        self._pending = []
+        updates, self._updates = self._updates, {}
+        if not batch and not updates:
+            return
+
+        try:
+            message_ids = await ChatsManager.add_messages(
+                [(pending.chat_id, pending.message) for pending in batch],
+                updated=list(updates.values()),
+            )
+        except Exception as exception:  # noqa: BLE001 - whatever the error, it's handed to the callers waiting for the messages
+            self._failures += 1
+            if self._failures <= self.max_retries and not self._closed:
+                log.warning(f"Failed to write {len(batch) + len(updates)} message(s), retrying: {exception!r}")
+                self._pending[:0] = batch
+                # Updates queued since are of the same message objects, either one saves the latest content.
+                self._updates = updates | self._updates
+                return
+            log.error(f"Failed to write {len(batch) + len(updates)} message(s): {exception!r}")
+            self._failures = 0
+            self._fail(batch, exception)
+            if self.on_error is not None:
+                self.on_error(exception)
+        else:
+            self._failures = 0
+            for pending, message_id in zip(batch, message_ids, strict=True):
+                pending.future.set_result(message_id)
+
+    def _without_orphans(self, batch: list[_PendingMessage]) -> list[_PendingMessage]:
+        """Fail the messages which reply to a message that was given up on, and return the others.
+
+        They would otherwise be written without their parent, as if they started the chat.
+        """
+        in_batch = {id(pending.message) for pending in batch}
+        writable: list[_PendingMessage] = []
+        for pending in batch:
+            parent = pending.message.parent
+            if parent is not None and parent.id is None and id(parent) not in in_batch:
+                in_batch.discard(id(pending.message))
+                self._fail([pending], RuntimeError("The message this one replies to couldn't be saved."))
+            else:
+                writable.append(pending)
+        return writable
+
+    @staticmethod
+    def _fail(batch: list[_PendingMessage], exception: Exception) -> None:
+        for pending in batch:
+            pending.future.set_exception(exception)
+            # The error is reported through `on_error`, awaiting the future is optional.
+            pending.future.exception()
+
+    async def close(self) -> None:
+        """Write the pending messages and stop accepting new ones.
+
+        Messages which still can't be written are given up on, rather than retried.
+        """
+        self._closed = True
+        self._closing.set()
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
@@ -0,0 +1,63 @@
+# Copyright 2026 Leo Huber
+from datetime import UTC, datetime
+
+from luna_chat.chat_cache import ChatCache
+from luna_chat.config import ChatCacheConfig, LunaChatModel
+from luna_chat.models import ChatData, ChatMessage
+
+MODEL = LunaChatModel(name="gpt-4o")
+
+
+def make_message(content: str, message_id: int | None = None, parent_id: int | None = None) -> ChatMessage:
+    return ChatMessage(
+        {"role": "user", "content": content},
+        datetime.now(UTC),
+        MODEL,
+        id=message_id,
+        parent_id=parent_id,
+    )
+
+
+def make_chat(chat_id: int, content: str, version: int = 1) -> ChatData:
+    return ChatData(chat_id, MODEL, "Title", None, [make_message("Be brief."), make_message(content, chat_id * 10)], version=version)
+
+
+def test_cached_chats_are_copies_kept_up_to_date() -> None:
+    cache = ChatCache()
+    cache.put(make_chat(1, "Hello"))
+
+    chat = cache.get(1)
+    assert chat is not None
+    chat.messages.append(make_message("Not written"))
+    cache.add_messages(1, [make_message("Written", 11, parent_id=10)], version=2)
+    cache.rename(1, "Renamed", version=3)
+
+    chat = cache.get(1, version=3)
+    assert chat is not None
+    assert chat.title == "Renamed"
+    assert [message.message["content"] for message in chat.messages[1:]] == ["Hello", "Written"]
+    assert cache.get(1, including_message_id=10) is not None
+    assert cache.get(1, including_message_id=99) is None
+
+    # Changed elsewhere.
+    assert cache.get(1, version=4) is None
+    assert cache.get(1) is None
+
+    # An edit of the first message starts another branch.
+    cache.put(make_chat(1, "Hello"))
+    cache.add_messages(1, [make_message("Edited", 12, parent_id=None)], version=5)
+    assert cache.get(1) is None
+
+
+def test_least_recently_used_chats_are_evicted() -> None:
+    cache = ChatCache(ChatCacheConfig(max_chats=2, max_size=100))
+    cache.put(make_chat(1, "a"))
+    cache.put(make_chat(2, "b"))
+    assert cache.get(1) is not None
+    cache.put(make_chat(3, "c"))
+    assert (cache.get(1) is not None, cache.get(2), cache.get(3) is not None) == (True, None, True)
+
+    # Over the size budget, only the latest chat is kept.
+    cache.put(make_chat(4, "x" * 100))
+    assert len(cache) == 1
+    assert cache.get(4) is not None
@@ -0,0 +1,92 @@
+# Copyright 2026 Leo Huber
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from luna_chat.app import Luna
+from luna_chat.chats_manager import ChatsManager
+from luna_chat.config import ConnectionsConfig, LaunchConfig
+from luna_chat.database import database
+from luna_chat.models import ChatMessage
+from luna_chat.widgets.chat_list import ChatList
+from tests.test_utils.database_util import make_chat, run_with_database
+
+CONFIG = LaunchConfig(connections=ConnectionsConfig(warm_up=False))
+START = datetime(2024, 1, 1, 10, tzinfo=UTC)
+
+
+@pytest.fixture(autouse=True)
+def local_model_cost_map(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Importing litellm would otherwise download its model cost map.
+    monkeypatch.setenv("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+
+async def create_chats(*timestamps: datetime) -> list[int]:
+    """Create a chat with a message sent at each of the timestamps."""
+    chats = [make_chat(f"Chat {number}") for number in range(1, len(timestamps) + 1)]
+    for chat, timestamp in zip(chats, timestamps, strict=True):
+        chat.messages[0].timestamp = timestamp
+    return await ChatsManager.create_chats(chats)
+
+
+def listed_ids(chat_list: ChatList) -> list[int]:
+    """The IDs of the chats the list shows, checking they are the chats it keeps track of."""
+    shown = [chat_list.get_option_at_index(index) for index in range(chat_list.option_count)]
+    assert shown == chat_list.options
+    return [item.chat.id for item in chat_list.options]
+
+
+def test_pages_are_loaded_as_the_cursor_nears_the_bottom(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(ChatList, "PAGE_SIZE", 3)
+    monkeypatch.setattr(ChatList, "PREFETCH_DISTANCE", 1)
+
+    async def run() -> None:
+        await database.create_database()
+        # The first two pages end within chats of the same time, the last page is short.
+        await create_chats(*[START] * 6, START - timedelta(hours=1))
+        app = Luna(CONFIG)
+        async with app.run_test() as pilot:
+            chat_list = app.screen.query_one(ChatList)
+            await pilot.pause()
+            assert listed_ids(chat_list) == [6, 5, 4]
+            chat_list.focus()
+            for _ in range(3):
+                await pilot.press("end")
+                await app.workers.wait_for_complete()
+                await pilot.pause()
+            assert listed_ids(chat_list) == [6, 5, 4, 3, 2, 1, 7]
+            app.exit()
+
+    run_with_database(run)
+
+
+def test_changes_are_applied_to_the_affected_chats_only() -> None:
+    async def run() -> None:
+        await database.create_database()
+        await create_chats(*(START + timedelta(minutes=minute) for minute in range(4)))
+        app = Luna(CONFIG)
+        async with app.run_test() as pilot:
+            chat_list = app.screen.query_one(ChatList)
+            await pilot.pause()
+            chat_list.highlighted = 2
+            before = {item.chat.id: item for item in chat_list.options}
+
+            # One chat is renamed, one gets a new message, and one is archived.
+            await ChatsManager.rename_chat(3, "Renamed")
+            chat = await ChatsManager.get_chat(1)
+            reply = ChatMessage({"role": "assistant", "content": "Hi!"}, START + timedelta(hours=1), chat.model, parent=chat.messages[-1])
+            await ChatsManager.add_messages([(1, reply)])
+            await ChatsManager.archive_chat(4)
+            await chat_list.sync()
+
+            assert listed_ids(chat_list) == [1, 3, 2]
+            assert chat_list.total_count == 3
+            # The highlight stays on the same chat, and the chats which didn't change keep their options.
+            assert chat_list.highlighted == 2
+            assert chat_list.options[2] is before[2]
+            assert chat_list.options[1] is before[3]
+            assert chat_list.options[1].chat.title == "Renamed"
+            assert chat_list.options[0].chat.message_count == 2
+            app.exit()
+
+    run_with_database(run)
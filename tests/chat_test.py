@@ -0,0 +1,256 @@
+# Copyright 2026 Leo Huber
+import asyncio
+from collections.abc import AsyncIterator, Callable
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from typing import Any, NoReturn
+
+import pytest
+
+from luna_chat.app import Luna
+from luna_chat.chats_manager import ChatsManager
+from luna_chat.config import ConnectionsConfig, LaunchConfig, LunaChatModel
+from luna_chat.database import database
+from luna_chat.models import ChatData, ChatMessage
+from luna_chat.screens.chat_screen import ChatScreen
+from luna_chat.widgets.chat import CONTINUE_PROMPT, Chat, ChatPromptInput, FanOutReplies
+from luna_chat.widgets.chatbox import Chatbox
+from tests.test_utils.database_util import run_with_database
+
+CONFIG = LaunchConfig(connections=ConnectionsConfig(warm_up=False))
+
+
+@pytest.fixture(autouse=True)
+def local_model_cost_map(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Importing litellm would otherwise download its model cost map.
+    monkeypatch.setenv("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+
+def make_interrupted_chat() -> ChatData:
+    model = CONFIG.default_model_object
+    now = datetime.now(UTC)
+    interrupted = ChatMessage({"role": "assistant", "content": "Once upon a"}, now, model)
+    interrupted.in_progress = True
+    return ChatData(
+        id=None,
+        title=None,
+        create_timestamp=None,
+        model=model,
+        messages=[
+            ChatMessage({"role": "system", "content": "Be brief."}, now, model),
+            ChatMessage({"role": "user", "content": "Tell me a story"}, now, model),
+            interrupted,
+        ],
+    )
+
+
+def continue_response(chat_data: ChatData, stop: bool, check: Callable[[Luna, Chat], None]) -> None:
+    """Press ctrl+g in the chat with a draft in the prompt, and ctrl+s too if `stop`, then check the app."""
+
+    async def run() -> None:
+        await database.create_database()
+        await ChatsManager.create_chats([chat_data])
+        app = Luna(CONFIG)
+        async with app.run_test() as pilot:
+            await app.push_screen(ChatScreen(chat_data))
+            await pilot.pause()
+            chat = app.screen.query_one(Chat)
+            chat.query_one(ChatPromptInput).text = "Draft"
+            await pilot.press("ctrl+g")
+            await pilot.pause(0.2)
+            if stop:
+                await pilot.press("ctrl+s")
+                await pilot.pause(0.2)
+            check(app, chat)
+            app.exit()
+
+    run_with_database(run)
+
+
+def test_a_continued_response_which_fails_keeps_the_prompt(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def request_response(self: Chat, *args: object) -> NoReturn:
+        message = "no connection"
+        raise ConnectionError(message)
+
+    monkeypatch.setattr(Chat, "request_response", request_response)
+    chat_data = make_interrupted_chat()
+
+    def check(app: Luna, chat: Chat) -> None:
+        prompt = chat.query_one(ChatPromptInput)
+        assert (prompt.text, prompt.submit_ready) == ("Draft", True)
+        assert chat.interrupted_response is chat_data.messages[-1]
+        # Failing isn't stopping.
+        assert not app.stop_latencies
+
+    continue_response(chat_data, stop=False, check=check)
+
+
+def test_a_continued_response_which_is_stopped_before_it_starts_keeps_the_prompt(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def request_response(self: Chat, *args: object) -> None:
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(Chat, "request_response", request_response)
+    chat_data = make_interrupted_chat()
+
+    def check(app: Luna, chat: Chat) -> None:
+        prompt = chat.query_one(ChatPromptInput)
+        assert (prompt.text, prompt.submit_ready) == ("Draft", True)
+        assert chat.interrupted_response is chat_data.messages[-1]
+        assert len(app.stop_latencies) == 1
+
+    continue_response(chat_data, stop=True, check=check)
+
+
+async def reply(text: str) -> AsyncIterator[SimpleNamespace]:
+    yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+async def stalled_reply(text: str) -> AsyncIterator[SimpleNamespace]:
+    """A response which stops sending chunks after the first, until it's closed."""
+    yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+    await asyncio.Event().wait()
+
+
+def test_a_stopped_response_is_saved_and_can_be_continued(monkeypatch: pytest.MonkeyPatch) -> None:
+    requests: list[list[dict[str, Any]]] = []
+
+    async def request_response(self: Chat, model: LunaChatModel, raw_messages: list[Any]) -> AsyncIterator[SimpleNamespace]:
+        # The content of the response grows after the request, so it's copied.
+        requests.append([dict(message) for message in raw_messages])
+        return stalled_reply("Once upon a") if len(requests) == 1 else reply(" time.")
+
+    monkeypatch.setattr(Chat, "request_response", request_response)
+    chat_data = make_interrupted_chat()
+    chat_data.messages[-1].in_progress = False
+
+    async def run() -> None:
+        await database.create_database()
+        [chat_id] = await ChatsManager.create_chats([chat_data])
+        app = Luna(CONFIG)
+        async with app.run_test() as pilot:
+            await app.push_screen(ChatScreen(chat_data))
+            await pilot.pause()
+            chat = app.screen.query_one(Chat)
+            await chat.new_user_message("Another one")
+            await pilot.pause(0.2)
+            assert chat.is_responding
+            await pilot.press("ctrl+s")
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+
+            # What was received is saved, marked as in progress, and the prompt is ready straight away.
+            assert chat.query_one(ChatPromptInput).submit_ready
+            assert len(app.stop_latencies) == 1
+            await app.message_write_queue.flush()
+            saved = await ChatsManager.get_chat(chat_id)
+            assert (saved.messages[-1].content, saved.messages[-1].in_progress) == ("Once upon a", True)
+
+            # ctrl+g continues the response from where it stopped.
+            await pilot.press("ctrl+g")
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            assert requests[1][-2:] == [{"role": "assistant", "content": "Once upon a"}, {"role": "user", "content": CONTINUE_PROMPT}]
+            await app.message_write_queue.flush()
+            saved = await ChatsManager.get_chat(chat_id)
+            assert (saved.messages[-1].content, saved.messages[-1].in_progress) == ("Once upon a time.", False)
+            assert [message.content for message in saved.messages[-2:]] == ["Another one", "Once upon a time."]
+            app.exit()
+
+    run_with_database(run)
+
+
+def test_models_which_fail_leave_no_reply_when_sent_a_message_together(monkeypatch: pytest.MonkeyPatch) -> None:
+    # The chat is with the model which fails.
+    failing = CONFIG.default_model_object
+    responding = next(model for model in CONFIG.all_models if model.lookup_key != failing.lookup_key)
+    requested: list[LunaChatModel] = []
+
+    async def request_response(self: Chat, model: LunaChatModel, *args: object) -> AsyncIterator[SimpleNamespace]:
+        requested.append(model)
+        if model.lookup_key == failing.lookup_key:
+            message = "no connection"
+            raise ConnectionError(message)
+        return reply(f"Hello from {model.lookup_key}")
+
+    monkeypatch.setattr(Chat, "request_response", request_response)
+    chat_data = make_interrupted_chat()
+    chat_data.messages.pop()
+
+    async def run() -> None:
+        await database.create_database()
+        await ChatsManager.create_chats([chat_data])
+        app = Luna(CONFIG)
+        async with app.run_test() as pilot:
+            await app.push_screen(ChatScreen(chat_data))
+            await pilot.pause()
+            chat = app.screen.query_one(Chat)
+            await chat.new_user_message("Compare", models=[failing, responding])
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+
+            replies = chat.query_one(FanOutReplies).query(Chatbox)
+            assert [chatbox.model.lookup_key for chatbox in replies] == [responding.lookup_key]
+            await app.message_write_queue.flush()
+            assert chat_data.id is not None
+            saved = await ChatsManager.get_chat(chat_data.id)
+            assert saved is not None
+            reply_message = saved.messages[-1]
+            assert (reply_message.message["role"], reply_message.content) == ("assistant", f"Hello from {responding.lookup_key}")
+            assert (reply_message.model.lookup_key, reply_message.sibling_count) == (responding.lookup_key, 1)
+
+            # The reply is regenerated by the model which sent it, rather than the model of the chat.
+            requested.clear()
+            replies.first().post_message(Chatbox.RegenerateRequested(replies.first()))
+            await pilot.pause()
+            await app.workers.wait_for_complete()
+            assert [model.lookup_key for model in requested] == [responding.lookup_key]
+            app.exit()
+
+    run_with_database(run)
+
+
+def test_stopping_the_replies_of_several_models_keeps_them_all(monkeypatch: pytest.MonkeyPatch) -> None:
+    first = CONFIG.default_model_object
+    second = next(model for model in CONFIG.all_models if model.lookup_key != first.lookup_key)
+
+    async def request_response(self: Chat, model: LunaChatModel, *args: object) -> AsyncIterator[SimpleNamespace]:
+        return stalled_reply(f"Hello from {model.lookup_key}")
+
+    monkeypatch.setattr(Chat, "request_response", request_response)
+    chat_data = make_interrupted_chat()
+    chat_data.messages[-1].in_progress = False
+
+    async def run() -> None:
+        await database.create_database()
+        [chat_id] = await ChatsManager.create_chats([chat_data])
+        app = Luna(CONFIG)
+        async with app.run_test() as pilot:
+            await app.push_screen(ChatScreen(chat_data))
+            await pilot.pause()
+            chat = app.screen.query_one(Chat)
+            await chat.new_user_message("Compare", models=[first, second])
+            await pilot.pause(0.2)
+            # Both models are responding at once.
+            replies = chat.query_one(FanOutReplies).query(Chatbox)
+            assert [chatbox.message.content for chatbox in replies] == [f"Hello from {first.lookup_key}", f"Hello from {second.lookup_key}"]
+            await pilot.press("ctrl+s")
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+
+            assert all(chatbox.has_class("response-interrupted") for chatbox in replies)
+            assert chat.query_one(ChatPromptInput).submit_ready
+            assert len(app.stop_latencies) == 1
+            # The chat continues from the first reply, which can be continued.
+            assert chat.interrupted_response is replies.first().message
+
+            await app.message_write_queue.flush()
+            saved = await ChatsManager.get_chat(chat_id)
+            reply_message = saved.messages[-1]
+            assert (reply_message.content, reply_message.in_progress) == (f"Hello from {first.lookup_key}", True)
+            assert (reply_message.sibling_index, reply_message.sibling_count) == (0, 2)
+            [_, second_id] = await ChatsManager.sibling_ids(reply_message.id or 0)
+            saved = await ChatsManager.get_chat(chat_id, including_message_id=second_id)
+            assert (saved.messages[-1].content, saved.messages[-1].in_progress) == (f"Hello from {second.lookup_key}", True)
+            app.exit()
+
+    run_with_database(run)
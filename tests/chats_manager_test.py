@@ -0,0 +1,88 @@
+# Copyright 2026 Leo Huber
+from datetime import UTC, datetime, timedelta
+
+from luna_chat.chats_manager import ChatsManager
+from luna_chat.database import database
+from luna_chat.models import ChatData, ChatMessage
+from tests.test_utils.database_util import make_chat, run_with_database
+
+
+def test_create_chats() -> None:
+    async def create() -> None:
+        await database.create_database()
+        first = make_chat("Hello", "Hi!")
+        second = make_chat(*(f"Message {index}" for index in range(600)))
+        assert await ChatsManager.create_chats([first, second]) == [1, 2]
+        assert (first.id, second.id) == (1, 2)
+        assert [message.id for message in first.messages] == [1, 2]
+        assert [message.id for message in second.messages] == list(range(3, 603))
+
+        chat = await ChatsManager.get_chat(2)
+        assert [message.message["content"] for message in chat.messages] == [f"Message {index}" for index in range(600)]
+        [summary, _] = await ChatsManager.list_chat_summaries()
+        assert (summary.id, summary.message_count, summary.preview) == (2, 600, "Message 0")
+
+    run_with_database(create)
+
+
+def test_list_chat_summaries() -> None:
+    start = datetime(2024, 1, 1, 10, tzinfo=UTC)
+
+    async def list_summaries() -> None:
+        await database.create_database()
+        greeting = make_chat("Hello", "Hi!", "How are you?")
+        greeting.title = "Greeting"
+        for minute, message in enumerate(greeting.messages):
+            message.timestamp = start + timedelta(minutes=minute)
+        empty = make_chat()
+        greeting_id, empty_id = await ChatsManager.create_chats([greeting, empty])
+
+        # A chat without messages isn't listed.
+        [summary] = await ChatsManager.list_chat_summaries()
+        assert (summary.id, summary.title, summary.preview, summary.message_count) == (greeting_id, "Greeting", "Hello", 3)
+        # SQLite keeps the timestamps without their time zone.
+        assert summary.last_message_at == start.replace(minute=2, tzinfo=None)
+
+        # Until it gets its first message, then it comes first.
+        later = ChatMessage({"role": "user", "content": "Later"}, start + timedelta(hours=1), empty.model)
+        await ChatsManager.add_messages([(empty_id, later)])
+        first, second = await ChatsManager.list_chat_summaries()
+        assert (first.id, first.title, first.preview, first.message_count) == (empty_id, "", "Later", 1)
+        assert first.last_message_at == start.replace(hour=11, tzinfo=None)
+        assert second == summary
+
+    run_with_database(list_summaries)
+
+
+def test_branches() -> None:
+    def contents(chat: ChatData) -> list[str]:
+        return [str(message.message["content"]) for message in chat.messages]
+
+    async def branch() -> None:
+        await database.create_database()
+        chat = make_chat("Hello", "Hi!", "How are you?")
+        [chat_id] = await ChatsManager.create_chats([chat])
+        hello, hi, question = chat.messages
+        assert (hi.parent_id, question.parent_id) == (hello.id, hi.id)
+
+        # A regenerated reply, and a reply to it which is written in the same transaction.
+        now = datetime.now(UTC)
+        regenerated = ChatMessage({"role": "assistant", "content": "Hey!"}, now, chat.model, parent=hello)
+        follow_up = ChatMessage({"role": "user", "content": "Bye"}, now, chat.model, parent=regenerated)
+        await ChatsManager.add_messages([(chat_id, regenerated), (chat_id, follow_up)])
+        assert follow_up.parent_id == regenerated.id
+
+        chat = await ChatsManager.get_chat(chat_id)
+        assert contents(chat) == ["Hello", "Hey!", "Bye"]
+        assert (chat.messages[1].sibling_index, chat.messages[1].sibling_count) == (1, 2)
+        assert await ChatsManager.sibling_ids(regenerated.id or 0) == [hi.id, regenerated.id]
+
+        branch = await ChatsManager.switch_branch(chat_id, hi.id or 0)
+        assert [message.message["content"] for message in branch] == ["Hi!", "How are you?"]
+        assert contents(await ChatsManager.get_chat(chat_id, message_limit=1)) == ["Hello", "How are you?"]
+
+        # Opening the chat at a message of another branch shows that branch.
+        chat = await ChatsManager.get_chat(chat_id, message_limit=1, including_message_id=regenerated.id)
+        assert contents(chat) == ["Hello", "Hey!", "Bye"]
+
+    run_with_database(branch)
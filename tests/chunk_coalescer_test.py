@@ -0,0 +1,38 @@
+# Copyright 2026 Leo Huber
+import asyncio
+
+from luna_chat.chunk_coalescer import ChunkCoalescer
+
+
+def test_chunks_are_shown_at_most_once_a_frame() -> None:
+    flushes: list[tuple[str, int]] = []
+
+    async def stream() -> None:
+        coalescer = ChunkCoalescer(lambda text, count: flushes.append((text, count)), frame_rate=20)
+        coalescer.add("a")
+        for _ in range(100):
+            coalescer.add("b")
+        # The first chunk is shown right away, the rest at the end of the frame.
+        assert flushes == [("a", 1)]
+        await asyncio.sleep(0.1)
+        assert flushes == [("a", 1), ("b" * 100, 100)]
+
+        coalescer.add("c")
+        coalescer.close()
+        assert flushes[-1] == ("c", 1)
+        coalescer.close()
+        assert len(flushes) == 3
+
+    asyncio.run(stream())
+
+
+def test_every_chunk_is_shown_without_a_frame_rate() -> None:
+    flushes: list[tuple[str, int]] = []
+
+    async def stream() -> None:
+        coalescer = ChunkCoalescer(lambda text, count: flushes.append((text, count)), frame_rate=0)
+        for chunk in "abc":
+            coalescer.add(chunk)
+
+    asyncio.run(stream())
+    assert flushes == [("a", 1), ("b", 1), ("c", 1)]
@@ -0,0 +1,26 @@
+# Copyright 2026 Leo Huber
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from luna_chat.config import LaunchConfig
+from luna_chat.database import database
+from luna_chat.models import configure_models
+
+
+@pytest.fixture(autouse=True)
+def temporary_database(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Path:
+    """Give each test a database file of its own, rather than the user's database."""
+    path = tmp_path / "luna.sqlite"
+    monkeypatch.setattr(database, "sqlite_file_name", path)
+    monkeypatch.setattr(database, "sqlite_url", f"sqlite+aiosqlite:///{path}")
+    return path
+
+
+@pytest.fixture(autouse=True)
+def configured_models() -> Iterator[None]:
+    """Look models up in the built-in models, as if the app had started with an empty config."""
+    configure_models(LaunchConfig())
+    yield
+    configure_models(None)
@@ -0,0 +1,70 @@
+# Copyright 2026 Leo Huber
+import asyncio
+
+from luna_chat.database import database
+from luna_chat.database.archive import archive_file_name, archived_chat_summaries, move_archived_chats, unarchive_chat
+from luna_chat.database.search import index_messages
+from tests.test_utils.database_util import run_with_database
+
+
+async def insert_chat(title: str, started_at: str, archived: bool = False) -> None:
+    async with database.get_engine().begin() as connection:
+        result = await connection.exec_driver_sql(
+            "INSERT INTO chat (model, title, started_at, archived) VALUES ('luna-gpt-4o', ?, ?, ?)",
+            (title, started_at, archived),
+        )
+        chat_id = result.lastrowid
+        await connection.exec_driver_sql(
+            "INSERT INTO message (chat_id, role, content, timestamp, meta) VALUES (?, 'user', ?, ?, '{}'), (?, 'assistant', 'Hi!', ?, '{}')",
+            (chat_id, f"Hello from {title}", started_at, chat_id, started_at),
+        )
+        message_ids = await connection.exec_driver_sql("SELECT id FROM message WHERE chat_id = ?", (chat_id,))
+        await index_messages(connection, list(message_ids.scalars()))
+
+
+async def query(statement: str) -> list[tuple]:
+    async with database.get_engine().connect() as connection:
+        return [tuple(row) for row in await connection.exec_driver_sql(statement)]
+
+
+def test_archive_and_unarchive() -> None:
+    async def archive_and_unarchive() -> None:
+        await database.create_database()
+        await insert_chat("First", "2024-01-01 10:00:00.000000")
+        await insert_chat("Old", "2024-01-02 10:00:00.000000", archived=True)
+
+        # Nothing is attached or created until there are chats to move.
+        assert await move_archived_chats(10) == 1
+        assert archive_file_name().exists()
+        assert await move_archived_chats(10) == 0
+        assert await query("SELECT id FROM chat") == [(1,)]
+        assert await query("SELECT count(*) FROM message_fts") == [(2,)]
+        # Browsing the archive doesn't wait for the writer connection.
+        async with database.write_connection():
+            [summary] = await asyncio.wait_for(archived_chat_summaries(preview_length=20), 5)
+        assert (summary.id, summary.title, summary.preview, summary.message_count) == (2, "Old", "Hello from Old", 2)
+
+        # The IDs of the archived chat and its messages are reused by a new chat.
+        await insert_chat("New", "2024-01-03 10:00:00.000000")
+        assert await query("SELECT id, title FROM chat ORDER BY id") == [(1, "First"), (2, "New")]
+
+        # Archived chats which weren't moved yet are listed too.
+        await insert_chat("Older", "2024-01-01 09:00:00.000000", archived=True)
+        newest, oldest = await archived_chat_summaries(preview_length=20)
+        assert (newest.title, oldest.title) == ("Old", "Older")
+        after = (newest.last_message_at, newest.id)
+        assert await archived_chat_summaries(preview_length=20, after=after) == [oldest]
+        assert await unarchive_chat(oldest.id) == oldest.id
+
+        assert await unarchive_chat(2) == 4
+        assert await query("SELECT id, title, archived, message_count FROM chat ORDER BY id") == [
+            (1, "First", 0, 2),
+            (2, "New", 0, 2),
+            (3, "Older", 0, 2),
+            (4, "Old", 0, 2),
+        ]
+        assert await query("SELECT id FROM message WHERE chat_id = 4") == [(7,), (8,)]
+        assert await query("SELECT count(*) FROM message_fts") == [(8,)]
+        assert await archived_chat_summaries(preview_length=20) == []
+
+    run_with_database(archive_and_unarchive)
@@ -0,0 +1,26 @@
+# Copyright 2026 Leo Huber
+import zlib
+
+from luna_chat.config import DatabaseConfig
+from luna_chat.database.compression import ContentEncoding, decode_content, encode_content
+
+
+def test_encode_content_above_threshold() -> None:
+    config = DatabaseConfig(compression="zlib", compression_threshold=100)
+    long_content = "Luna says hello. " * 100
+
+    content, encoding = encode_content(long_content, config)
+    assert encoding == ContentEncoding.ZLIB
+    assert isinstance(content, bytes)
+    assert len(content) < len(long_content)
+    assert decode_content(content, encoding) == long_content
+
+    assert encode_content("Hello", config) == ("Hello", ContentEncoding.PLAIN)
+    assert encode_content(long_content, DatabaseConfig(compression="none")) == (long_content, ContentEncoding.PLAIN)
+
+
+def test_encode_content_skips_incompressible_content() -> None:
+    config = DatabaseConfig(compression="zlib", compression_threshold=100)
+    # Already compressed data doesn't get any smaller.
+    incompressible = zlib.compress(bytes(range(256)) * 4)[:200].decode("latin-1")
+    assert encode_content(incompressible, config) == (incompressible, ContentEncoding.PLAIN)
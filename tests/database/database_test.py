@@ -0,0 +1,64 @@
+# Copyright 2026 Leo Huber
+import asyncio
+from typing import Any
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from luna_chat.database import database
+from tests.test_utils.database_util import run_with_database
+
+INSERT_CHAT = "INSERT INTO chat (model, title, started_at, archived) VALUES ('luna-gpt-4o', 'Chat', '2024-01-01 10:00:00.000000', 0)"
+
+
+def test_reads_and_writes() -> None:
+    async def count_chats() -> int:
+        async with database.read_connection() as connection:
+            return (await connection.exec_driver_sql("SELECT count(*) FROM chat")).scalar_one()
+
+    async def access() -> None:
+        await database.create_database()
+
+        # A read doesn't wait for the transaction of the writer, and doesn't see it before it is committed.
+        async with database.write_connection() as connection:
+            await connection.exec_driver_sql(INSERT_CHAT)
+            assert await asyncio.wait_for(count_chats(), timeout=1) == 0
+            await connection.commit()
+        assert await count_chats() == 1
+
+        # Writers take turns in the order they asked for the writer connection.
+        order: list[int] = []
+
+        async def write(index: int) -> None:
+            async with database.write_session() as session:
+                order.append(index)
+                await asyncio.sleep(0.01 if index == 0 else 0)
+                await session.connection()
+                order.append(index)
+
+        await asyncio.gather(*(write(index) for index in range(4)))
+        assert order == [0, 0, 1, 1, 2, 2, 3, 3]
+
+        with pytest.raises(OperationalError, match="readonly"):
+            async with database.read_connection() as connection:
+                await connection.exec_driver_sql(INSERT_CHAT)
+
+    run_with_database(access)
+
+
+def test_pragmas() -> None:
+    names = ["journal_mode", "synchronous", "foreign_keys", "busy_timeout", "query_only"]
+
+    async def pragmas(connection: AsyncConnection) -> list[Any]:
+        return [(await connection.exec_driver_sql(f"PRAGMA {name}")).scalar_one() for name in names]
+
+    async def check() -> None:
+        await database.create_database()
+        # synchronous=NORMAL is 1, and only the read-only connections are query_only.
+        async with database.write_connection() as connection:
+            assert await pragmas(connection) == ["wal", 1, 1, 5_000, 0]
+        async with database.read_connection() as connection:
+            assert await pragmas(connection) == ["wal", 1, 1, 5_000, 1]
+
+    run_with_database(check)
@@ -0,0 +1,71 @@
+# Copyright 2026 Leo Huber
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+
+from luna_chat.database import database
+from luna_chat.database.export import export_chats, export_progress_path, import_chats
+from tests.test_utils.database_util import run_with_database
+
+
+def use_database(monkeypatch: pytest.MonkeyPatch, path: Path) -> None:
+    monkeypatch.setattr(database, "sqlite_url", f"sqlite+aiosqlite:///{path}")
+
+
+async def seed_chats(count: int) -> None:
+    await database.create_database()
+    async with database.get_engine().begin() as connection:
+        for chat_id in range(1, count + 1):
+            await connection.exec_driver_sql(
+                "INSERT INTO chat (id, model, title, started_at, archived) VALUES (?, 'luna-gpt-4o', ?, '2024-01-01 10:00:00', 0)",
+                (chat_id, f"Chat {chat_id}"),
+            )
+            await connection.exec_driver_sql(
+                "INSERT INTO message (chat_id, role, content, timestamp, meta) VALUES "
+                "(?, 'user', ?, '2024-01-01 10:00:00', '{}'), (?, 'assistant', 'Hi!', '2024-01-01 10:00:01', '{}')",
+                (chat_id, f"Hello {chat_id}", chat_id),
+            )
+
+
+def test_export_and_import_resume(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    export_path = tmp_path / "export.jsonl.gz"
+
+    class InterruptionError(Exception):
+        pass
+
+    def interrupt(done: int, total: int) -> None:
+        raise InterruptionError
+
+    async def export() -> None:
+        await seed_chats(5)
+        with pytest.raises(InterruptionError):
+            await export_chats(export_path, batch_size=2, on_progress=interrupt)
+        assert export_progress_path(export_path).exists()
+        counts = await export_chats(export_path, batch_size=2)
+        assert (counts.chats, counts.messages) == (5, 10)
+
+    use_database(monkeypatch, tmp_path / "source.sqlite")
+    run_with_database(export)
+    assert not export_progress_path(export_path).exists()
+    with gzip.open(export_path, "rt") as file:
+        records = [json.loads(line) for line in file]
+    assert [record["type"] for record in records[:4]] == ["header", "chat", "message", "message"]
+    assert [record["title"] for record in records if record["type"] == "chat"] == [f"Chat {n}" for n in range(1, 6)]
+
+    async def import_() -> list[tuple[str, int]]:
+        await seed_chats(1)
+        with pytest.raises(InterruptionError):
+            await import_chats(export_path, batch_size=2, on_progress=interrupt)
+        counts = await import_chats(export_path, batch_size=2)
+        assert (counts.chats, counts.messages) == (3, 6)
+        # Importing the same export again doesn't duplicate any chats.
+        counts = await import_chats(export_path, batch_size=2)
+        assert (counts.chats, counts.messages) == (0, 0)
+        async with database.get_engine().connect() as connection:
+            result = await connection.exec_driver_sql("SELECT title, message_count FROM chat ORDER BY id")
+            return [tuple(row) for row in result]
+
+    use_database(monkeypatch, tmp_path / "destination.sqlite")
+    assert run_with_database(import_) == [("Chat 1", 2)] + [(f"Chat {n}", 2) for n in range(1, 6)]
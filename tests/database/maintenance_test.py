@@ -0,0 +1,49 @@
+# Copyright 2026 Leo Huber
+from luna_chat.database import database
+from luna_chat.database.maintenance import INCREMENTAL_VACUUM, check_database, database_stats, optimize, vacuum
+from luna_chat.database.search import index_messages
+from tests.test_utils.database_util import run_with_database
+
+
+def test_maintenance() -> None:
+    async def maintain() -> None:
+        await database.create_database()
+        async with database.get_engine().begin() as connection:
+            await connection.exec_driver_sql(
+                "INSERT INTO chat (model, title, started_at, archived) VALUES ('luna-gpt-4o', 'Chat', '2024-01-01 10:00:00.000000', 0)",
+            )
+            await connection.exec_driver_sql(
+                "INSERT INTO message (chat_id, role, content, timestamp, meta) VALUES "
+                "(1, 'system', 'Be brief.', '2024-01-01 10:00:00.000000', '{}'), "
+                "(1, 'user', 'Hello', '2024-01-01 10:00:01.000000', '{}')",
+            )
+            await index_messages(connection, [1, 2])
+
+        stats = await database_stats()
+        rows = {table.name: table.rows for table in stats.tables}
+        assert (rows["chat"], rows["message"], rows["message_fts"]) == (1, 2, 1)
+        assert all(index.statistics is None for index in stats.indexes)
+
+        await optimize(analyze=True)
+        stats = await database_stats()
+        assert all(index.statistics is not None for index in stats.indexes if index.table == "message")
+
+        await vacuum()
+        assert (await database_stats()).auto_vacuum == INCREMENTAL_VACUUM
+        await vacuum()
+        await vacuum(full=True)
+        assert (await database_stats()).auto_vacuum == INCREMENTAL_VACUUM
+
+        assert (await check_database()).ok
+        async with database.get_engine().begin() as connection:
+            await connection.exec_driver_sql("INSERT INTO message_fts (message_fts) VALUES ('delete-all')")
+        result = await check_database(quick=True)
+        assert result.problems == ["1 messages are missing from the search index"]
+
+        # Messages which the backfill hasn't reached yet aren't missing.
+        async with database.get_engine().begin() as connection:
+            await connection.exec_driver_sql("UPDATE search_backfill SET next_message_id = 2")
+        result = await check_database(quick=True)
+        assert (result.ok, result.messages_to_backfill) == (True, 1)
+
+    run_with_database(maintain)
@@ -0,0 +1,80 @@
+# Copyright 2026 Leo Huber
+from pathlib import Path
+
+from sqlalchemy import Engine, create_engine
+
+from luna_chat.database.migrations import MIGRATIONS, migrate_database, schema_version
+
+# The schema of databases created before migrations were introduced.
+LEGACY_SCHEMA = [
+    (
+        "CREATE TABLE chat (id INTEGER NOT NULL, model VARCHAR NOT NULL, title VARCHAR, "
+        "started_at DATETIME DEFAULT CURRENT_TIMESTAMP, archived BOOLEAN NOT NULL, PRIMARY KEY (id))"
+    ),
+    (
+        "CREATE TABLE message (id INTEGER NOT NULL, chat_id INTEGER, role VARCHAR NOT NULL, content VARCHAR NOT NULL, "
+        "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, meta JSON, parent_id INTEGER, model VARCHAR, PRIMARY KEY (id), "
+        "FOREIGN KEY(chat_id) REFERENCES chat (id), FOREIGN KEY(parent_id) REFERENCES message (id))"
+    ),
+    (
+        "CREATE TABLE system_prompt (id INTEGER NOT NULL, title VARCHAR NOT NULL, prompt VARCHAR NOT NULL, "
+        "created_at DATETIME DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (id))"
+    ),
+]
+
+
+def create_test_engine(path: Path) -> Engine:
+    # Without Luna's SQL functions, like other SQLite clients.
+    return create_engine(f"sqlite:///{path}")
+
+
+def test_migrate_fresh_database(tmp_path: Path) -> None:
+    engine = create_test_engine(tmp_path / "luna.sqlite")
+    with engine.connect() as connection:
+        applied = migrate_database(connection)
+        assert [migration.version for migration in applied] == list(range(1, len(MIGRATIONS) + 1))
+        assert schema_version(connection) == len(MIGRATIONS)
+        # Running the migrations again is a no-op.
+        assert migrate_database(connection) == []
+
+
+def test_migrate_legacy_database_in_place(tmp_path: Path) -> None:
+    engine = create_test_engine(tmp_path / "luna.sqlite")
+    with engine.connect() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql("INSERT INTO chat (id, model, title, archived) VALUES (1, 'luna-gpt-4o', 'Old chat', 0)")
+        connection.exec_driver_sql(
+            "INSERT INTO message (chat_id, role, content, timestamp, meta) VALUES "
+            "(1, 'system', 'You are Luna', '2024-01-01 10:00:00', '{}'), "
+            "(1, 'user', 'Hello', '2024-01-01 10:00:01', '{}')",
+        )
+        connection.commit()
+
+        migrate_database(connection)
+        assert schema_version(connection) == len(MIGRATIONS)
+
+        chat = connection.exec_driver_sql("SELECT title, last_message_at, message_count, version FROM chat WHERE id = 1").one()
+        assert chat.title == "Old chat"
+        assert chat.last_message_at == "2024-01-01 10:00:01"
+        assert chat.message_count == 2
+        assert chat.version == 0
+        # The messages of the chat become a single branch.
+        assert connection.exec_driver_sql("SELECT parent_id FROM message ORDER BY id").scalars().all() == [None, 1]
+
+        connection.exec_driver_sql(
+            "INSERT INTO message (chat_id, role, content, timestamp, meta) VALUES (1, 'assistant', 'Hi!', '2024-01-02 08:00:00', '{}')",
+        )
+        chat = connection.exec_driver_sql("SELECT last_message_at, message_count FROM chat WHERE id = 1").one()
+        assert chat.last_message_at == "2024-01-02 08:00:00"
+        assert chat.message_count == 3
+
+        indexes = {row.name for row in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"ix_message_chat_id_timestamp", "ix_chat_archived_last_message_at", "ix_chat_version"} <= indexes
+
+        # Messages which predate the search index are left to the background backfill, and Luna
+        # indexes those it writes, so other clients can write messages.
+        assert connection.exec_driver_sql("SELECT next_message_id FROM search_backfill").scalar_one() == 2
+        connection.exec_driver_sql("UPDATE message SET content = 'Hello!', meta = '{}' WHERE id = 3")
+        connection.exec_driver_sql("DELETE FROM message WHERE id = 3")
+        assert connection.exec_driver_sql("SELECT rowid FROM message_fts").scalars().all() == []
@@ -0,0 +1,79 @@
+# Copyright 2026 Leo Huber
+from typing import Any
+
+from sqlalchemy import Row
+
+from luna_chat.database import database
+from luna_chat.database.models import ChatDao, MessageDao
+from tests.test_utils.database_util import run_with_database
+
+
+def test_message_branches() -> None:
+    async def load_branches() -> None:
+        await database.create_database()
+        async with database.get_engine().begin() as connection:
+            await connection.exec_driver_sql(
+                "INSERT INTO chat (model, title, started_at, archived) VALUES ('luna-gpt-4o', 'Chat', '2024-01-01 10:00:00.000000', 0)",
+            )
+            # "Three" was edited, which started a second branch after "Two".
+            await connection.exec_driver_sql(
+                "INSERT INTO message (chat_id, parent_id, role, content, timestamp, meta) VALUES "
+                "(1, NULL, 'system', 'Be brief.', '2024-01-01 10:00:00.000000', '{}'), "
+                "(1, 1, 'user', 'One', '2024-01-01 10:00:01.000000', '{}'), "
+                "(1, 2, 'assistant', 'Two', '2024-01-01 10:00:02.000000', '{}'), "
+                "(1, 3, 'user', 'Three', '2024-01-01 10:00:03.000000', '{}'), "
+                "(1, 4, 'assistant', 'Four', '2024-01-01 10:00:04.000000', '{}'), "
+                "(1, 3, 'user', 'Three, edited', '2024-01-01 10:00:05.000000', '{}'), "
+                "(1, 6, 'assistant', 'Five', '2024-01-01 10:00:06.000000', '{}')",
+            )
+
+        def ids(rows: list[Row[Any]]) -> list[int]:
+            return [row[0].id for row in rows]
+
+        # The most recent branch is shown by default.
+        branch = await MessageDao.branch(1)
+        assert ids(branch) == [1, 2, 3, 6, 7]
+        assert [(row.sibling_index, row.sibling_count) for row in branch][3:] == [(1, 2), (0, 1)]
+        assert {row.length for row in branch} == {5}
+        assert ids(await MessageDao.branch(1, limit=2)) == [1, 6, 7]
+        assert ids(await MessageDao.branch(1, limit=1, including_message_id=3)) == [1, 3, 6, 7]
+        assert ids(await MessageDao.branch(1, leaf_id=5, start_id=4)) == [4, 5]
+        assert ids(await MessageDao.ancestors(6)) == [2, 3]
+        assert ids(await MessageDao.ancestors(6, limit=1)) == [3]
+        assert await MessageDao.sibling_ids(4) == [4, 6]
+        assert (await MessageDao.latest_leaf(4), await MessageDao.latest_leaf(3)) == (5, 7)
+
+        assert await ChatDao.set_active_message(1, 5) is not None
+        assert ids(await MessageDao.branch(1)) == [1, 2, 3, 4, 5]
+        assert await ChatDao.preview(1, 1) == "On"
+
+    run_with_database(load_branches)
+
+
+def test_changed_since() -> None:
+    async def track_changes() -> None:
+        await database.create_database()
+        async with database.get_engine().begin() as connection:
+            await connection.exec_driver_sql(
+                "INSERT INTO chat (model, title, started_at, archived) VALUES "
+                "('luna-gpt-4o', 'First', '2024-01-01 10:00:00.000000', 0), "
+                "('luna-gpt-4o', 'Second', '2024-01-01 11:00:00.000000', 0)",
+            )
+        assert await ChatDao.latest_version() == 0
+        assert await ChatDao.changed_since(20, 0) == []
+
+        # Each change bumps the version of the chat past that of any other chat.
+        first_version = await ChatDao.rename_chat(1, "Renamed")
+        second_version = await ChatDao.set_active_message(2, None)
+        assert first_version is not None
+        assert second_version is not None
+        assert 0 < first_version < second_version == await ChatDao.latest_version()
+
+        [first, second] = await ChatDao.changed_since(20, 0)
+        assert (first.id, first.title, first.version) == (1, "Renamed", first_version)
+        assert (second.id, second.title, second.version) == (2, "Second", second_version)
+        # The chat which wasn't changed after the stamp isn't returned.
+        assert [row.id for row in await ChatDao.changed_since(20, first_version)] == [2]
+        assert await ChatDao.changed_since(20, second_version) == []
+
+    run_with_database(track_changes)
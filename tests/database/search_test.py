@@ -0,0 +1,63 @@
+# Copyright 2026 Leo Huber
+from luna_chat.chats_manager import ChatsManager
+from luna_chat.database import database
+from luna_chat.database.maintenance import check_database
+from luna_chat.database.search import SNIPPET_END, SNIPPET_START, make_snippet, match_query
+from tests.test_utils.database_util import make_chat, run_with_database
+
+
+def test_match_query() -> None:
+    assert match_query("hello wor") == '"hello" "wor"*'
+    assert match_query('NOT "quoted" AND (x:y)') == '"NOT" "quoted" "AND" "x" "y"*'
+    assert match_query("  -*() ") is None
+
+
+def test_make_snippet() -> None:
+    assert make_snippet("Un CAFÉ, s'il vous plaît", "cafe") == f"Un {SNIPPET_START}CAFÉ{SNIPPET_END}, s'il vous plaît"
+    # The last word of the query matches as a prefix.
+    assert make_snippet("hello world", "hello wor") == f"{SNIPPET_START}hello{SNIPPET_END} {SNIPPET_START}world{SNIPPET_END}"
+    words = " ".join(f"w{index}" for index in range(40))
+    assert make_snippet(f"{words} match {words}", "match", length=5) == f"…w38 w39 {SNIPPET_START}match{SNIPPET_END} w0 w1…"
+
+
+def test_search() -> None:
+    async def search() -> None:
+        await database.create_database()
+        chats = [make_chat(f"Where is café number {index}?", f"Café {index} is around the corner.") for index in range(3)]
+        await ChatsManager.create_chats(chats)
+
+        # Diacritics and case are ignored.
+        hits = await ChatsManager.search("CAFE")
+        assert len(hits) == 6
+        assert {hit.snippet for hit in hits if hit.message_id == 1} == {f"Where is {SNIPPET_START}café{SNIPPET_END} number 0?"}
+
+        # Pages don't overlap.
+        first_page = await ChatsManager.search("cafe", limit=4)
+        second_page = await ChatsManager.search("cafe", limit=4, offset=4)
+        assert len(first_page) == 4
+        assert len(second_page) == 2
+        assert {hit.message_id for hit in first_page + second_page} == set(range(1, 7))
+
+        # Messages of archived chats aren't found, nor once they are moved to the archive.
+        first, second, third = (chat.id for chat in chats)
+        assert first is not None
+        assert second is not None
+        assert third is not None
+        await ChatsManager.archive_chat(first)
+        assert {hit.chat_id for hit in await ChatsManager.search("cafe")} == {second, third}
+        assert not await ChatsManager.move_archived_chats()
+        assert {hit.chat_id for hit in await ChatsManager.search("cafe")} == {second, third}
+        assert (await ChatsManager.search("corner", limit=10))[0].chat_id in {second, third}
+
+        # Deleted messages leave the index.
+        async with database.get_engine().begin() as connection:
+            await connection.exec_driver_sql("DELETE FROM message WHERE chat_id = ?", (second,))
+        assert {hit.chat_id for hit in await ChatsManager.search("cafe")} == {third}
+        assert (await check_database()).ok
+
+        # Unarchived chats are indexed again.
+        await ChatsManager.unarchive_chat(first)
+        assert {hit.chat_id for hit in await ChatsManager.search("cafe")} == {first, third}
+        assert (await check_database()).ok
+
+    run_with_database(search)
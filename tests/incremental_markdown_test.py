@@ -0,0 +1,99 @@
+# Copyright 2026 Leo Huber
+import pytest
+from rich.console import Console, ConsoleOptions, RenderableType, RenderResult
+from rich.markdown import Markdown
+
+from luna_chat.incremental_markdown import IncrementalMarkdown
+from luna_chat.models import MessageBuffer
+
+RESPONSE = """# Sorting
+
+Python sorts *in place* with `list.sort`, and
+returns a new list with [sorted](https://docs.python.org).
+
+1. Call it
+   - with a key
+2. Done
+
+3. Still the same list
+---
+```python
+numbers.sort(key=abs)
+```
+
+> A quote
+lazily continued
+
+| a | b |
+|---|---|
+| 1 | 2 |
+![chart](chart.png) and ~~old~~ **new**
+
+    indented code
+***
+Setext
+======
+<div>html</div>
+
+7
+"""
+
+
+def render(console: Console, renderable: RenderableType) -> list[tuple[str, object]]:
+    return [(segment.text, segment.style) for segment in console.render(renderable)]
+
+
+def test_streamed_markdown_renders_like_markdown() -> None:
+    consoles = [Console(width=width, force_terminal=True, color_system="truecolor") for width in (24, 80)]
+    markdown = IncrementalMarkdown()
+    for end in range(1, len(RESPONSE) + 1):
+        markdown.update(RESPONSE[:end])
+        for console in consoles:
+            assert render(console, markdown) == render(console, Markdown(RESPONSE[:end])), repr(RESPONSE[:end])
+
+
+def test_buffer_is_read_from_where_it_was_rendered() -> None:
+    console = Console(width=40, force_terminal=True)
+    buffer = MessageBuffer()
+    markdown = IncrementalMarkdown(buffer)
+    for start in range(0, len(RESPONSE), 7):
+        buffer.append(RESPONSE[start : start + 7].replace("\n", "\r\n"))
+        markdown.update(buffer)
+        assert render(console, markdown) == render(console, Markdown(buffer.text))
+
+
+def test_complete_blocks_are_rendered_once_per_width(monkeypatch: pytest.MonkeyPatch) -> None:
+    rendered: list[str] = []
+    render_markdown = Markdown.__rich_console__
+
+    def record_render(self: Markdown, console: Console, options: ConsoleOptions) -> RenderResult:
+        rendered.append(self.markup)
+        return render_markdown(self, console, options)
+
+    monkeypatch.setattr(Markdown, "__rich_console__", record_render)
+    console = Console(width=40, force_terminal=True)
+    markdown = IncrementalMarkdown("First paragraph.\n\n```\ncode\n```\n\nLast")
+    render(console, markdown)
+    assert len(rendered) == 3
+
+    # Only the last block is rendered again.
+    rendered.clear()
+    markdown.update("First paragraph.\n\n```\ncode\n```\n\nLast paragraph")
+    render(console, markdown)
+    assert [markup.removeprefix("<!---->\n\n") for markup in rendered] == ["Last paragraph"]
+
+    # Until the width changes.
+    rendered.clear()
+    render(Console(width=30, force_terminal=True), markdown)
+    assert len(rendered) == 3
+
+    # Other content starts over.
+    rendered.clear()
+    markdown.update("Other")
+    render(console, markdown)
+    assert rendered == ["Other"]
+
+    # Link reference definitions apply to the whole text.
+    text = "A [link][1].\n\nMore.\n\n[1]: https://example.com"
+    markdown.update(text)
+    assert render(console, markdown) == render(console, Markdown(text))
@@ -0,0 +1,70 @@
+# Copyright 2026 Leo Huber
+import threading
+from datetime import UTC, datetime
+
+import pytest
+
+from luna_chat.config import LaunchConfig, LunaChatModel
+from luna_chat.models import UNKNOWN_MODEL, ChatMessage, MessageBuffer, ModelRegistry, configure_models, get_model
+
+
+def test_registry_looks_up_models_by_id_then_name() -> None:
+    first = LunaChatModel(id="first", name="gpt-4o")
+    second = LunaChatModel(id="gpt-4o", name="gpt-4o-mini")
+    registry = ModelRegistry([first, second])
+
+    assert registry.get("first") is first
+    assert registry.get("gpt-4o") is second
+    assert registry.get("gpt-4o-mini") is second
+    assert registry.get("gone") is UNKNOWN_MODEL
+    assert registry.get("gone") is UNKNOWN_MODEL
+
+
+def test_get_model_works_without_an_app() -> None:
+    config = LaunchConfig(models=[LunaChatModel(id="mine", name="gpt-4o")])
+    assert get_model("mine", config) is config.models[0]
+    assert config.model_registry is config.model_registry
+
+    configure_models(config)
+    results: list[LunaChatModel] = []
+    thread = threading.Thread(target=lambda: results.append(get_model("mine")))
+    thread.start()
+    thread.join()
+    assert results == [config.models[0]]
+    assert get_model("gone") is UNKNOWN_MODEL
+
+
+def test_get_model_needs_a_config() -> None:
+    configure_models(None)
+    with pytest.raises(RuntimeError):
+        get_model("luna-gpt-4o")
+
+
+def test_message_buffer() -> None:
+    buffer = MessageBuffer("Hello")
+    for chunk in [",", " ", "", "world\n", "and more"]:
+        buffer.append(chunk)
+    assert (len(buffer), buffer.line_count) == (len("Hello, world\nand more"), 2)
+    assert [buffer.text_from(start) for start in (0, 5, 7, 13, 21, 30)] == [
+        "Hello, world\nand more",
+        ", world\nand more",
+        "world\nand more",
+        "and more",
+        "",
+        "",
+    ]
+    text = buffer.text
+    assert text == "Hello, world\nand more"
+    assert buffer.text is text
+    buffer.append("!")
+    assert buffer.text_from(19) == "re!"
+    assert str(buffer) == "Hello, world\nand more!"
+
+
+def test_appended_content_is_synced_into_the_message() -> None:
+    message = ChatMessage({"role": "assistant", "content": "Hi"}, datetime.now(UTC), UNKNOWN_MODEL)
+    message.append_content(" there")
+    assert message.content == "Hi there"
+    assert message.message["content"] == "Hi"
+    message.sync_content()
+    assert message.message["content"] == "Hi there"
@@ -0,0 +1,128 @@
+# Copyright 2026 Leo Huber
+import asyncio
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+from pydantic import AnyHttpUrl, SecretStr
+
+from luna_chat.config import LunaChatModel
+from luna_chat.provider_clients import ProviderClients
+
+
+@pytest.fixture(autouse=True)
+def local_model_cost_map(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Importing litellm would otherwise download its model cost map.
+    monkeypatch.setenv("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+
+def local_model(port: int) -> LunaChatModel:
+    return LunaChatModel(name="gpt-4o", api_key=SecretStr("key"), api_base=AnyHttpUrl(f"http://127.0.0.1:{port}/v1"))
+
+
+def test_the_warmed_up_connection_is_reused() -> None:
+    connections = 0
+
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        nonlocal connections
+        connections += 1
+        while not reader.at_eof():
+            request = await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 30\r\n\r\n")
+            if not request.startswith(b"HEAD"):
+                writer.write(b'{"object": "list", "data": []}')
+            await writer.drain()
+
+    async def request() -> None:
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        model = local_model(port)
+        clients = ProviderClients()
+        await clients.warm_up(model)
+        assert connections == 1
+
+        client = await clients.get(model)
+        assert client is await clients.get(model.model_copy())
+        assert isinstance(client, AsyncOpenAI)
+        await client.models.list()
+        assert connections == 1
+
+        await clients.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(request())
+
+
+def test_connections_are_kept_after_streamed_responses() -> None:
+    connections = 0
+    event = b'data: {"id": "1", "object": "chat.completion.chunk", "created": 1, "model": "gpt-4o", "choices": []}\n\n'
+
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        nonlocal connections
+        connections += 1
+        while not reader.at_eof():
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = next(line for line in headers.split(b"\r\n") if line.lower().startswith(b"content-length:"))
+            await reader.readexactly(int(length.split(b":")[1]))
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+            for data in (event, b"data: [DONE]\n\n"):
+                writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+                await writer.drain()
+            # The end of the body comes after the last event.
+            await asyncio.sleep(0.01)
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+
+    async def request() -> None:
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        clients = ProviderClients()
+        client = await clients.get(local_model(port))
+        assert isinstance(client, AsyncOpenAI)
+        for _ in range(2):
+            stream = await client.chat.completions.create(model="gpt-4o", messages=[], stream=True)
+            assert len([chunk async for chunk in stream]) == 1
+        assert connections == 1
+
+        await clients.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(request())
+
+
+def test_unknown_providers_use_litellm_clients() -> None:
+    async def request() -> None:
+        clients = ProviderClients()
+        assert await clients.get(LunaChatModel(name="not-a-provider/model")) is None
+        await clients.close()
+
+    asyncio.run(request())
+
+
+def test_the_client_litellm_makes_is_closed(monkeypatch: pytest.MonkeyPatch) -> None:
+    closed: list[httpx.AsyncClient] = []
+    aclose = httpx.AsyncClient.aclose
+
+    async def record(client: httpx.AsyncClient) -> None:
+        closed.append(client)
+        await aclose(client)
+
+    monkeypatch.setattr(httpx.AsyncClient, "aclose", record)
+
+    async def request() -> None:
+        clients = ProviderClients()
+        client = await clients.get(LunaChatModel(name="anthropic/claude-3-5-sonnet-20241022", api_key=SecretStr("key")))
+        assert client is not None
+        assert not isinstance(client, AsyncOpenAI)
+        assert type(client).__name__ == "AsyncHTTPHandler"
+        # The handler's own client, rather than the one it was given.
+        [replaced] = closed
+        assert replaced.is_closed
+        assert replaced is not client.client
+
+        await clients.close()
+        assert closed[1:] == [client.client]
+
+    asyncio.run(request())
@@ -0,0 +1,57 @@
+# Copyright 2026 Leo Huber
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+
+import pytest
+
+from luna_chat.read_ahead import read_ahead
+
+
+def test_chunks_are_read_ahead_up_to_the_limit() -> None:
+    read: list[int] = []
+
+    async def chunks() -> AsyncIterator[int]:
+        for chunk in range(10):
+            read.append(chunk)
+            yield chunk
+        message = "lost"
+        raise ConnectionError(message)
+
+    received: list[int] = []
+
+    async def receive() -> None:
+        async for chunk in read_ahead(chunks(), max_queued=3):
+            received.append(chunk)
+            await asyncio.sleep(0)
+            # Reading pauses when the queue is full.
+            assert len(read) <= len(received) + 4
+
+    async def stream() -> None:
+        with pytest.raises(ConnectionError, match="lost"):
+            await receive()
+        # The chunks read before the error are all received.
+        assert received == list(range(10))
+
+    asyncio.run(stream())
+
+
+def test_closing_cancels_reading() -> None:
+    cancelled = asyncio.Event()
+
+    async def chunks() -> AsyncIterator[str]:
+        try:
+            while True:
+                yield "chunk"
+                await asyncio.sleep(0.01)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def stream() -> None:
+        async with aclosing(read_ahead(chunks(), max_queued=10)) as reader:
+            async for _ in reader:
+                break
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+    asyncio.run(stream())
@@ -0,0 +1,37 @@
+# Copyright 2026 Leo Huber
+import asyncio
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING
+
+from luna_chat.chats_manager import ChatsManager
+from luna_chat.config import LaunchConfig
+from luna_chat.database import database
+from luna_chat.models import ChatData, ChatMessage
+
+if TYPE_CHECKING:
+    from litellm.types.completion import ChatCompletionMessageParam
+
+
+def run_with_database[T](main: Callable[[], Awaitable[T]]) -> T:
+    """Run the coroutine of a test, then close the database connections and empty the chat cache, which outlive its event loop."""
+
+    async def run() -> T:
+        try:
+            return await main()
+        finally:
+            ChatsManager.chat_cache().clear()
+            await database.dispose_engine()
+
+    return asyncio.run(run())
+
+
+def make_chat(*contents: str) -> ChatData:
+    """Make an unsaved chat of messages with the given contents, alternately from the user and the assistant."""
+    model = LaunchConfig().default_model_object
+    now = datetime.now(UTC)
+    messages = []
+    for index, content in enumerate(contents):
+        message: ChatCompletionMessageParam = {"role": "user", "content": content} if index % 2 == 0 else {"role": "assistant", "content": content}
+        messages.append(ChatMessage(message, now, model))
+    return ChatData(id=None, model=model, title=None, create_timestamp=None, messages=messages)
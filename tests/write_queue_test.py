@@ -0,0 +1,118 @@
+# Copyright 2026 Leo Huber
+import asyncio
+from collections.abc import Sequence
+from datetime import UTC, datetime
+
+import pytest
+
+from luna_chat.chats_manager import ChatsManager
+from luna_chat.config import LunaChatModel
+from luna_chat.models import ChatMessage
+from luna_chat.write_queue import MessageWriteQueue
+
+
+def make_message(content: str) -> ChatMessage:
+    return ChatMessage(
+        {"role": "user", "content": content},
+        datetime.now(UTC),
+        LunaChatModel(name="gpt-4o"),
+    )
+
+
+def test_writes_are_coalesced_and_flushed_on_close(monkeypatch: pytest.MonkeyPatch) -> None:
+    batches: list[list[str]] = []
+
+    async def add_messages(messages: Sequence[tuple[int, ChatMessage]], updated: Sequence[ChatMessage] = ()) -> list[int]:
+        batches.append([str(message.message["content"]) for _, message in messages])
+        start = sum(len(batch) for batch in batches) - len(messages)
+        return list(range(start + 1, start + len(messages) + 1))
+
+    monkeypatch.setattr(ChatsManager, "add_messages", add_messages)
+
+    async def run() -> list[int]:
+        queue = MessageWriteQueue(delay=0.01)
+        first = queue.enqueue(1, make_message("a"))
+        second = queue.enqueue(2, make_message("b"))
+        ids = [await first, await second]
+        queue.enqueue(1, make_message("c"))
+        await queue.close()
+        with pytest.raises(RuntimeError):
+            queue.enqueue(1, make_message("d"))
+        return ids
+
+    assert asyncio.run(run()) == [1, 2]
+    assert batches == [["a", "b"], ["c"]]
+
+
+def test_failed_writes_are_retried(monkeypatch: pytest.MonkeyPatch) -> None:
+    attempts: list[list[str]] = []
+    failed = asyncio.Event()
+
+    async def add_messages(messages: Sequence[tuple[int, ChatMessage]], updated: Sequence[ChatMessage] = ()) -> list[int]:
+        attempts.append([str(message.message["content"]) for _, message in messages])
+        if len(attempts) <= 2:
+            failed.set()
+            message = "database is locked"
+            raise OSError(message)
+        return list(range(1, len(messages) + 1))
+
+    monkeypatch.setattr(ChatsManager, "add_messages", add_messages)
+    errors: list[Exception] = []
+
+    async def run() -> list[int]:
+        queue = MessageWriteQueue(delay=0.01, retry_delay=0.01, on_error=errors.append)
+        user_message = make_message("a")
+        user = queue.enqueue(1, user_message)
+        await failed.wait()
+        reply = make_message("b")
+        reply.parent = user_message
+        second = queue.enqueue(1, reply)
+        ids = [await user, await second]
+        await queue.close()
+        return ids
+
+    assert asyncio.run(run()) == [1, 2]
+    # The failed message stays first, and is written together with the reply queued in the meantime.
+    assert attempts == [["a"], ["a", "b"], ["a", "b"]]
+    assert errors == []
+
+
+def test_messages_are_given_up_on_after_the_retries(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def add_messages(messages: Sequence[tuple[int, ChatMessage]], updated: Sequence[ChatMessage] = ()) -> list[int]:
+        message = "disk I/O error"
+        raise OSError(message)
+
+    monkeypatch.setattr(ChatsManager, "add_messages", add_messages)
+    errors: list[Exception] = []
+
+    async def run() -> None:
+        queue = MessageWriteQueue(delay=0.01, max_retries=2, retry_delay=0.01, on_error=errors.append)
+        user_message = make_message("a")
+        user = queue.enqueue(1, user_message)
+        with pytest.raises(OSError, match="disk I/O error"):
+            await user
+        reply = make_message("b")
+        reply.parent = user_message
+        with pytest.raises(RuntimeError):
+            await queue.enqueue(1, reply)
+        await queue.close()
+
+    asyncio.run(run())
+    assert len(errors) == 1
+
+
+def test_waiting_until_the_messages_are_written(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def add_messages(messages: Sequence[tuple[int, ChatMessage]], updated: Sequence[ChatMessage] = ()) -> list[int]:
+        return list(range(1, len(messages) + 1))
+
+    monkeypatch.setattr(ChatsManager, "add_messages", add_messages)
+
+    async def run() -> None:
+        queue = MessageWriteQueue(delay=0.01)
+        await queue.wait_until_idle()
+        queue.enqueue(1, make_message("a"))
+        await queue.wait_until_idle()
+        assert queue.pending_count == 0
+        await queue.close()
+
+    asyncio.run(run())